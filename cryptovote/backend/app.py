@@ -17,6 +17,7 @@ from routes.admin.download_routes import download_bp
 from routes.admin.election_routes import election_bp
 from routes.admin.security_routes import bp as security_bp
 from routes.admin.admin_me import bp_me
+from routes.admin.metrics_routes import metrics_bp
 from routes.public_keys import keys_bp
 from dotenv import load_dotenv
 from utilities.network_utils import is_ntu_ip
@@ -24,6 +25,7 @@ from routes.receipt import receipt_bp
 from routes.results import results_bp
 from routes.wbb import wbb_bp
 from utilities.session_utils import register_session_ttl
+from services import wbb_upkeep
 from flask_cors import CORS 
 import os
 
@@ -75,12 +77,14 @@ app.register_blueprint(download_bp, url_prefix="/admin")
 app.register_blueprint(election_bp, url_prefix="/admin")
 app.register_blueprint(bp_me, url_prefix="/admin")
 app.register_blueprint(security_bp, url_prefix="/admin")
+app.register_blueprint(metrics_bp, url_prefix="/admin")
 app.register_blueprint(candidate_list_bp, url_prefix="/voter")
 app.register_blueprint(receipt_bp)
 app.register_blueprint(results_bp)
 app.register_blueprint(keys_bp)
 app.register_blueprint(wbb_bp)
 register_session_ttl(app, idle_ttl=2*60, abs_ttl=8*60*60)
+wbb_upkeep.init_app(app)          # seals board gaps / signs heads without waiting for ballots
 
 # IP Restriction Middleware
 @app.before_request
@@ -0,0 +1,31 @@
+# models/encrypted_tally_accumulator.py
+from models.db import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+SGT = ZoneInfo("Asia/Singapore")
+
+class EncryptedTallyAccumulator(db.Model):
+    __tablename__ = "encrypted_tally_accumulators"
+
+    id = db.Column(db.Integer, primary_key=True)
+    election_id = db.Column(db.String(64), db.ForeignKey("elections.id"), index=True, nullable=False)
+    candidate_id = db.Column(
+        db.String(64),
+        db.ForeignKey("candidates.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+    # Running Paillier sum: product of every exponent-0 ciphertext mod n² (base-10 string).
+    # "1" is the trivial encryption of 0, i.e. the empty product.
+    ciphertext = db.Column(db.Text, nullable=False, default="1")
+
+    # How many ciphertexts have been folded in (cheap consistency check vs encrypted_candidate_votes)
+    ballot_count = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(SGT),
+                           onupdate=lambda: datetime.now(SGT), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("election_id", "candidate_id", name="uq_acc_per_candidate"),
+    )
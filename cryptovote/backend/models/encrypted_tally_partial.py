@@ -0,0 +1,23 @@
+# models/encrypted_tally_partial.py
+from models.db import db
+
+class EncryptedTallyPartial(db.Model):
+    """
+    Per-ballot (or per-batch) Paillier products waiting to be folded into
+    encrypted_tally_accumulators. /cast-vote only inserts here, so ballots of
+    one election never wait on each other for the running sums; see
+    services/tally_accumulator_service.fold_partials().
+    """
+    __tablename__ = "encrypted_tally_partials"
+
+    id = db.Column(db.Integer, primary_key=True)
+    election_id = db.Column(db.String(64), db.ForeignKey("elections.id"), index=True, nullable=False)
+    candidate_id = db.Column(
+        db.String(64),
+        db.ForeignKey("candidates.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+    # product of the ciphertexts this row carries, mod n² (base-10 string)
+    ciphertext = db.Column(db.Text, nullable=False)
+    ballot_count = db.Column(db.Integer, nullable=False, default=1)
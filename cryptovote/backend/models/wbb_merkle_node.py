@@ -0,0 +1,15 @@
+# models/wbb_merkle_node.py
+from models.db import db
+
+class WbbMerkleNode(db.Model):
+    """
+    Complete nodes of an election's bulletin-board Merkle tree (see
+    utilities/merkle.py). Level 0 holds the leaf hashes at their board
+    position; a parent is written once both of its children exist.
+    """
+    __tablename__ = "wbb_merkle_nodes"
+
+    election_id = db.Column(db.String(128), primary_key=True)
+    level       = db.Column(db.SmallInteger, primary_key=True)
+    idx         = db.Column(db.Integer, primary_key=True)
+    hash        = db.Column(db.String(64), nullable=False)   # sha256 hex
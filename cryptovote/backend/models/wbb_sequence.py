@@ -0,0 +1,13 @@
+# models/wbb_sequence.py
+from models.db import db
+
+class WbbSequence(db.Model):
+    """
+    Per-election counter for bulletin-board positions.
+    Bumped with one UPDATE ... RETURNING per ballot instead of a MAX(position) scan;
+    on PostgreSQL the bump autocommits, so a rolled-back ballot leaves a gap.
+    """
+    __tablename__ = "wbb_sequences"
+
+    election_id   = db.Column(db.String(128), primary_key=True)
+    next_position = db.Column(db.Integer, nullable=False, default=0)   # first unused position
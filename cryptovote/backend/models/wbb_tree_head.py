@@ -0,0 +1,22 @@
+# models/wbb_tree_head.py
+from models.db import db
+
+class WbbTreeHead(db.Model):
+    """
+    Signed tree head: the board's size and Merkle root at a point in time,
+    signed with the WBB tree-head key (utilities/tree_head_utils.py).
+    """
+    __tablename__ = "wbb_tree_heads"
+
+    id          = db.Column(db.Integer, primary_key=True)
+    election_id = db.Column(db.String(128), index=True, nullable=False)
+    tree_size   = db.Column(db.Integer, nullable=False)
+    root        = db.Column(db.String(64), nullable=False)
+    timestamp   = db.Column(db.BigInteger, nullable=False)     # ms since epoch (signed as-is)
+    signature   = db.Column(db.Text, nullable=False)           # hex
+    key_id      = db.Column(db.String(64), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("election_id", "tree_size", name="uq_sth_eid_size"),
+    )
+
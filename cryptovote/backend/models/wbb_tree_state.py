@@ -0,0 +1,15 @@
+# models/wbb_tree_state.py
+from models.db import db
+
+class WbbTreeState(db.Model):
+    """
+    How far an election's stored Merkle tree has been built (see
+    services/wbb_service.integrate_board). Kept apart from WbbSequence so that
+    building the tree never holds the row that position allocation bumps.
+    """
+    __tablename__ = "wbb_tree_states"
+
+    election_id      = db.Column(db.String(128), primary_key=True)
+    tree_size        = db.Column(db.Integer, nullable=False, default=0)   # positions in the tree
+    stalled_position = db.Column(db.Integer, nullable=True)               # first missing leaf, if any
+    stalled_since    = db.Column(db.BigInteger, nullable=True)            # ms since epoch it was first seen
@@ -1,6 +1,6 @@
 # routes/audit_routes.py
 from flask import Blueprint, session, request
-from services.audit_service import perform_audit_report, perform_tally
+from services.audit_service import perform_audit_report, perform_tally, perform_reconcile
 from utilities.auth_utils import role_required
 
 audit_bp = Blueprint('audit_bp', __name__)
@@ -14,3 +14,10 @@ def audit_report(election_id):
 @role_required("admin")
 def tally_election(election_id):
     return perform_tally(election_id, session["email"], request.remote_addr)
+
+
+@audit_bp.route("/reconcile-tally/<election_id>", methods=["POST"])
+@role_required("admin")
+def reconcile_tally(election_id):
+    repair = request.args.get("repair", "1") != "0"  # ?repair=0 -> report only
+    return perform_reconcile(election_id, session["email"], request.remote_addr, repair=repair)
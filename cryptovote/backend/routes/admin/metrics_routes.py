@@ -0,0 +1,16 @@
+# routes/admin/metrics_routes.py
+from flask import Blueprint, jsonify
+
+from utilities.auth_utils import role_required
+from services.signing_service import signing_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.get("/metrics/signing")
+@role_required("admin")
+def signing_latency():
+    """Blind-signing latency histograms per rsa_key_id since process start."""
+    resp = jsonify(signing_metrics())
+    resp.headers["Cache-Control"] = "no-store"
+    return resp, 200
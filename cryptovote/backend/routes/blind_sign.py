@@ -1,13 +1,22 @@
 # routes/blind_sign.py
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, current_app, request, jsonify, session
 from models.db import db
 from models.issued_token import IssuedToken
 from models.voter import Voter
 from models.election import Election
-from utilities.blind_signature_utils import sign_blinded_token
+from services.auth_service import get_email_hash
+from services.signing_service import (
+    sign_blinded_token, sign_many, SigningFault, SignerBusy, SIGN_RETRY_AFTER_SECONDS,
+)
+from utilities.http_utils import unavailable
+from utilities.key_registry import UnknownRsaKey
 from models.voter_election_status import VoterElectionStatus as VES
 from utilities.auth_utils import role_required
+from extensions import limiter
+from sqlalchemy import insert, update, or_
+from sqlalchemy.exc import IntegrityError
 import hashlib
+import os
 from datetime import datetime
 from _zoneinfo import ZoneInfo
 
@@ -15,6 +24,8 @@ SGT = ZoneInfo("Asia/Singapore")
 
 blind_sign_bp = Blueprint("blind_sign", __name__)
 
+BATCH_MAX_TOKENS = int(os.getenv("BLIND_SIGN_BATCH_MAX", "1000"))
+
 def mark_token_issued(voter_id: int, election_id: str):
     ves = (VES.query
               .filter_by(voter_id=voter_id, election_id=election_id)
@@ -69,11 +80,8 @@ def blind_sign(election_id):
     try:
         blinded_int = int(blinded_token_hex, 16)
 
-        # Support both signatures: sign_blinded_token(blinded_int, rsa_key_id) or sign_blinded_token(blinded_int)
-        try:
-            signed_blinded_int = sign_blinded_token(blinded_int, rsa_key_id)  # preferred if your util supports per-key
-        except TypeError:
-            signed_blinded_int = sign_blinded_token(blinded_int)  # fallback to global key util
+        # this election's keyring key (cached, CRT); output is checked before release
+        signed_blinded_int = sign_blinded_token(blinded_int, rsa_key_id)
 
         signed_blinded_hex = hex(signed_blinded_int)[2:]
 
@@ -103,7 +111,169 @@ def blind_sign(election_id):
     except ValueError:
         db.session.rollback()
         return jsonify({"error": "invalid_blinded_token_hex"}), 400
+    except SignerBusy:
+        db.session.rollback()
+        return unavailable("signer_busy", SIGN_RETRY_AFTER_SECONDS)
+    except UnknownRsaKey:
+        db.session.rollback()
+        current_app.logger.error("no keyring entry for rsa_key_id %r (election %s)", rsa_key_id, election_id)
+        return jsonify({"error": "signing_key_unavailable"}), 500
+    except SigningFault:
+        db.session.rollback()
+        current_app.logger.error("blind signature for %s failed its self-check; withheld", election_id)
+        return jsonify({"error": "signing_failed"}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"signing_failed: {e}"}), 500
 
+
+@blind_sign_bp.post("/elections/<string:election_id>/blind-sign/batch")
+@limiter.limit("1 per second; 10 per minute")
+@role_required("admin")
+def blind_sign_batch(election_id):
+    """
+    Pre-issue tokens for a cohort (e.g. an in-class vote) in one request: one
+    query resolves the voters, one finds those already issued, the blinded
+    values are signed together (spread over the pool with the process
+    backend), and every IssuedToken/VES write is one transaction.
+
+    Body:    { "rsa_key_id": str,
+               "tokens": [ {"voter_id": int | "email": str, "blinded_token_hex": str}, ... ] }
+    Returns: { "issued", "rejected",
+               "results": [ {index, status, voter_id?, signed_blinded_token_hex? | error} ] }
+    """
+    data = request.get_json(silent=True) or {}
+    rsa_key_id = data.get("rsa_key_id")
+    items = data.get("tokens")
+    if not isinstance(rsa_key_id, str) or not isinstance(items, list) or not items:
+        return jsonify({"error": "missing_fields"}), 400
+    if len(items) > BATCH_MAX_TOKENS:
+        return jsonify({"error": "batch_too_large", "max": BATCH_MAX_TOKENS}), 413
+
+    election = Election.query.filter_by(id=election_id, is_active=True).first()
+    if not election:
+        return jsonify({"error": "invalid_election"}), 400
+    if election.rsa_key_id != rsa_key_id:
+        return jsonify({"error": "key_mismatch_for_election"}), 400
+
+    results = [None] * len(items)
+
+    def _reject(i, error, voter_id=None):
+        results[i] = {"index": i, "status": "rejected", "error": error}
+        if voter_id is not None:
+            results[i]["voter_id"] = voter_id
+
+    # 1) shape + hex per item; voters are referenced by id or by email
+    parsed = []  # (index, ("id", int) | ("email_hash", str), blinded_int)
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            _reject(i, "invalid_item"); continue
+        try:
+            blinded_int = int(item.get("blinded_token_hex") or "", 16)
+        except (TypeError, ValueError):
+            _reject(i, "invalid_blinded_token_hex"); continue
+        if isinstance(item.get("voter_id"), int):
+            ref = ("id", item["voter_id"])
+        elif isinstance(item.get("email"), str) and item["email"].strip():
+            ref = ("email_hash", get_email_hash(item["email"]))
+        else:
+            _reject(i, "missing_voter"); continue
+        parsed.append((i, ref, blinded_int))
+
+    # 2) every referenced voter in one query
+    ids = {v for (kind, v) in (p[1] for p in parsed) if kind == "id"}
+    hashes = {v for (kind, v) in (p[1] for p in parsed) if kind == "email_hash"}
+    voters = {}
+    if parsed:
+        rows = db.session.query(Voter.id, Voter.email_hash, Voter.is_verified)\
+            .filter(or_(Voter.id.in_(ids), Voter.email_hash.in_(hashes))).all()
+        for vid, email_hash, verified in rows:
+            voters[("id", vid)] = voters[("email_hash", email_hash)] = (vid, email_hash, verified)
+
+    pending = {}  # voter_id -> (index, email_hash, blinded_int)
+    for i, ref, blinded_int in parsed:
+        voter = voters.get(ref)
+        if voter is None:
+            _reject(i, "unknown_voter"); continue
+        vid, email_hash, verified = voter
+        if not verified:
+            _reject(i, "voter_not_verified", vid); continue
+        if vid in pending:
+            _reject(i, "duplicate_voter_in_batch", vid); continue
+        pending[vid] = (i, email_hash, blinded_int)
+
+    # 3) duplicate issuance for the whole batch in one IN query
+    existing_ves = set()
+    if pending:
+        for vid, issued_at in db.session.query(VES.voter_id, VES.token_issued_at)\
+                .filter(VES.election_id == election_id, VES.voter_id.in_(list(pending))).all():
+            if issued_at is not None:
+                i, _, _ = pending.pop(vid)
+                _reject(i, "token_already_issued_for_this_election", vid)
+            else:
+                existing_ves.add(vid)
+
+    # 4) sign together; a value the key rejects only fails its own item
+    accepted = sorted(pending.items(), key=lambda kv: kv[1][0])
+    if accepted:
+        try:
+            signatures = sign_many([p[2] for _, p in accepted], rsa_key_id)
+        except SignerBusy:
+            return unavailable("signer_busy", SIGN_RETRY_AFTER_SECONDS)
+        except UnknownRsaKey:
+            current_app.logger.error("no keyring entry for rsa_key_id %r (election %s)", rsa_key_id, election_id)
+            return jsonify({"error": "signing_key_unavailable"}), 500
+
+        issued_time = datetime.now(SGT)
+        issued_rows, new_ves, update_ves = [], [], []
+        signed = []
+        for (vid, (i, email_hash, _)), sig in zip(accepted, signatures):
+            if isinstance(sig, Exception):
+                if isinstance(sig, SigningFault):
+                    current_app.logger.error("blind signature for %s failed its self-check; withheld", election_id)
+                _reject(i, "signing_failed" if isinstance(sig, SigningFault) else "invalid_blinded_token_hex", vid)
+                continue
+            issuance_fingerprint = f"{email_hash}|{election_id}|{issued_time.isoformat()}"
+            issued_rows.append({
+                "token_hash": hashlib.sha256(issuance_fingerprint.encode()).hexdigest(),
+                "used": False,
+                "issued_at": issued_time,
+            })
+            if vid in existing_ves:
+                update_ves.append(vid)
+            else:
+                new_ves.append({"voter_id": vid, "election_id": election_id, "token_issued_at": issued_time})
+            signed.append((i, vid, sig))
+
+        # 5) all issuance records in one transaction
+        if signed:
+            try:
+                db.session.execute(insert(IssuedToken), issued_rows)
+                if new_ves:
+                    db.session.execute(insert(VES), new_ves)
+                if update_ves:
+                    res = db.session.execute(
+                        update(VES)
+                        .where(VES.election_id == election_id, VES.voter_id.in_(update_ves),
+                               VES.token_issued_at.is_(None))
+                        .values(token_issued_at=issued_time)
+                    )
+                    if res.rowcount != len(update_ves):
+                        raise IntegrityError("token issued concurrently", None, None)
+                db.session.commit()
+            except IntegrityError:
+                # a voter in the batch was issued a token meanwhile; nothing was written
+                db.session.rollback()
+                return jsonify({"error": "batch_conflict_retry"}), 409
+            for i, vid, sig in signed:
+                results[i] = {"index": i, "status": "issued", "voter_id": vid,
+                              "signed_blinded_token_hex": format(sig, "x")}
+
+    issued = sum(1 for r in results if r["status"] == "issued")
+    return jsonify({
+        "election_id": election_id,
+        "rsa_key_id": rsa_key_id,
+        "issued": issued,
+        "rejected": len(items) - issued,
+        "results": results,
+    }), 200
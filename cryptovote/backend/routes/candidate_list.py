@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify
 from models.db import db
-from models.election import Election, Candidate
+from models.election import Election
 from utilities.auth_utils import role_required
+from services.candidate_cache import candidates_for
 
 candidate_list_bp = Blueprint("candidate_list", __name__)
 
@@ -12,18 +13,13 @@ def election_detail(election_id):
     if not e:
         return jsonify({"error": "Election not found"}), 404
 
-    cands = (
-        db.session.query(Candidate.id, Candidate.name)
-        .filter_by(election_id=election_id)
-        .order_by(Candidate.name.asc())
-        .all()
-    )
+    cands = candidates_for(db.session, election_id, e.updated_at).ordered
     return jsonify({
         "id": e.id,
         "name": e.name,
         "start_time": e.start_time.isoformat() if e.start_time else None,
         "end_time": e.end_time.isoformat() if e.end_time else None,
         "rsa_key_id": e.rsa_key_id,
-        "candidates": [{"id": c.id, "name": c.name} for c in cands],
+        "candidates": [{"id": cid, "name": name} for cid, name in cands],
         "candidate_count": len(cands),
     }), 200
@@ -1,28 +1,158 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from extensions import limiter
 from datetime import datetime
-import hashlib, re, json
+import hashlib, re, json, os
 from zoneinfo import ZoneInfo
+from typing import NamedTuple, Optional
+from sqlalchemy import insert, select, exists, and_, literal
+from sqlalchemy.exc import IntegrityError
 
 from models.voter import Voter
 from models.db import db
 # from models.issued_token import IssuedToken   # optional: you can remove if unused
 from models.encrypted_candidate_vote import EncryptedCandidateVote
-from models.election import Candidate, Election
+from models.election import Election
 from models.voter_election_status import VoterElectionStatus as VES
 from models.wbb_entry import WbbEntry
 
-from utilities.blind_signature_utils import load_public_key as load_rsa_pubkey
-from utilities.paillier_utils import load_public_key as load_paillier_public_key
-from utilities.verification.vote_verification_utils import (
-    validate_vote_request,
-    parse_and_verify_signature,
-)
+from utilities.key_registry import load_rsa_public_key as load_rsa_pubkey, UnknownRsaKey
+from utilities.key_registry import load_paillier_public_key
+from utilities.verification.vote_verification_utils import parse_and_verify_signature
 from utilities.key_fingerprint import fingerprint_paillier_n
+from utilities.auth_utils import role_required
+from services.tally_accumulator_service import (
+    apply_ballot_to_accumulators,
+    apply_ballots_to_accumulators,
+)
+from services.wbb_service import allocate_positions, append_leaves
+from services.wbb_upkeep import request_upkeep
+from services.candidate_cache import candidates_for
+from services.wbb_feed import notify_board
 
 SGT = ZoneInfo("Asia/Singapore")
 cast_vote_bp = Blueprint("cast_vote", __name__)
 
+TRACKER_RE = re.compile(r"[0-9a-fA-F]{8,128}")
+BALLOT_SCHEME = "paillier-1hot"
+BATCH_MAX_BALLOTS = int(os.getenv("CAST_VOTE_BATCH_MAX", "500"))
+
+
+def check_ballot(ballot, valid_ids: set, expected_key_id: str, n2: int):
+    """
+    Validate a client-encrypted one-hot ballot against the election's candidate
+    set and the current Paillier key.
+    Returns (error, ciphertexts): error is None on success and ciphertexts is
+    {candidate_id: int}.
+    """
+    if not isinstance(ballot, dict):
+        return "invalid_ballot", None
+    if ballot.get("scheme") != BALLOT_SCHEME:
+        return "unsupported_ballot_scheme", None
+    if ballot.get("key_id") != expected_key_id:  # e.g., "paillier-<12hex>"
+        return "paillier_key_mismatch", None
+
+    entries = ballot.get("entries")
+    if not isinstance(entries, list) or not entries:
+        return "invalid_ballot_entries", None
+    if len(entries) != len(valid_ids):
+        return "ballot_length_mismatch", None
+
+    ciphertexts = {}
+    for ent in entries:
+        cid = ent.get("candidate_id") if isinstance(ent, dict) else None
+        if not cid or cid in ciphertexts or cid not in valid_ids:
+            return "invalid_candidate_in_ballot", None
+        try:
+            c_val = int(ent.get("c"))
+        except Exception:
+            return "ciphertext_not_integer", None
+        if not (1 <= c_val < n2):
+            return "ciphertext_out_of_range", None
+        ciphertexts[cid] = c_val
+    return None, ciphertexts
+
+
+def wbb_hashes(election_id: str, token: str, tracker: str, ballot: dict, ciphertexts: dict):
+    """
+    Bulletin-board material for one ballot: (token_hash, leaf_hash, commitment_hash).
+    The leaf binds election+token_hash+tracker; no candidate is revealed.
+    """
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    leaf_input = f"{election_id}|{token_hash}|{tracker}".encode("utf-8")
+    leaf_hash = hashlib.sha256(leaf_input).hexdigest()
+
+    ordered_entries = sorted(
+        [{"candidate_id": cid, "c": str(c)} for cid, c in ciphertexts.items()],
+        key=lambda x: x["candidate_id"],
+    )
+    commitment_payload = {
+        "election_id": election_id,
+        "key_id": ballot["key_id"],
+        "scheme": ballot["scheme"],
+        "entries": ordered_entries,
+    }
+    commitment_json = json.dumps(commitment_payload, sort_keys=True, separators=(",", ":"))
+    commitment_hash = hashlib.sha256(commitment_json.encode("utf-8")).hexdigest()
+    return token_hash, leaf_hash, commitment_hash
+
+
+def _token_election_hash(election_id: str, token: str) -> str:
+    return hashlib.sha256(f"{election_id}|{token}".encode("utf-8")).hexdigest()
+
+
+class CastGuards(NamedTuple):
+    voter: Optional[tuple]        # (id, is_verified, logged_in) or None
+    election: Optional[Election]
+    ves: Optional[VES]
+    candidate_ids: frozenset
+    token_used: bool
+
+    @property
+    def voter_ok(self) -> bool:
+        return bool(self.voter and self.voter[1] and self.voter[2])
+
+    @property
+    def already_voted(self) -> bool:
+        return bool(self.ves and self.ves.voted_at)
+
+
+def load_cast_guards(session, email_hash: str, election_id, token_election_hash) -> CastGuards:
+    """
+    Everything /cast-vote checks before writing, in one statement: the voter,
+    the election, this voter's VES row and whether the scoped token is already
+    spent. Rooted at the voter and outer-joined to the rest, so it returns no
+    row when the voter does not exist. Candidate ids come from the per-process
+    candidate cache, keyed by the election's updated_at.
+    """
+    if token_election_hash:
+        token_used = exists().where(
+            EncryptedCandidateVote.election_id == election_id,
+            EncryptedCandidateVote.token_hash == token_election_hash,
+        )
+    else:
+        token_used = literal(False)
+
+    stmt = (
+        select(Voter.id, Voter.is_verified, Voter.logged_in, Election, VES,
+               token_used.label("token_used"))
+        .select_from(Voter)
+        .outerjoin(Election, Election.id == election_id)
+        .outerjoin(VES, and_(VES.voter_id == Voter.id, VES.election_id == election_id))
+        .where(Voter.email_hash == email_hash)
+    )
+    row = session.execute(stmt).first()
+    if row is None:
+        return CastGuards(None, None, None, frozenset(), False)
+    election = row[3]
+    return CastGuards(
+        voter=(row[0], row[1], row[2]),
+        election=election,
+        ves=row[4],
+        candidate_ids=(candidates_for(session, election.id, election.updated_at).ids
+                       if election is not None else frozenset()),
+        token_used=bool(row[5]),
+    )
+
 @cast_vote_bp.route("/cast-vote", methods=["POST"])
 @limiter.limit("2 per second; 20 per minute")
 def cast_vote():
@@ -30,16 +160,26 @@ def cast_vote():
     email_hash = session.get("email")
     if not email_hash:
         return jsonify({"error": "unauthenticated"}), 401
-    voter = Voter.query.filter_by(email_hash=email_hash).first()
-    if not voter or not voter.is_verified or not voter.logged_in:
+    data = request.get_json() or {}
+    election_id = data.get("election_id")
+    token = data.get("token")
+    if not isinstance(election_id, str):
+        election_id = None
+    token_election_hash = (
+        _token_election_hash(election_id, token)
+        if election_id and isinstance(token, str) else None
+    )
+
+    # one round trip for voter, election, VES, candidate set and token reuse
+    guards = load_cast_guards(db.session, email_hash, election_id, token_election_hash)
+    if not guards.voter_ok:
         return jsonify({"error": "forbidden"}), 403
+    voter_id = guards.voter[0]
 
     # 1) validate request (allow both legacy and E2EE)
-    data = request.get_json() or {}
-    
     # NOW expect tracker (random hex, from client)
     tracker = data.get("tracker")
-    if not (isinstance(tracker, str) and re.fullmatch(r"[0-9a-fA-F]{8,128}", tracker or "")):
+    if not (isinstance(tracker, str) and TRACKER_RE.fullmatch(tracker)):
         return jsonify({"error": "missing_or_invalid_tracker"}), 400
     
     # minimal required always
@@ -47,8 +187,6 @@ def cast_vote():
         if k not in data:
             return jsonify({"error":"missing_fields"}), 400
 
-    election_id: str = data["election_id"]
-    token: str = data["token"]
     signature_hex: str = data["signature"]
     
     # Require client-encrypted ballot; forbid candidate_id
@@ -60,8 +198,8 @@ def cast_vote():
     ballot = data.get("ballot")  # if present, we expect client-side ciphertexts
 
     # 2) election, key, candidate set
-    election = db.session.get(Election, election_id)
-    if not election:
+    election = guards.election
+    if not election or not token_election_hash:
         return jsonify({"error": "invalid_election_id"}), 400
     
     # after loading election
@@ -69,11 +207,21 @@ def cast_vote():
         return jsonify({"error":"election_not_open"}), 403
     
 
+    # 3) REUSE GUARDS (already answered by the guard query), before any RSA work:
+    # replays and retries of a counted ballot stop here
+    # (a) token reuse scoped to election
+    if guards.token_used:
+        return jsonify({"error": "token_already_used"}), 403
+
+    # (b) voter double-vote prevention
+    if guards.already_voted:
+        return jsonify({"error": "already_voted"}), 403
+
     # verify with THIS election's RSA key
     try:
         rsa_pub = load_rsa_pubkey(election.rsa_key_id)
-    except TypeError:
-        rsa_pub = load_rsa_pubkey()
+    except UnknownRsaKey:
+        return jsonify({"error": "unknown_rsa_key_id"}), 500
 
     # OPTIONAL “gold”: verify signature over scoped message:
     # scoped_hex = hashlib.sha256(f"{election_id}|{token}".encode()).hexdigest()
@@ -82,73 +230,23 @@ def cast_vote():
     if not valid_sig:
         return err if isinstance(err, tuple) else (jsonify({"error": "invalid_signature"}), 400)
 
-    candidate_rows = db.session.query(Candidate.id).filter(
-        Candidate.election_id == election_id
-    ).all()
-    valid_ids = {r.id for r in candidate_rows}
-
-    # 3) REUSE GUARDS
-    # (a) token reuse scoped to election
-    token_election_hash = hashlib.sha256(f"{election_id}|{token}".encode("utf-8")).hexdigest()
-    used_token = (
-        db.session.query(EncryptedCandidateVote.id)
-        .filter(EncryptedCandidateVote.token_hash == token_election_hash)
-        .first()
-    )
-    if used_token:
-        return jsonify({"error": "token_already_used"}), 403
-
-    # (b) voter double-vote prevention (this is where your VES check belongs—already here)
-    ves_record = VES.query.filter_by(voter_id=voter.id, election_id=election_id).first()
-    if ves_record and ves_record.voted_at:
-        return jsonify({"error": "already_voted"}), 403
+    valid_ids = guards.candidate_ids
 
     # 4) store encrypted one-hot ballot
-    ppk = load_paillier_public_key()
+    ppk = load_paillier_public_key()   # cached by the key registry
     cast_time = datetime.now(SGT)
-    n2 = ppk.n * ppk.n
-    
-    def _current_paillier_key_id(ppk) -> str:
-        n = int(ppk.n)
-        h = hashlib.sha256(f"paillier|{n}".encode("utf-8")).hexdigest()
-        return f"paillier-{h[:12]}"
-    
-    expected_key_id = fingerprint_paillier_n(int(ppk.n))
+    n2 = ppk.nsquare
+    expected_key_id = fingerprint_paillier_n(int(ppk.n))   # memoised per modulus
 
     if ballot:
         # --- E2EE path: client supplied ciphertexts ---
+        err, ballot_cts = check_ballot(ballot, valid_ids, expected_key_id, n2)
+        if err:
+            return jsonify({"error": err}), 400
 
-        # 1. Check ballot scheme
-        if ballot.get("scheme") != "paillier-1hot":
-            return jsonify({"error": "unsupported_ballot_scheme"}), 400
-
-        # 2. Check key ID
-        expected_kid = fingerprint_paillier_n(int(ppk.n))  # e.g., "paillier-<12hex>"
-        if ballot.get("key_id") != expected_kid:
-            return jsonify({"error": "paillier_key_mismatch"}), 400
-        
-        if ballot.get("key_id") != expected_key_id:
-            return jsonify({"error": "mismatched_paillier_key"}), 400
-        if ballot.get("scheme") != "paillier-1hot":
-            return jsonify({"error": "unsupported_ballot_scheme"}), 400
-        entries = ballot.get("entries")
-        if not isinstance(entries, list) or not entries:
-            return jsonify({"error": "invalid_ballot_entries"}), 400
-        if len(entries) != len(valid_ids):
-            return jsonify({"error": "ballot_length_mismatch"}), 400
-        seen = set()
-        for ent in entries:
-            cid = ent.get("candidate_id")
-            c_str = ent.get("c")
-            if not cid or cid in seen or cid not in valid_ids:
-                return jsonify({"error": "invalid_candidate_in_ballot"}), 400
-            seen.add(cid)
-            try:
-                c_val = int(c_str)
-            except Exception:
-                return jsonify({"error":"ciphertext_not_integer"}), 400
-            if not (1 <= c_val < n2):
-                return jsonify({"error":"ciphertext_out_of_range"}), 400
+        # running encrypted tally: queue this ballot's ciphertexts (insert only, no lock)
+        apply_ballot_to_accumulators(db.session, election_id, ballot_cts, n2)
+        for cid, c_val in ballot_cts.items():
             db.session.add(EncryptedCandidateVote(
                 candidate_id=cid,
                 vote_ciphertext=str(c_val),
@@ -178,30 +276,15 @@ def cast_vote():
         #     ))
 
     # 4.5) Append to WBB (after successful guards, before commit)
-    token_hash = hashlib.sha256(data["token"].encode("utf-8")).hexdigest()
-    # bind election+token_hash+tracker; no candidate revealed
-    leaf_input = f"{election_id}|{token_hash}|{tracker}".encode("utf-8")
-    leaf_hash  = hashlib.sha256(leaf_input).hexdigest()
-    
-    ordered_entries = sorted(
-    [{"candidate_id": ent["candidate_id"], "c": str(int(ent["c"]))} for ent in ballot["entries"]],
-    key=lambda x: x["candidate_id"],
-    )
-
-    commitment_payload = {
-        "election_id": election_id,
-        "key_id": ballot["key_id"],
-        "scheme": ballot["scheme"],
-        "entries": ordered_entries,
-    }
-    commitment_json = json.dumps(commitment_payload, sort_keys=True, separators=(",", ":"))
-    commitment_hash = hashlib.sha256(commitment_json.encode("utf-8")).hexdigest()
+    token_hash, leaf_hash, commitment_hash = wbb_hashes(election_id, token, tracker, ballot, ballot_cts)
 
-    # next position
-    last = db.session.query(WbbEntry.position).filter_by(election_id=election_id)\
-            .order_by(WbbEntry.position.desc()).first()
-    next_pos = (last[0] + 1) if last else 0
+    # 5) mark voted
+    mark_voted(voter_id, election_id, ves=guards.ves)
 
+    # next position: per-election counter (its row lock never outlives the bump on PostgreSQL);
+    # only the leaf is stored here, the tree above it is built after commit
+    next_pos = allocate_positions(db.session, election_id)
+    append_leaves(db.session, election_id, next_pos, [leaf_hash])
     db.session.add(WbbEntry(
         election_id=election_id,
         tracker=tracker,
@@ -210,11 +293,16 @@ def cast_vote():
         leaf_hash=leaf_hash,
         commitment_hash=commitment_hash,
     ))
-    
-    # 5) mark voted
-    mark_voted(voter.id, election_id)
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # the token was spent concurrently, or this position was sealed as a gap meanwhile
+        db.session.rollback()
+        return jsonify({"error": "vote_conflict_retry"}), 409
+    # tree, tree head and tally fold are settled by the upkeep thread (services/wbb_upkeep)
+    request_upkeep(current_app._get_current_object(), election_id, n2)
+    notify_board(election_id)        # push to /wbb/<id>/events watchers in this process
     return jsonify({
         "message": "✅ Vote cast successfully.",
         "tracker": tracker,
@@ -222,9 +310,146 @@ def cast_vote():
     }), 200
 
 
-def mark_voted(voter_id: int, election_id: str):
-    ves = VES.query.filter_by(voter_id=voter_id, election_id=election_id).one_or_none()
+def mark_voted(voter_id: int, election_id: str, ves=None):
+    # `ves` may be passed in when the caller has already loaded the row
+    if ves is None:
+        ves = VES.query.filter_by(voter_id=voter_id, election_id=election_id).one_or_none()
     if not ves:
         ves = VES(voter_id=voter_id, election_id=election_id)
         db.session.add(ves)
     ves.voted_at = datetime.now(SGT)
+
+
+@cast_vote_bp.route("/cast-vote/batch", methods=["POST"])
+@limiter.limit("1 per second; 10 per minute")
+@role_required("admin")
+def cast_vote_batch():
+    """
+    Drain ballots collected offline (polling stations / kiosks) in one request.
+    Each ballot is independently blind-signed and anonymous, so there is no
+    per-voter VES update here: the token-reuse guard is what stops a token being
+    spent twice.
+
+    Body:    { "election_id": str, "ballots": [ {token, signature, tracker, ballot}, ... ] }
+    Returns: { "accepted", "rejected", "results": [ {index, status, tracker?, position? | error} ] }
+    """
+    data = request.get_json(silent=True) or {}
+    election_id = data.get("election_id")
+    items = data.get("ballots")
+    if not isinstance(election_id, str) or not isinstance(items, list) or not items:
+        return jsonify({"error": "missing_fields"}), 400
+    if len(items) > BATCH_MAX_BALLOTS:
+        return jsonify({"error": "batch_too_large", "max": BATCH_MAX_BALLOTS}), 413
+
+    election = db.session.get(Election, election_id)
+    if not election:
+        return jsonify({"error": "invalid_election_id"}), 400
+    if not (election.is_active and election.has_started and not election.has_ended):
+        return jsonify({"error": "election_not_open"}), 403
+
+    try:
+        rsa_pub = load_rsa_pubkey(election.rsa_key_id)
+    except UnknownRsaKey:
+        return jsonify({"error": "unknown_rsa_key_id"}), 500
+    ppk = load_paillier_public_key()
+    n2 = ppk.nsquare
+    expected_key_id = fingerprint_paillier_n(int(ppk.n))
+    valid_ids = candidates_for(db.session, election_id, election.updated_at).ids
+
+    results = [None] * len(items)
+    pending = {}  # token_election_hash -> prepared ballot
+
+    def _reject(i, error):
+        results[i] = {"index": i, "status": "rejected", "error": error}
+
+    # 1) stateless checks per ballot: shape, ballot content
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            _reject(i, "invalid_item"); continue
+        tracker, token, signature_hex = item.get("tracker"), item.get("token"), item.get("signature")
+        if not (isinstance(tracker, str) and TRACKER_RE.fullmatch(tracker)):
+            _reject(i, "missing_or_invalid_tracker"); continue
+        if not isinstance(token, str) or not isinstance(signature_hex, str):
+            _reject(i, "missing_fields"); continue
+        if "candidate_id" in item:
+            _reject(i, "do_not_send_candidate_id"); continue
+
+        err, cts = check_ballot(item.get("ballot"), valid_ids, expected_key_id, n2)
+        if err:
+            _reject(i, err); continue
+
+        teh = _token_election_hash(election_id, token)
+        if teh in pending:
+            _reject(i, "duplicate_token_in_batch"); continue
+        pending[teh] = {"index": i, "token": token, "signature": signature_hex,
+                        "tracker": tracker, "ballot": item["ballot"], "cts": cts}
+
+    # 2) token reuse for the whole batch in one IN query, before any RSA work
+    if pending:
+        used = (
+            db.session.query(EncryptedCandidateVote.token_hash)
+            .filter(EncryptedCandidateVote.token_hash.in_(list(pending)))
+            .distinct()
+            .all()
+        )
+        for (teh,) in used:
+            _reject(pending.pop(teh)["index"], "token_already_used")
+
+    # 3) RSA signature for what is left
+    for teh, p in list(pending.items()):
+        valid_sig, _, _ = parse_and_verify_signature(p["token"], p["signature"], rsa_pub)
+        if not valid_sig:
+            _reject(pending.pop(teh)["index"], "invalid_signature")
+
+    # 4) tally partials + bulk insert of every accepted ballot, one transaction
+    accepted = sorted(pending.items(), key=lambda kv: kv[1]["index"])
+    if accepted:
+        apply_ballots_to_accumulators(db.session, election_id, [p["cts"] for _, p in accepted], n2)
+
+        first_pos = allocate_positions(db.session, election_id, count=len(accepted))
+
+        cast_time = datetime.now(SGT)
+        vote_rows, wbb_rows = [], []
+        for offset, (teh, p) in enumerate(accepted):
+            token_hash, leaf_hash, commitment_hash = wbb_hashes(
+                election_id, p["token"], p["tracker"], p["ballot"], p["cts"]
+            )
+            position = first_pos + offset
+            vote_rows.extend({
+                "candidate_id": cid,
+                "vote_ciphertext": str(c_val),
+                "vote_exponent": 0,
+                "token_hash": teh,
+                "cast_at": cast_time,
+                "election_id": election_id,
+            } for cid, c_val in p["cts"].items())
+            wbb_rows.append({
+                "election_id": election_id,
+                "tracker": p["tracker"],
+                "token_hash": token_hash,
+                "position": position,
+                "leaf_hash": leaf_hash,
+                "commitment_hash": commitment_hash,
+                "created_at": cast_time,
+            })
+            results[p["index"]] = {"index": p["index"], "status": "accepted",
+                                   "tracker": p["tracker"], "position": position}
+
+        try:
+            append_leaves(db.session, election_id, first_pos, [r["leaf_hash"] for r in wbb_rows])
+            db.session.execute(insert(EncryptedCandidateVote), vote_rows)
+            db.session.execute(insert(WbbEntry), wbb_rows)
+            db.session.commit()
+        except IntegrityError:
+            # a token was spent or a position sealed concurrently; nothing was written
+            db.session.rollback()
+            return jsonify({"error": "batch_conflict_retry"}), 409
+        request_upkeep(current_app._get_current_object(), election_id, n2)
+        notify_board(election_id)
+
+    return jsonify({
+        "election_id": election_id,
+        "accepted": len(accepted),
+        "rejected": len(items) - len(accepted),
+        "results": results,
+    }), 200
@@ -1,13 +1,24 @@
 # routes/public_keys.py
-from flask import Blueprint, jsonify
-import hashlib
+from flask import Blueprint, jsonify, request
 
-from utilities.blind_signature_utils import load_public_key as load_rsa_public_key
-from utilities.paillier_utils import load_public_key as load_paillier_public_key
-from utilities.key_fingerprint import fingerprint_paillier_n
+from utilities.key_registry import (
+    load_rsa_public_key,
+    load_paillier_public_key,
+    UnknownRsaKey,
+    describe_rsa,
+    describe_paillier,
+)
 
 keys_bp = Blueprint("keys", __name__)
 
+def _describe_election_rsa():
+    """RSA key for ?rsa_key_id= (an election's keyring id), else the deployment key."""
+    rsa_key_id = request.args.get("rsa_key_id")
+    out = describe_rsa(*_rsa_numbers(load_rsa_public_key(rsa_key_id)))
+    if rsa_key_id:
+        out["rsa_key_id"] = rsa_key_id
+    return out
+
 def _rsa_numbers(pub):
     """
     Support both cryptography and PyCryptodome-style RSA public keys.
@@ -26,18 +37,17 @@ def _rsa_numbers(pub):
         raise ValueError("Unsupported RSA public key type")
     return int(n), int(e)
 
-def _fingerprint(label: str, *parts: int) -> str:
-    h = hashlib.sha256(("|".join([label, *map(str, parts)])).encode("utf-8")).hexdigest()
-    return h[:12]  # short key id
-
 @keys_bp.get("/public-keys")
 def get_public_keys():
     """
     One-stop public keys endpoint for the frontend.
+    Keys come from the process-wide registry (parsed once, reloaded on file change).
+
+    ?rsa_key_id=<Election.rsa_key_id> selects that election's blind-signing key.
 
     Returns:
     {
-      "rsa":      { "key_id", "nHex", "eDec", "bits" },
+      "rsa":      { "key_id", "nHex", "eDec", "bits" [, "rsa_key_id"] },
       "paillier": { "key_id", "nHex", "bits" }
     }
     """
@@ -45,26 +55,13 @@ def get_public_keys():
 
     # RSA (for blind-sign)
     try:
-        rsa_pub = load_rsa_public_key()
-        n, e = _rsa_numbers(rsa_pub)
-        out["rsa"] = {
-            "key_id": f"rsa-{_fingerprint('rsa', n, e)}",
-            "nHex": hex(n)[2:],         # hex modulus without 0x
-            "eDec": str(e),             # decimal exponent (e.g., 65537)
-            "bits": n.bit_length(),
-        }
+        out["rsa"] = _describe_election_rsa()
     except Exception as exc:
         out["rsa_error"] = f"{type(exc).__name__}: {exc}"
 
     # Paillier (for ballot encryption client-side if ever needed)
     try:
-        ppk = load_paillier_public_key()
-        n = int(ppk.n)
-        out["paillier"] = {
-            "key_id": fingerprint_paillier_n(n),
-            "nHex": hex(n)[2:],
-            "bits": n.bit_length(),
-        }
+        out["paillier"] = describe_paillier(load_paillier_public_key().n)
     except Exception as exc:
         out["paillier_error"] = f"{type(exc).__name__}: {exc}"
 
@@ -75,18 +72,11 @@ def get_public_keys():
 # (Optional) narrower endpoints if you prefer:
 @keys_bp.get("/public-keys/rsa")
 def get_rsa_key():
-    rsa_pub = load_rsa_public_key()
-    n, e = _rsa_numbers(rsa_pub)
-    return jsonify({
-        "key_id": f"rsa-{_fingerprint('rsa', n, e)}",
-        "nHex": hex(n)[2:], "eDec": str(e), "bits": n.bit_length(),
-    }), 200
+    try:
+        return jsonify(_describe_election_rsa()), 200
+    except UnknownRsaKey:
+        return jsonify({"error": "unknown_rsa_key_id"}), 404
 
 @keys_bp.get("/public-keys/paillier")
 def get_paillier_key():
-    ppk = load_paillier_public_key()
-    n = int(ppk.n)
-    return jsonify({
-        "key_id": f"paillier-{_fingerprint('paillier', n)}",
-        "nHex": hex(n)[2:], "bits": n.bit_length(),
-    }), 200
+    return jsonify(describe_paillier(load_paillier_public_key().n)), 200
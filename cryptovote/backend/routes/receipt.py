@@ -1,5 +1,7 @@
 # routes/receipt.py
+import math
 import os
+from functools import lru_cache
 from io import BytesIO
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -9,9 +11,11 @@ from flask import Blueprint, request, make_response
 try:
     from models.db import db
     from models.wbb_entry import WbbEntry
+    from services.wbb_service import inclusion_proof, get_tree_head, tree_head_dict
 except Exception:
     from cryptovote.backend.models import db  # type: ignore
     from cryptovote.backend.models.wbb_entry import WbbEntry  # type: ignore
+    from cryptovote.backend.services.wbb_service import inclusion_proof, get_tree_head, tree_head_dict  # type: ignore
 
 SGT = ZoneInfo("Asia/Singapore")
 receipt_bp = Blueprint("receipt", __name__)
@@ -21,105 +25,179 @@ try:
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import letter
     from reportlab.lib.utils import ImageReader
+    from PIL import Image
     HAVE_PDF = True
 except Exception:
     HAVE_PDF = False
 
+PAGE_MARGIN = 56
+LOGO_HEIGHT = 36            # points
+# logos are resampled once to this print resolution; the NTU source is 5000px wide
+# and re-encoding it at full size was most of the cost of every receipt
+LOGO_DPI = int(os.getenv("RECEIPT_LOGO_DPI", "300"))
+
 
 def _asset_path(filename: str) -> str:
     here = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(here, "..", "assets", filename)
 
 
+@lru_cache(maxsize=1)
+def _logos() -> tuple:
+    """
+    (ImageReader, x, y, w, h) per logo, decoded and downscaled once per process.
+    Missing or unreadable files are left out, as before.
+    """
+    page_w, page_h = letter
+    y_top = page_h - PAGE_MARGIN
+    out = []
+    for filename, x in (("ntu_logo.png", PAGE_MARGIN), ("cryptovote_logo.png", page_w - PAGE_MARGIN - 80)):
+        path = _asset_path(filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            with Image.open(path) as src:
+                img = src.copy()
+            iw, ih = img.size
+            w = iw * LOGO_HEIGHT / ih
+            px_h = math.ceil(LOGO_HEIGHT / 72 * LOGO_DPI)
+            if ih > px_h:
+                img = img.resize((max(1, round(iw * px_h / ih)), px_h), Image.LANCZOS)
+            reader = ImageReader(img)
+            reader.getRGBData()         # decode now; later requests (any thread) reuse it
+            out.append((reader, x, y_top - LOGO_HEIGHT, w, LOGO_HEIGHT))
+        except Exception:
+            pass
+    return tuple(out)
+
+
+def _chunks(s: str, width: int):
+    return [s[i:i + width] for i in range(0, len(s), width)]
+
+
+def _proof_lines(proof: dict) -> list[str]:
+    """Receipt lines that let the voter re-check inclusion against the signed root."""
+    lines = [f"Leaf hash: {proof['leaf_hash']}"]
+    if proof.get("pending"):
+        lines.append("Inclusion pending - no signed tree head covers this entry yet; "
+                     "see /wbb/<election_id>/proof later.")
+        return lines
+    lines += [
+        f"Board size: {proof['count']}",
+        f"Merkle root: {proof['root']}",
+        "Merkle path (bottom-up):",
+    ]
+    lines += [f"  {i}: {node}" for i, node in enumerate(proof["path"])]
+    sth = proof["sth"]
+    lines.append(f"Root signed: {sth['timestamp']} ms, key {sth['key_id']}")
+    lines.append("Root signature:")
+    lines += [f"  {part}" for part in _chunks(sth["signature"], 96)]
+    return lines
+
+
+def render_receipt_pdf(election_name: str, election_id: str, ts: str, tracker: str,
+                       tracker_ok: bool, index, proof) -> bytes:
+    """
+    One receipt page. Logos and their placement come from _logos(); only the
+    text is laid out per call. (ReportLab cannot reuse a form XObject from one
+    document in another, so the cached part is the decoded, print-sized image.)
+    """
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.setTitle(f"Vote receipt — {election_name}")
+
+    page_w, page_h = letter
+    margin = PAGE_MARGIN
+    y = page_h - margin
+
+    # --- logos (optional) ---
+    for img, x, y0, w, h in _logos():
+        c.drawImage(img, x, y0, width=w, height=h, mask="auto")
+    y -= 60
+
+    # --- title ---
+    c.setFont("Helvetica-Bold", 16)
+    title = f"{election_name} — Vote received"
+    title_w = c.stringWidth(title, "Helvetica-Bold", 16)
+    c.drawString((page_w - title_w) / 2, y, title)
+    y -= 30
+
+    # --- meta ---
+    c.setFont("Helvetica", 12)
+    c.drawString(margin, y, f"Timestamp: {ts}"); y -= 18
+    c.drawString(margin, y, f"Election ID: {election_id}"); y -= 18
+
+    # --- tracker (NEW) ---
+    if tracker:
+        c.drawString(margin, y, f"Tracker: {tracker}"); y -= 18
+        if tracker_ok:
+            c.setFillColorRGB(0.1, 0.5, 0.1)
+            c.drawString(margin, y, f"Inclusion: Yes ✓  (index {index})")
+            c.setFillColorRGB(0, 0, 0)
+        else:
+            c.setFillColorRGB(0.7, 0.2, 0.2)
+            c.drawString(margin, y, "Inclusion: Not found yet — check the bulletin board later.")
+            c.setFillColorRGB(0, 0, 0)
+        y -= 24
+
+        c.setFont("Helvetica-Oblique", 11)
+        c.drawString(margin, y, "Use this tracker to verify your entry is posted on the bulletin board.")
+        y -= 18
+        c.setFont("Helvetica", 12)
+
+        if proof:
+            c.setFont("Courier", 7)
+            for line in _proof_lines(proof):
+                c.drawString(margin, y, line); y -= 9
+            y -= 9
+            c.setFont("Helvetica", 12)
+
+    # --- disclaimer ---
+    c.setFont("Helvetica-Oblique", 11)
+    c.drawString(margin, y, "This receipt contains no voting choices and cannot be used to prove how you voted.")
+    y -= 16
+    c.drawString(margin, y, "Keep this reference if you need to contact support.")
+
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
 @receipt_bp.get("/voter/receipt")
 def voter_receipt():
     # -------- request inputs --------
     election_name = (request.args.get("election_name") or "Election").strip()
     election_id = (request.args.get("election_id") or "-").strip()
     tracker = (request.args.get("tracker") or "").strip()
-    ts = datetime.now(SGT).strftime("%d %b %Y, %H:%M %Z")
+    ts = datetime.now(SGT).strftime("%d %b %Y, %H:%M") + " SGT"   # %Z gives "+08"
 
     # -------- optional WBB check --------
+    # One indexed lookup, then the path and root from stored tree nodes, proved
+    # against the latest signed tree head (heads are only signed every
+    # WBB_STH_INTERVAL, so the live tree size rarely has one).
     tracker_ok = False
     index = None
+    proof = None
     if tracker and election_id:
-        q = db.session.query(WbbEntry).filter_by(
-            election_id=election_id
-        ).order_by(WbbEntry.position.asc())
-        entries = q.all()
-        for i, e in enumerate(entries):
-            if e.tracker == tracker:
-                tracker_ok = True
-                index = e.position
-                break
+        e = db.session.query(WbbEntry)\
+            .filter(WbbEntry.election_id == election_id, WbbEntry.tracker == tracker)\
+            .order_by(WbbEntry.position.asc())\
+            .first()
+        if e is not None:
+            tracker_ok = True
+            index = e.position
+            proof = {"leaf_hash": e.leaf_hash, "pending": True}
+            sth = get_tree_head(db.session, election_id)
+            if sth is not None and e.position < sth.tree_size:
+                count, root, path = inclusion_proof(db.session, election_id, e.position, sth.tree_size)
+                if root == sth.root:
+                    proof.update(pending=False, count=count, root=root, path=path, sth=tree_head_dict(sth))
 
     # -------- PDF path --------
     if HAVE_PDF:
-        buf = BytesIO()
-        c = canvas.Canvas(buf, pagesize=letter)
-        c.setTitle(f"Vote receipt — {election_name}")
-
-        page_w, page_h = letter
-        margin = 56
-        y = page_h - margin
-
-        # --- logos (optional) ---
-        def draw_logo(path, x, y_top, target_h=36):
-            if os.path.exists(path):
-                try:
-                    img = ImageReader(path)
-                    iw, ih = img.getSize()
-                    scale = target_h / ih
-                    w = iw * scale
-                    h = target_h
-                    c.drawImage(img, x, y_top - h, width=w, height=h, mask="auto")
-                except Exception:
-                    pass
-
-        draw_logo(_asset_path("ntu_logo.png"), margin, y)
-        draw_logo(_asset_path("cryptovote_logo.png"), page_w - margin - 80, y)
-        y -= 60
-
-        # --- title ---
-        c.setFont("Helvetica-Bold", 16)
-        title = f"{election_name} — Vote received"
-        title_w = c.stringWidth(title, "Helvetica-Bold", 16)
-        c.drawString((page_w - title_w) / 2, y, title)
-        y -= 30
-
-        # --- meta ---
-        c.setFont("Helvetica", 12)
-        c.drawString(margin, y, f"Timestamp: {ts}"); y -= 18
-        c.drawString(margin, y, f"Election ID: {election_id}"); y -= 18
-
-        # --- tracker (NEW) ---
-        if tracker:
-            c.drawString(margin, y, f"Tracker: {tracker}"); y -= 18
-            if tracker_ok:
-                c.setFillColorRGB(0.1, 0.5, 0.1)
-                c.drawString(margin, y, f"Inclusion: Yes ✓  (index {index})")
-                c.setFillColorRGB(0, 0, 0)
-            else:
-                c.setFillColorRGB(0.7, 0.2, 0.2)
-                c.drawString(margin, y, "Inclusion: Not found yet — check the bulletin board later.")
-                c.setFillColorRGB(0, 0, 0)
-            y -= 24
-
-            c.setFont("Helvetica-Oblique", 11)
-            c.drawString(margin, y, "Use this tracker to verify your entry is posted on the bulletin board.")
-            y -= 18
-            c.setFont("Helvetica", 12)
-
-        # --- disclaimer ---
-        c.setFont("Helvetica-Oblique", 11)
-        c.drawString(margin, y, "This receipt contains no voting choices and cannot be used to prove how you voted.")
-        y -= 16
-        c.drawString(margin, y, "Keep this reference if you need to contact support.")
-
-        c.showPage()
-        c.save()
+        pdf = render_receipt_pdf(election_name, election_id, ts, tracker, tracker_ok, index, proof)
 
-        resp = make_response(buf.getvalue())
+        resp = make_response(pdf)
         resp.headers["Content-Type"] = "application/pdf"
         safe_id = "".join(ch for ch in election_id if ch.isalnum() or ch in ("-", "_")) or "election"
         resp.headers["Content-Disposition"] = f'attachment; filename="vote_receipt_{safe_id}.pdf"'
@@ -137,6 +215,9 @@ def voter_receipt():
     ]
     if tracker:
         lines.append(f"Tracker: {tracker}")
+        if tracker_ok:
+            lines.append(f"Inclusion: Yes (index {index})")
+            lines += _proof_lines(proof)
         lines.append("Use this tracker to verify your entry is posted on the bulletin board.")
     lines.append("This receipt contains no voting choices and cannot be used to prove how you voted.")
     text = "\n".join(lines) + "\n"
@@ -4,11 +4,12 @@ import json
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from models.db import db
-from models.election import Election, Candidate
+from models.election import Election
 from models.candidate_tally import CandidateTally
 from models.voter import Voter
 from models.voter_election_status import VoterElectionStatus as VES
 from utilities.auth_utils import role_required
+from services.candidate_cache import candidates_for
 
 SGT = ZoneInfo("Asia/Singapore")
 results_bp = Blueprint("results", __name__)
@@ -30,9 +31,7 @@ def get_results(election_id):
     if not e:
         return jsonify({"error":"invalid_election_id"}), 404
 
-    cand_rows = db.session.query(Candidate.id, Candidate.name)\
-        .filter(Candidate.election_id == election_id).all()
-    name_map = {c.id: c.name for c in cand_rows}
+    name_map = candidates_for(db.session, election_id, e.updated_at).names
 
     tallies = CandidateTally.query.filter_by(election_id=election_id).all()
     if not tallies or not e.tally_generated:
@@ -64,12 +63,12 @@ def download_audit_bundle(election_id):
     e = db.session.get(Election, election_id)
     if not e:
         return jsonify({"error":"invalid_election_id"}), 404
-    cands = db.session.query(Candidate.id, Candidate.name).filter_by(election_id=election_id).all()
+    cands = candidates_for(db.session, election_id, e.updated_at).ordered
     tallies = CandidateTally.query.filter_by(election_id=election_id).all()
 
     payload = {
         "meta": _edict(e),
-        "candidates": [{"id": c.id, "name": c.name} for c in cands],
+        "candidates": [{"id": cid, "name": name} for cid, name in cands],
         "tallies": [{"candidate_id": t.candidate_id, "total": int(t.total), "computed_at": t.computed_at.isoformat()} for t in tallies],
         "generated_at": datetime.now(SGT).isoformat(),
     }
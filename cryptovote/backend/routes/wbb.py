@@ -1,40 +1,77 @@
 # routes/wbb.py
-from flask import Blueprint, jsonify, request
+import os
+import queue
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from models.db import db
+from sqlalchemy import or_
 from models.wbb_entry import WbbEntry
-from utilities.merkle import merkle_root, merkle_proof
+from services.wbb_service import (
+    board_root, inclusion_proof, board_size, multiproof,
+    get_tree_head, tree_head_dict, consistency_proof,
+    snapshot_chunks, snapshot_length, signed_head_for,
+)
+from services.wbb_feed import subscribe, read_entries, entry_event, format_sse, FeedFull
+from utilities.http_utils import unavailable
+from utilities.key_registry import sth_signing_material, describe_rsa
+from utilities.tree_head_utils import STH_ALG
 
 wbb_bp = Blueprint("wbb", __name__)
 
+WBB_PAGE_SIZE = int(os.getenv("WBB_PAGE_SIZE", "500"))
+WBB_PAGE_MAX = int(os.getenv("WBB_PAGE_MAX", "5000"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("WBB_SSE_HEARTBEAT", "15"))
+SSE_RETRY_AFTER_SECONDS = int(os.getenv("WBB_SSE_RETRY_AFTER", "5"))
+MULTIPROOF_MAX = int(os.getenv("WBB_MULTIPROOF_MAX", "5000"))
+
+
+def _signed_head(election_id: str, count: int, root: str):
+    """(root_sig, sth) for this exact root if a tree head was issued for it; (None, None) otherwise."""
+    sth = signed_head_for(db.session, election_id, count, root)
+    return (sth["signature"], sth) if sth else (None, None)
+
 @wbb_bp.get("/wbb/<election_id>")
 def wbb_list(election_id: str):
+    """
+    The board, oldest first, plus the root over the FULL board. Without
+    ?after= or ?limit= the whole board is returned, as it always was; with
+    either, keyset pagination applies (?after=<position>&limit=<n>, default
+    WBB_PAGE_SIZE): follow `next_after` until it is null. Every response
+    carries `count` and `next_after`. The ETag only changes when the board
+    grows, so pollers can send If-None-Match and get a 304 without any entry
+    being read.
+    """
     # Optional: narrow by tracker for a compact per-voter view
     tracker = request.args.get("tracker")
+    after = request.args.get("after", default=-1, type=int)
+    paged = "after" in request.args or "limit" in request.args
+    limit = max(1, min(request.args.get("limit", default=WBB_PAGE_SIZE, type=int), WBB_PAGE_MAX)) \
+        if paged else None
 
-    base_q = db.session.query(WbbEntry)\
-        .filter_by(election_id=election_id)\
-        .order_by(WbbEntry.position.asc())
+    # Root over the FULL set for this election (cached per board size)
+    count, root = board_root(db.session, election_id)
+    etag = f"wbb-{count}-{root[:16]}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
 
+    # only entries the root covers; newer ones show up once the tree reaches them
+    q = db.session.query(WbbEntry)\
+        .filter(WbbEntry.election_id == election_id,
+                WbbEntry.position > after, WbbEntry.position < count)
     if tracker:
-        items = base_q.filter(WbbEntry.tracker == tracker).all()
+        q = q.filter(WbbEntry.tracker == tracker)
+    q = q.order_by(WbbEntry.position.asc())
+    if limit is None:
+        items, more = q.all(), False
     else:
-        items = base_q.all()
+        items = q.limit(limit + 1).all()
+        more = len(items) > limit
+        items = items[:limit]
 
-    # Build root over the FULL set for this election
-    all_entries = base_q.all() if tracker else items
-    if tracker:
-        # If filtered, we still need the full set for an accurate root:
-        all_entries = db.session.query(WbbEntry)\
-            .filter_by(election_id=election_id)\
-            .order_by(WbbEntry.position.asc())\
-            .all()
-
-    leaves = [e.leaf_hash for e in all_entries]
-    root = merkle_root(leaves)
-
-    return jsonify({
+    resp = jsonify({
         "election_id": election_id,
-        "count": len(all_entries),
+        "count": count,
         "root": root,
         "items": [
             {
@@ -44,8 +81,12 @@ def wbb_list(election_id: str):
                 "leaf_hash": e.leaf_hash,
                 "published_at": int(e.created_at.timestamp()),
             } for e in items
-        ]
-    }), 200
+        ],
+        "next_after": items[-1].position if more else None,
+    })
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp, 200
 
 
 @wbb_bp.get("/wbb/<election_id>/proof")
@@ -56,44 +97,237 @@ def wbb_proof(election_id: str):
     if not tracker and not token_hash:
         return jsonify({"error": "provide tracker or token_hash"}), 400
 
-    entries = db.session.query(WbbEntry)\
-        .filter_by(election_id=election_id)\
+    # find the target through the indexed tracker / token_hash columns
+    match = []
+    if tracker:
+        match.append(WbbEntry.tracker == tracker)
+    if token_hash:
+        match.append(WbbEntry.token_hash == token_hash)
+    e = db.session.query(WbbEntry)\
+        .filter(WbbEntry.election_id == election_id, or_(*match))\
         .order_by(WbbEntry.position.asc())\
-        .all()
-
-    if not entries:
-        return jsonify({"found": False, "count": 0}), 200
-
-    # find target index
-    idx = -1
-    for i, e in enumerate(entries):
-        if tracker and e.tracker == tracker:
-            idx = i; break
-        if token_hash and e.token_hash == token_hash:
-            idx = i; break
+        .first()
 
-    leaves = [e.leaf_hash for e in entries]
-    root = merkle_root(leaves)
-
-    if idx == -1:
+    if e is None:
+        count, root = board_root(db.session, election_id)
+        if not count:
+            return jsonify({"found": False, "count": 0}), 200
         return jsonify({
             "found": False,
-            "count": len(entries),
+            "count": count,
             "root": root
         }), 200
 
-    e = entries[idx]
-    return jsonify({
-        "found": True,
-        "entry": {
-            "election_id": e.election_id,
+    count, root, path = inclusion_proof(db.session, election_id, e.position)
+    entry = {
+        "election_id": e.election_id,
+        "tracker": e.tracker,
+        "commitment_hash": getattr(e, "commitment_hash", None),
+        "index": e.position,
+        "leaf_hash": e.leaf_hash,
+        "merkle_path": path,
+        "pending": e.position >= count,      # committed, but the tree has not reached it yet
+        "root": root,
+        "root_sig": None,
+        "sth": None,
+        "published_at": int(e.created_at.timestamp()),
+    }
+
+    # the signed head for the root the voter is shown, if one was issued at this size
+    entry["root_sig"], entry["sth"] = _signed_head(election_id, count, root)   # root_sig signs entry["sth"]
+    return jsonify({"found": True, "entry": entry}), 200
+
+
+@wbb_bp.post("/wbb/<election_id>/multiproof")
+def wbb_multiproof(election_id: str):
+    """
+    Inclusion of many trackers at once: body {"trackers": [...]}. Returns the
+    matched leaves and one deduplicated set of nodes; check it with
+    utilities/merkle.verify_multiproof(count, root, {index: leaf_hash}, proof).
+    """
+    data = request.get_json(silent=True) or {}
+    trackers = data.get("trackers")
+    if not isinstance(trackers, list) or not trackers or \
+            not all(isinstance(t, str) for t in trackers):
+        return jsonify({"error": "provide trackers"}), 400
+    trackers = list(dict.fromkeys(trackers))
+    if len(trackers) > MULTIPROOF_MAX:
+        return jsonify({"error": "too_many_trackers", "max": MULTIPROOF_MAX}), 413
+
+    entries = db.session.query(WbbEntry)\
+        .filter(WbbEntry.election_id == election_id, WbbEntry.tracker.in_(trackers))\
+        .order_by(WbbEntry.position.asc())\
+        .all()
+    found = {}
+    for e in entries:
+        found.setdefault(e.tracker, e)      # first on the board, as in /proof
+    size = board_size(db.session, election_id)      # None: legacy board, rebuilt in memory
+    pending = [t for t, e in found.items() if size is not None and e.position >= size]
+    for t in pending:
+        del found[t]
+    leaves = [
+        {
             "tracker": e.tracker,
-            "commitment_hash": getattr(e, "commitment_hash", None),
             "index": e.position,
             "leaf_hash": e.leaf_hash,
-            "merkle_path": merkle_proof(leaves, idx),
-            "root": root,
-            "root_sig": None,  # fill later if you sign roots
-            "published_at": int(e.created_at.timestamp()),
-        }
+            "commitment_hash": getattr(e, "commitment_hash", None),
+        } for e in found.values()
+    ]
+
+    if leaves:
+        count, root, nodes = multiproof(db.session, election_id, [l["index"] for l in leaves])
+    else:
+        (count, root), nodes = board_root(db.session, election_id), []
+    root_sig, sth = _signed_head(election_id, count, root) if count else (None, None)
+    return jsonify({
+        "election_id": election_id,
+        "count": count,
+        "root": root,
+        "root_sig": root_sig,
+        "sth": sth,
+        "leaves": leaves,
+        "missing": [t for t in trackers if t not in found and t not in pending],
+        "pending": pending,
+        "proof": nodes,
     }), 200
+
+
+@wbb_bp.get("/wbb/<election_id>/snapshot")
+def wbb_snapshot(election_id: str):
+    """
+    The board as one fixed-width binary file (layout in utilities/merkle), as
+    of the latest signed tree head: its size, root and signature are in the
+    header, so the file verifies against the published head. Verifiers mmap
+    it and run utilities/merkle.verify_snapshot() instead of paging through
+    the JSON listing. Streamed, never built in memory.
+    """
+    sth = get_tree_head(db.session, election_id)
+    if sth is None:
+        return jsonify({"error": "no_tree_head"}), 404
+    head = tree_head_dict(sth)
+    count = head["tree_size"]
+
+    resp = Response(
+        stream_with_context(snapshot_chunks(db.session, election_id, head)),
+        mimetype="application/octet-stream",
+    )
+    resp.headers["Content-Length"] = str(snapshot_length(count))
+    resp.headers["Content-Disposition"] = f'attachment; filename="wbb-{election_id}-{count}.cvwbb"'
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@wbb_bp.get("/wbb/sth-key")
+def wbb_sth_key():
+    """Public half of the key that signs tree heads (not the blind-signing key)."""
+    pub = sth_signing_material().public
+    out = describe_rsa(pub.n, pub.e)
+    out["alg"] = STH_ALG
+    resp = jsonify(out)
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp, 200
+
+
+@wbb_bp.get("/wbb/<election_id>/sth")
+def wbb_sth(election_id: str):
+    """
+    Signed tree head. Without ?tree_size= this is the latest head. Heads are
+    signed on the write path (at most every WBB_STH_INTERVAL seconds while
+    ballots arrive, and when the election ends), never by a read.
+    """
+    tree_size = request.args.get("tree_size", type=int)
+    sth = get_tree_head(db.session, election_id, tree_size)
+    if sth is None:
+        return jsonify({"error": "no_tree_head"}), 404
+    return jsonify(tree_head_dict(sth)), 200
+
+
+@wbb_bp.get("/wbb/<election_id>/consistency")
+def wbb_consistency(election_id: str):
+    """
+    Consistency proof between two tree sizes (?first=m&second=n), for monitors
+    that hold the STHs of both: O(log n) nodes instead of the whole board.
+    """
+    first = request.args.get("first", type=int)
+    second = request.args.get("second", type=int)
+    if first is None or second is None or not (1 <= first <= second):
+        return jsonify({"error": "need 1 <= first <= second"}), 400
+
+    size = board_size(db.session, election_id)
+    if size is None or second > size:
+        return jsonify({"error": "tree_size_unknown", "tree_size": size or 0}), 404
+
+    proof = consistency_proof(db.session, election_id, first, second)
+    if proof is None:
+        return jsonify({"error": "board_not_indexed"}), 409
+    return jsonify({
+        "election_id": election_id,
+        "first": first,
+        "second": second,
+        "proof": proof,
+    }), 200
+
+
+@wbb_bp.get("/wbb/<election_id>/events")
+def wbb_events(election_id: str):
+    """
+    Server-sent events: one `entry` event per new board entry (id = position)
+    and a `root` event with {count, root} after each batch. Resume with the
+    Last-Event-ID header (sent automatically by EventSource) or ?after=<position>;
+    anything missed is replayed from the table before live events continue.
+
+    A stream holds its request worker until the client leaves, so this needs
+    an async worker class (gevent/eventlet) or more threads than watchers; past
+    WBB_SSE_MAX_SUBSCRIBERS watchers of one election the answer is a 503 with
+    Retry-After (see services/wbb_feed.py).
+    """
+    after = request.headers.get("Last-Event-ID", type=int)
+    if after is None:
+        after = request.args.get("after", default=-1, type=int)
+    app = current_app._get_current_object()
+    try:
+        sub = subscribe(app, election_id)
+    except FeedFull:
+        return unavailable("too_many_watchers", SSE_RETRY_AFTER_SECONDS)
+
+    def _catch_up(last):
+        # replay from the table, page by page, up to whatever is committed now
+        while True:
+            rows = read_entries(db.session, election_id, last)
+            for e in rows:
+                yield e.position, format_sse(entry_event(e), "entry", e.position)
+            if not rows:
+                break
+            last = rows[-1].position
+        db.session.remove()          # don't pin a DB connection for the life of the stream
+
+    def stream():
+        last = after
+        try:
+            yield "retry: 3000\n\n"
+            for pos, chunk in _catch_up(last):
+                last = pos
+                yield chunk
+            while not sub.dropped:
+                try:
+                    pos, chunk = sub.queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if pos is None:
+                    yield chunk
+                elif pos == last + 1:
+                    last = pos
+                    yield chunk
+                elif pos > last + 1:
+                    # we joined between the replay and the feed's first read: fill the gap
+                    for p, c in _catch_up(last):
+                        last = p
+                        yield c
+        finally:
+            sub.close()
+
+    resp = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
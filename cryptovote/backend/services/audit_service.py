@@ -8,8 +8,10 @@ from models.db import db
 from models.election import Election, Candidate
 from models.candidate_tally import CandidateTally  # <-- NEW
 from services.tallying_service import tally_votes
+from services.tally_accumulator_service import reconcile_accumulators
 from utilities.audit_utils import generate_all_zkp_proofs
 from utilities.logger_utils import log_admin_action
+from utilities.key_registry import paillier_public_material
 
 SGT = ZoneInfo("Asia/Singapore")
 
@@ -121,3 +123,29 @@ def perform_tally(election_id, admin_email, ip_addr):
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+
+
+def perform_reconcile(election_id, admin_email, ip_addr, repair=True):
+    """
+    RECONCILIATION. Rebuilds the running encrypted tallies from
+    encrypted_candidate_votes and reports any candidate whose accumulator diverged.
+    With repair=True the diverging accumulators are overwritten.
+    """
+    try:
+        election = db.session.query(Election).filter_by(id=election_id).first()
+        if not election:
+            return jsonify({"error": "Election not found"}), 404
+
+        report = reconcile_accumulators(db.session, election_id, paillier_public_material().nsquare, repair=repair)
+        db.session.commit()
+
+        try:
+            log_admin_action("reconcile_tally", admin_email, "admin", ip_addr)
+        except Exception as e:
+            print("⚠️ Logging failed:", e)
+
+        return jsonify(report), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
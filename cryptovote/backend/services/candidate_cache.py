@@ -0,0 +1,58 @@
+# services/candidate_cache.py
+import threading
+from typing import NamedTuple, Optional
+from sqlalchemy.orm import Session
+
+from models.election import Candidate
+
+
+class CandidateSet(NamedTuple):
+    version: object               # Election.updated_at when loaded (None = unknown)
+    ordered: tuple                # ((candidate_id, name), ...) sorted by name
+    ids: frozenset
+    names: dict                   # {candidate_id: name}
+
+
+_cache: dict[str, CandidateSet] = {}
+_lock = threading.Lock()
+
+
+def candidates_for(session: Session, election_id: str, version=None) -> CandidateSet:
+    """
+    Candidates of one election, loaded once per process.
+
+    Candidate sets don't change after an election is created, so the cache is
+    only dropped by invalidate_candidates() (create/start/end). Callers that
+    already hold the Election should pass its `updated_at` as `version`: a
+    different value means another process changed the election, and the set is
+    reloaded. Callers without one get whatever is cached.
+    """
+    hit = _cache.get(election_id)
+    if hit is not None and (version is None or hit.version == version):
+        return hit
+
+    rows = (
+        session.query(Candidate.id, Candidate.name)
+        .filter(Candidate.election_id == election_id)
+        .order_by(Candidate.name.asc())
+        .all()
+    )
+    ordered = tuple((cid, name) for cid, name in rows)
+    entry = CandidateSet(
+        version=version,
+        ordered=ordered,
+        ids=frozenset(cid for cid, _ in ordered),
+        names=dict(ordered),
+    )
+    with _lock:
+        _cache[election_id] = entry
+    return entry
+
+
+def invalidate_candidates(election_id: Optional[str] = None):
+    """Drop one election's cached candidates, or all of them."""
+    with _lock:
+        if election_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(election_id, None)
@@ -1,4 +1,5 @@
 # services/election_service.py
+import logging
 from flask import jsonify
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -8,6 +9,10 @@ from sqlalchemy import func
 from models.db import db
 from models.election import Election, Candidate
 from models.encrypted_candidate_vote import EncryptedCandidateVote  # check file name
+from services.tally_accumulator_service import seed_accumulators
+from services.wbb_service import update_board
+from services.candidate_cache import invalidate_candidates
+from utilities.key_registry import has_rsa_key
 
 from utilities.logger_utils import log_admin_action
 
@@ -28,7 +33,11 @@ def start_election_by_id(election_id, admin_email, ip_addr):
         if not election.start_time:
             election.start_time = datetime.now(SGT)
 
+        # empty running tallies up front, so the first ballots don't race to create them
+        seed_accumulators(db.session, election_id)
+
         db.session.commit()
+        invalidate_candidates(election_id)
         log_admin_action("start_election", admin_email, "admin", ip_addr)
         return jsonify({"message": f"✅ Election '{election_id}' started."}), 200
 
@@ -52,6 +61,8 @@ def end_election_by_id(election_id, admin_email, ip_addr):
             election.end_time = datetime.now(SGT)
 
         db.session.commit()
+        invalidate_candidates(election_id)
+        _final_tree_head(election_id)
         log_admin_action("end_election", admin_email, "admin", ip_addr)
         return jsonify({"message": f"🛑 Election '{election_id}' ended."}), 200
 
@@ -60,6 +71,20 @@ def end_election_by_id(election_id, admin_email, ip_addr):
         return jsonify({"error": str(e)}), 500
 
 
+def _final_tree_head(election_id):
+    """
+    Seal every outstanding gap and sign a tree head over everything cast.
+    Best effort: the election has already ended, so a signing or key failure
+    is logged, not returned (services/wbb_upkeep retries the board).
+    """
+    try:
+        update_board(db.session, election_id, force_head=True, seal_gaps=True)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"Final tree head for '{election_id}' failed: {e}")
+
+
 def get_election_status_by_id(election_id, admin_email, ip_addr):
     try:
         election = db.session.query(Election).filter_by(id=election_id).first()
@@ -107,6 +132,8 @@ def create_new_election(data, admin_email, ip_addr):
 
     # ✅ ensure a non-null RSA key id (DB has NOT NULL on rsa_key_id)
     rsa_key_id = (data.get("rsa_key_id") or "default_rsa_key").strip()
+    if not has_rsa_key(rsa_key_id):
+        return jsonify({"error": f"Unknown RSA key id: {rsa_key_id} (expected keys/rsa/<id>.pem)"}), 400
 
     existing = db.session.query(Election).filter_by(id=data["id"]).first()
     if existing:
@@ -139,6 +166,7 @@ def create_new_election(data, admin_email, ip_addr):
             created_candidates.append(created)
 
         db.session.commit()
+        invalidate_candidates(election.id)
         try:
             log_admin_action("create_election", admin_email, "admin", ip_addr)
         except Exception:
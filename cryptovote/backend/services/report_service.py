@@ -8,7 +8,8 @@ import csv
 import os
 
 from models.db import db
-from models.election import Election, Candidate
+from models.election import Election
+from services.candidate_cache import candidates_for
 from services.tallying_service import tally_votes
 from utilities.audit_utils import generate_all_zkp_proofs
 from utilities.logger_utils import log_admin_action
@@ -23,8 +24,8 @@ def _candidate_map_for_election(election_id: str) -> dict[str, str]:
     Return {candidate_id: candidate_name} for this election.
     Falls back to the id if name missing.
     """
-    rows = Candidate.query.filter_by(election_id=election_id).all()
-    return {c.id: (c.name or c.id) for c in rows}
+    cands = candidates_for(db.session, election_id)
+    return {cid: (name or cid) for cid, name in cands.ordered}
 
 
 def generate_report_file(election_id, format_type, admin_email, ip_addr):
@@ -0,0 +1,253 @@
+# services/signing_service.py
+"""
+RSA blind signing for /elections/<id>/blind-sign.
+
+Each election's private key comes from the key registry's keyring, parsed
+once per process (re-read when the file changes) with dP, dQ and qInv derived
+up front, so a signature is two half-size exponentiations (CRT) instead of
+one full pow(c, d, n). Every
+signature is checked with the public exponent before it leaves: a CRT result
+corrupted by a fault would otherwise reveal a factor of n.
+
+With BLIND_SIGN_BACKEND=process the exponentiation runs in a process pool,
+so request threads wait on a future without holding the GIL. At most
+BLIND_SIGN_MAX_INFLIGHT signatures are queued or running; past that, and on
+BLIND_SIGN_TIMEOUT, SignerBusy is raised and the route answers 503 with
+Retry-After rather than letting requests pile up behind the pool.
+
+Signing latency (queueing included) is kept per rsa_key_id in fixed-bucket
+histograms, served to admins by routes/admin/metrics_routes.
+"""
+import atexit
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from utilities.key_registry import RsaSigningMaterial, rsa_signing_material, DEFAULT_RSA_KEY_ID
+from utilities.process_pool import spawn_pool
+from services.signing_worker import SigningFault, crt_sign_numbers, crt_sign_chunk
+
+# upper bounds in milliseconds; anything slower lands in the overflow bucket
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+SIGN_BACKEND = os.getenv("BLIND_SIGN_BACKEND", "inline")          # inline | process
+SIGN_WORKERS = int(os.getenv("BLIND_SIGN_WORKERS", str(os.cpu_count() or 2)))
+SIGN_MAX_INFLIGHT = int(os.getenv("BLIND_SIGN_MAX_INFLIGHT", str(4 * SIGN_WORKERS)))
+SIGN_TIMEOUT_SECONDS = float(os.getenv("BLIND_SIGN_TIMEOUT", "5"))
+SIGN_RETRY_AFTER_SECONDS = int(os.getenv("BLIND_SIGN_RETRY_AFTER", "1"))
+SIGN_BATCH_TIMEOUT_SECONDS = float(os.getenv("BLIND_SIGN_BATCH_TIMEOUT", "60"))
+
+
+class SignerBusy(RuntimeError):
+    """The signing pool is full (or did not answer in time); try again shortly."""
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self.faults = 0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000.0
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, ms)] += 1
+            self._sum_ms += ms
+            self._max_ms = max(self._max_ms, ms)
+
+    def fault(self):
+        with self._lock:
+            self.faults += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            count = sum(self._counts)
+            labels = [f"le_{b}" for b in self.bounds] + ["le_inf"]
+            return {
+                "count": count,
+                "faults": self.faults,
+                "sum_ms": round(self._sum_ms, 3),
+                "mean_ms": round(self._sum_ms / count, 3) if count else None,
+                "max_ms": round(self._max_ms, 3),
+                "histogram": dict(zip(labels, self._counts)),
+            }
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def _histogram(rsa_key_id: str) -> LatencyHistogram:
+    hist = _histograms.get(rsa_key_id)
+    if hist is None:
+        with _histograms_lock:
+            hist = _histograms.setdefault(rsa_key_id, LatencyHistogram())
+    return hist
+
+
+def _crt_params(key: RsaSigningMaterial) -> tuple:
+    return key.n, key.e, key.p, key.q, key.dP, key.dQ, key.qInv
+
+
+def crt_sign(key: RsaSigningMaterial, c: int) -> int:
+    """c^d mod n via Garner's recombination, verified with e before returning."""
+    return crt_sign_numbers(*_crt_params(key), c)
+
+
+class _PoolSigner:
+    """
+    Process pool behind a semaphore. Workers receive the CRT numbers with each
+    call, so they keep no key state and a rotated key needs no worker restart.
+    """
+
+    def __init__(self, workers: int, max_inflight: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = spawn_pool(self.workers)
+            return self._pool
+
+    def sign(self, key: RsaSigningMaterial, c: int, timeout: float) -> int:
+        if not self._slots.acquire(blocking=False):
+            raise SignerBusy("signing queue full")
+        try:
+            future = self._executor().submit(crt_sign_numbers, *_crt_params(key), c)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _f: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise SignerBusy("signing timed out") from None
+        except BrokenProcessPool:
+            self.shutdown()                 # a worker died; the next call starts a fresh pool
+            raise SignerBusy("signing pool restarted") from None
+
+    def sign_many(self, key: RsaSigningMaterial, values: list, timeout: float) -> list:
+        """One chunk per worker, each holding one slot; all-or-nothing on SignerBusy."""
+        size = -(-len(values) // self.workers)
+        chunks = [values[i:i + size] for i in range(0, len(values), size)]
+        taken = 0
+        while taken < len(chunks) and self._slots.acquire(blocking=False):
+            taken += 1
+        if taken < len(chunks):
+            for _ in range(taken):
+                self._slots.release()
+            raise SignerBusy("signing queue full")
+        futures = []
+        try:
+            for chunk in chunks:
+                f = self._executor().submit(crt_sign_chunk, *_crt_params(key), chunk)
+                f.add_done_callback(lambda _f: self._slots.release())
+                futures.append(f)
+        finally:
+            for _ in range(taken - len(futures)):     # slots of chunks never submitted
+                self._slots.release()
+        deadline = time.monotonic() + timeout
+        try:
+            return [s for f in futures for s in f.result(timeout=max(0.0, deadline - time.monotonic()))]
+        except FutureTimeout:
+            raise SignerBusy("signing timed out") from None
+        except BrokenProcessPool:
+            self.shutdown()
+            raise SignerBusy("signing pool restarted") from None
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_pool_signer = None
+_pool_signer_lock = threading.Lock()
+
+
+def _pool() -> _PoolSigner:
+    global _pool_signer
+    with _pool_signer_lock:
+        if _pool_signer is None:
+            _pool_signer = _PoolSigner(SIGN_WORKERS, SIGN_MAX_INFLIGHT)
+            atexit.register(_pool_signer.shutdown)
+        return _pool_signer
+
+
+def shutdown_signing_pool():
+    global _pool_signer
+    with _pool_signer_lock:
+        signer, _pool_signer = _pool_signer, None
+    if signer is not None:
+        signer.shutdown()
+
+
+def signing_key(rsa_key_id: str = None) -> RsaSigningMaterial:
+    """Signing material for an election's rsa_key_id, from the keyring (UnknownRsaKey if absent)."""
+    return rsa_signing_material(rsa_key_id)
+
+
+def sign_blinded_token(blinded_int: int, rsa_key_id: str = None) -> int:
+    key = signing_key(rsa_key_id)
+    hist = _histogram(rsa_key_id or DEFAULT_RSA_KEY_ID)
+    t0 = time.perf_counter()
+    try:
+        if SIGN_BACKEND == "process":
+            s = _pool().sign(key, int(blinded_int), SIGN_TIMEOUT_SECONDS)
+        else:
+            s = crt_sign(key, int(blinded_int))
+    except SigningFault:
+        hist.fault()
+        raise
+    hist.observe(time.perf_counter() - t0)
+    return s
+
+
+def sign_many(blinded_ints: list, rsa_key_id: str = None) -> list:
+    """
+    Batch form of sign_blinded_token: one result per value, in order, where a
+    value that fails (out of range, fault check) gives its exception instead of
+    a signature. With the process backend the batch is spread over all workers.
+    """
+    key = signing_key(rsa_key_id)
+    hist = _histogram(rsa_key_id or DEFAULT_RSA_KEY_ID)
+    values = [int(v) for v in blinded_ints]
+    if not values:
+        return []
+    t0 = time.perf_counter()
+    if SIGN_BACKEND == "process":
+        out = _pool().sign_many(key, values, SIGN_BATCH_TIMEOUT_SECONDS)
+    else:
+        out = crt_sign_chunk(*_crt_params(key), values)
+    per_item = (time.perf_counter() - t0) / len(values)
+    for s in out:
+        if isinstance(s, SigningFault):
+            hist.fault()
+        elif not isinstance(s, Exception):
+            hist.observe(per_item)
+    return out
+
+
+def signing_metrics() -> dict:
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {
+        "backend": SIGN_BACKEND,
+        "buckets_ms": list(LATENCY_BUCKETS_MS),
+        "keys": {key_id: hist.snapshot() for key_id, hist in sorted(items)},
+    }
+
+
+def reset_signing_metrics():
+    with _histograms_lock:
+        _histograms.clear()
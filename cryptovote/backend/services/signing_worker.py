@@ -0,0 +1,29 @@
+# services/signing_worker.py
+"""Signing pool worker functions (see utilities/process_pool)."""
+
+
+class SigningFault(RuntimeError):
+    """A computed signature failed the s^e == c check and was withheld."""
+
+
+def crt_sign_numbers(n: int, e: int, p: int, q: int, dP: int, dQ: int, qInv: int, c: int) -> int:
+    """c^d mod n via Garner's recombination, verified with e before returning."""
+    if not 0 <= c < n:
+        raise ValueError("blinded value out of range")
+    m1 = pow(c, dP, p)
+    m2 = pow(c, dQ, q)
+    s = m2 + (qInv * (m1 - m2) % p) * q
+    if pow(s, e, n) != c:
+        raise SigningFault("signature failed verification")
+    return s
+
+
+def crt_sign_chunk(n: int, e: int, p: int, q: int, dP: int, dQ: int, qInv: int, values: list) -> list:
+    """crt_sign_numbers over many values; a failing value yields its exception instead."""
+    out = []
+    for c in values:
+        try:
+            out.append(crt_sign_numbers(n, e, p, q, dP, dQ, qInv, c))
+        except (ValueError, SigningFault) as exc:
+            out.append(exc)
+    return out
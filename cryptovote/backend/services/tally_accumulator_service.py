@@ -0,0 +1,263 @@
+# services/tally_accumulator_service.py
+"""
+Running encrypted tallies: one Paillier product per (election, candidate).
+
+/cast-vote never touches the accumulator rows. Each ballot (or batch) inserts
+its product per candidate into encrypted_tally_partials, in the ballot's own
+transaction and without locks. fold_partials() later moves committed partials
+into the accumulators under a short lock; the board upkeep thread
+(services/wbb_upkeep) runs it after ballots commit and skips it when another
+process is already folding. Readers multiply in whatever is still pending, so
+the sums are always complete.
+"""
+import logging
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, delete, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from phe import paillier
+
+from models.election import Candidate
+from models.encrypted_candidate_vote import EncryptedCandidateVote
+from models.encrypted_tally_accumulator import EncryptedTallyAccumulator as Accumulator
+from models.encrypted_tally_partial import EncryptedTallyPartial as Partial
+
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def seed_accumulators(session: Session, election_id: str, candidate_ids=None):
+    """
+    Create an empty accumulator ("1" == Enc(0)) for every candidate of the
+    election that doesn't have one yet. Concurrent seeders are fine: rows that
+    already exist are skipped (ON CONFLICT DO NOTHING, or a rolled-back
+    savepoint per row on other databases). Does not commit.
+    """
+    if candidate_ids is None:
+        candidate_ids = [cid for (cid,) in session.query(Candidate.id)
+                         .filter(Candidate.election_id == election_id)]
+    rows = [{"election_id": election_id, "candidate_id": cid, "ciphertext": "1", "ballot_count": 0}
+            for cid in sorted(candidate_ids)]
+    if not rows:
+        return
+    upsert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(Accumulator).on_conflict_do_nothing(index_elements=["election_id", "candidate_id"])
+        with session.begin_nested():
+            session.execute(stmt, rows)
+        return
+    for row in rows:
+        try:
+            with session.begin_nested():
+                session.execute(insert(Accumulator), [row])
+        except IntegrityError:
+            pass
+
+
+def apply_ballot_to_accumulators(session: Session, election_id: str,
+                                 ciphertexts: dict[str, int], nsquare: int):
+    """
+    Queue one ballot for the running sums: one partial row per entry, inserted
+    in the caller's transaction (no reads, no locks). Does not commit.
+    """
+    apply_ballots_to_accumulators(session, election_id, [ciphertexts], nsquare)
+
+
+def apply_ballots_to_accumulators(session: Session, election_id: str,
+                                  ballots: list[dict[str, int]], nsquare: int):
+    """
+    Batch form of apply_ballot_to_accumulators(): the ballots are multiplied
+    together per candidate first, so a batch adds one partial row per candidate.
+    """
+    products: dict[str, int] = {}
+    counts: dict[str, int] = {}
+    for ciphertexts in ballots:
+        for cid, c in ciphertexts.items():
+            products[cid] = products.get(cid, 1) * c % nsquare
+            counts[cid] = counts.get(cid, 0) + 1
+    if not products:
+        return
+    session.execute(insert(Partial), [
+        {"election_id": election_id, "candidate_id": cid,
+         "ciphertext": str(products[cid]), "ballot_count": counts[cid]}
+        for cid in sorted(products)
+    ])
+
+
+def _lock_accumulators(session: Session, election_id: str, skip_locked: bool = False) -> dict:
+    """The election's accumulator rows, locked FOR UPDATE in candidate-id order."""
+    q = (
+        session.query(Accumulator)
+        .filter(Accumulator.election_id == election_id)
+        .order_by(Accumulator.candidate_id)
+        .with_for_update(skip_locked=skip_locked)
+        .populate_existing()
+    )
+    return {a.candidate_id: a for a in q}
+
+
+def fold_partials(session: Session, election_id: str, nsquare: int, skip_locked: bool = False) -> int:
+    """
+    Multiply the election's committed partials into its accumulators and
+    delete them. The accumulators are locked in candidate-id order (seeded
+    first if any are missing) and held only for this fold; partials of ballots
+    still in flight are not visible yet and wait for the next fold. With
+    skip_locked, gives up (returns 0) when another transaction is folding.
+    Returns the number of partial rows folded. Does not commit.
+    """
+    with session.no_autoflush:
+        cids = {cid for (cid,) in session.query(Candidate.id).filter(Candidate.election_id == election_id)}
+        accs = _lock_accumulators(session, election_id, skip_locked)
+        if cids - set(accs):
+            seed_accumulators(session, election_id, cids - set(accs))
+            accs = _lock_accumulators(session, election_id, skip_locked)
+            if skip_locked and cids - set(accs):
+                return 0                 # rows held by a concurrent fold
+        if not accs:
+            return 0
+
+        rows = session.execute(
+            delete(Partial)
+            .where(Partial.election_id == election_id, Partial.candidate_id.in_(list(accs)))
+            .returning(Partial.candidate_id, Partial.ciphertext, Partial.ballot_count)
+            .execution_options(synchronize_session=False)
+        ).all()
+        products: dict[str, int] = {}
+        counts: dict[str, int] = {}
+        for cid, c, n in rows:
+            products[cid] = products.get(cid, 1) * int(c) % nsquare
+            counts[cid] = counts.get(cid, 0) + n
+        for cid in sorted(products):
+            acc = accs[cid]
+            acc.ciphertext = str(int(acc.ciphertext) * products[cid] % nsquare)
+            acc.ballot_count = (acc.ballot_count or 0) + counts[cid]
+    return len(rows)
+
+
+def _recompute_from_ballots(session: Session, election_id: str, nsquare: int):
+    """
+    Full O(ballots) pass over encrypted_candidate_votes.
+    Returns (products, counts, unsupported) where unsupported counts rows with a
+    non-zero exponent, which a raw accumulator cannot represent.
+    """
+    from services.tallying_service import stream_encrypted_votes
+
+    products: dict[str, int] = {}
+    counts: dict[str, int] = {}
+    unsupported = 0
+    for cid, ciphertext, exponent in stream_encrypted_votes(session, election_id):
+        if int(exponent) != 0:
+            unsupported += 1
+            continue
+        try:
+            c = int(ciphertext)
+        except (TypeError, ValueError):
+            unsupported += 1
+            continue
+        products[cid] = products.get(cid, 1) * c % nsquare
+        counts[cid] = counts.get(cid, 0) + 1
+    return products, counts, unsupported
+
+
+def reconcile_accumulators(session: Session, election_id: str, nsquare: int, repair: bool = True) -> dict:
+    """
+    Reconciliation job: recompute the sums from encrypted_candidate_votes and
+    report every candidate whose stored sum (accumulator times pending
+    partials) diverges. With repair=True the accumulators are overwritten and
+    the partials they now cover are deleted (caller commits). Ballots committed
+    while a repair runs may be missed or counted twice; run it on a closed or
+    quiet election, and accumulated_sums() notices a mismatch either way.
+    """
+    with session.no_autoflush:
+        cids = {cid for (cid,) in session.query(Candidate.id).filter(Candidate.election_id == election_id)}
+        if repair:
+            seed_accumulators(session, election_id, cids)
+        stored = _lock_accumulators(session, election_id)
+        pending_q = (
+            delete(Partial).where(Partial.election_id == election_id)
+            .returning(Partial.candidate_id, Partial.ciphertext, Partial.ballot_count)
+            .execution_options(synchronize_session=False)
+            if repair else
+            select(Partial.candidate_id, Partial.ciphertext, Partial.ballot_count)
+            .where(Partial.election_id == election_id)
+        )
+        pending = session.execute(pending_q).all()
+    products, counts, unsupported = _recompute_from_ballots(session, election_id, nsquare)
+
+    have_c = {cid: int(a.ciphertext) for cid, a in stored.items()}
+    have_n = {cid: a.ballot_count or 0 for cid, a in stored.items()}
+    for cid, c, n in pending:
+        have_c[cid] = have_c.get(cid, 1) * int(c) % nsquare
+        have_n[cid] = have_n.get(cid, 0) + n
+
+    cids |= set(stored) | set(products) | set(have_c)
+    diverged = []
+    for cid in sorted(cids):
+        expected_c = products.get(cid, 1)
+        expected_n = counts.get(cid, 0)
+        acc = stored.get(cid)
+        ciphertext_match = cid in have_c and have_c[cid] == expected_c
+        if acc is not None and ciphertext_match and have_n.get(cid) == expected_n:
+            continue
+        diverged.append({
+            "candidate_id": cid,
+            "expected_count": expected_n,
+            "stored_count": have_n.get(cid),
+            "ciphertext_match": ciphertext_match,
+        })
+    if repair:
+        for cid in sorted(cids):
+            acc = stored.get(cid)
+            if acc is None:
+                acc = Accumulator(election_id=election_id, candidate_id=cid)
+                session.add(acc)
+            acc.ciphertext = str(products.get(cid, 1))
+            acc.ballot_count = counts.get(cid, 0)
+
+    return {
+        "election_id": election_id,
+        "candidates_checked": len(cids),
+        "diverged": diverged,
+        "unsupported_rows": unsupported,
+        "repaired": bool(repair and diverged),
+    }
+
+
+def accumulated_sums(session: Session, election_id: str, public_key):
+    """
+    O(candidates + pending partials) read of the running sums as EncryptedNumbers.
+    Accumulators and partials are read in one statement (one snapshot) and
+    multiplied together in memory; nothing is written.
+    Returns None when the election has no accumulators, or when their ballot
+    counts don't add up to the stored ciphertext rows (caller should recompute).
+    """
+    stmt = union_all(
+        select(Accumulator.candidate_id, Accumulator.ciphertext, Accumulator.ballot_count)
+        .where(Accumulator.election_id == election_id),
+        select(Partial.candidate_id, Partial.ciphertext, Partial.ballot_count)
+        .where(Partial.election_id == election_id),
+    )
+    rows = session.execute(stmt).all()
+    if not rows:
+        return None
+
+    nsquare = public_key.nsquare
+    sums: dict[str, int] = {}
+    stored_total = 0
+    for cid, c, n in rows:
+        sums[cid] = sums.get(cid, 1) * int(c) % nsquare
+        stored_total += n or 0
+    actual_total = (
+        session.query(func.count(EncryptedCandidateVote.id))
+        .filter(EncryptedCandidateVote.election_id == election_id)
+        .scalar()
+    ) or 0
+    if stored_total != actual_total:
+        logging.warning(
+            f"⚠️ Accumulators for '{election_id}' cover {stored_total} of {actual_total} ciphertexts."
+        )
+        return None
+
+    return {
+        cid: paillier.EncryptedNumber(public_key, c, 0)
+        for cid, c in sums.items()
+    }
@@ -0,0 +1,18 @@
+# services/tally_worker.py
+"""Tally pool worker functions (see utilities/process_pool)."""
+import logging
+
+
+def multiply_chunk(nsquare: int, chunk: list) -> dict:
+    """Product mod n² per candidate of (candidate_id, ciphertext string) pairs; bad values are logged and skipped."""
+    partial = {}
+    for cid, raw in chunk:
+        try:
+            c = int(raw)
+        except (TypeError, ValueError) as e:
+            logging.error(f"❌ Reconstruct failed for a vote of candidate '{cid}': {e}")
+            continue
+        if c >= nsquare:
+            logging.warning(f"[!] Ciphertext exceeds n² for a vote of candidate '{cid}'. Potential overflow risk.")
+        partial[cid] = partial.get(cid, 1) * c % nsquare
+    return partial
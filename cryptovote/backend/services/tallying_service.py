@@ -1,13 +1,36 @@
 # services/tallying_service.py
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+import atexit
 import logging
+import os
+import secrets
+import threading
 from phe import paillier
 
 from models.encrypted_candidate_vote import EncryptedCandidateVote
 from models.election import Candidate
-from utilities.paillier_utils import load_private_key, load_public_key
+from services.tally_accumulator_service import accumulated_sums
+from services.candidate_cache import candidates_for
+from services.tally_worker import multiply_chunk
+from utilities.key_registry import paillier_public_material, paillier_private_material
+from utilities.process_pool import spawn_pool
+
+# Which aggregation engine tally_votes() uses when the caller doesn't pick one.
+# "incremental" decrypts the per-candidate accumulators maintained by /cast-vote
+# and falls back to "raw" when they're missing or out of step.
+TALLY_ENGINE = os.getenv("TALLY_ENGINE", "incremental")
+INCREMENTAL_ENGINE = "incremental"
+# Process pool sizing for the parallel engine (0 -> one worker per core).
+TALLY_WORKERS = int(os.getenv("TALLY_WORKERS", "0")) or None
+TALLY_CHUNK_SIZE = int(os.getenv("TALLY_CHUNK_SIZE", "4096"))
+# Stream (candidate_id, ciphertext, exponent) tuples instead of loading ORM rows.
+TALLY_STREAM = os.getenv("TALLY_STREAM", "1") == "1"
+TALLY_FETCH_BATCH = int(os.getenv("TALLY_FETCH_BATCH", "1000"))
+# Bits per candidate count when sums are packed for decryption (counts must stay below 2**(bits-1)).
+TALLY_PACK_DIGIT_BITS = int(os.getenv("TALLY_PACK_DIGIT_BITS", "64"))
 
 
 def fetch_encrypted_votes(session: Session, election_id: str):
@@ -22,6 +45,25 @@ def fetch_encrypted_votes(session: Session, election_id: str):
     )
 
 
+def stream_encrypted_votes(session: Session, election_id: str, batch_size: int | None = None):
+    """
+    Yield (candidate_id, vote_ciphertext, vote_exponent) rows for this election.
+    yield_per makes the ORM use a server-side cursor (stream_results), so only one
+    batch of ciphertext strings is held in memory while the accumulator consumes them.
+    """
+    q = (
+        session.query(
+            EncryptedCandidateVote.candidate_id,
+            EncryptedCandidateVote.vote_ciphertext,
+            EncryptedCandidateVote.vote_exponent,
+        )
+        .join(Candidate, Candidate.id == EncryptedCandidateVote.candidate_id)
+        .filter(Candidate.election_id == election_id)
+        .execution_options(yield_per=batch_size or TALLY_FETCH_BATCH)
+    )
+    yield from q
+
+
 def reconstruct_encrypted_number(public_key, vote: EncryptedCandidateVote):
     """
     Reconstruct a Paillier EncryptedNumber from stored ciphertext/exponent.
@@ -33,11 +75,11 @@ def reconstruct_encrypted_number(public_key, vote: EncryptedCandidateVote):
 
         if ciphertext >= public_key.nsquare:
             logging.warning(
-                f"[!] Ciphertext exceeds n² for vote {vote.id}. Potential overflow risk."
+                f"[!] Ciphertext exceeds n² for vote {getattr(vote, 'id', '?')}. Potential overflow risk."
             )
         return enc
     except Exception as e:
-        logging.error(f"❌ Reconstruct failed for vote {vote.id}: {e}")
+        logging.error(f"❌ Reconstruct failed for vote {getattr(vote, 'id', '?')}: {e}")
         return None
 
 
@@ -57,15 +99,235 @@ def aggregate_votes(votes, public_key):
     return tally_map
 
 
+def _raw_ciphertext(vote, nsquare: int):
+    """
+    Parse vote_ciphertext straight to int for the exponent-0 fast paths.
+    Returns None (and logs) when the stored value is unusable.
+    """
+    try:
+        c = int(vote.vote_ciphertext)
+    except (TypeError, ValueError) as e:
+        logging.error(f"❌ Reconstruct failed for vote {getattr(vote, 'id', '?')}: {e}")
+        return None
+    if c >= nsquare:
+        logging.warning(
+            f"[!] Ciphertext exceeds n² for vote {getattr(vote, 'id', '?')}. Potential overflow risk."
+        )
+    return c
+
+
+def _finish_raw_tally(products: dict, leftovers: list, public_key):
+    """
+    Wrap each per-candidate running product in a single EncryptedNumber and
+    fold in the rows that needed the phe path (non-zero exponent).
+    """
+    tally_map = {
+        cid: paillier.EncryptedNumber(public_key, prod, 0)
+        for cid, prod in products.items()
+    }
+    for v in leftovers:
+        enc = reconstruct_encrypted_number(public_key, v)
+        if enc is None:
+            continue
+        tally_map[v.candidate_id] = (
+            tally_map[v.candidate_id] + enc if v.candidate_id in tally_map else enc
+        )
+    return tally_map
+
+
+def aggregate_votes_raw(votes, public_key):
+    """
+    Same result as aggregate_votes(), without an EncryptedNumber per row:
+    exponent-0 ciphertexts (everything cast_vote stores) are kept as a running
+    product c = c * x mod n² per candidate. Other exponents fall back to phe.
+    Returns: dict[candidate_id] -> EncryptedNumber
+    """
+    nsquare = public_key.nsquare
+    products: dict[str, int] = {}
+    leftovers = []
+
+    for v in votes:
+        if int(v.vote_exponent) != 0:
+            leftovers.append(v)
+            continue
+        c = _raw_ciphertext(v, nsquare)
+        if c is None:
+            continue
+        cid = v.candidate_id
+        products[cid] = products.get(cid, 1) * c % nsquare
+
+    return _finish_raw_tally(products, leftovers, public_key)
+
+
+_tally_pool = None
+_tally_pool_workers = None
+_tally_pool_lock = threading.Lock()
+
+
+def _pool(workers=None) -> ProcessPoolExecutor:
+    """The process-wide tally pool (utilities/process_pool), replaced when the worker count changes."""
+    global _tally_pool, _tally_pool_workers
+    workers = workers or TALLY_WORKERS or os.cpu_count() or 1
+    with _tally_pool_lock:
+        if _tally_pool is not None and _tally_pool_workers != workers:
+            _tally_pool.shutdown(wait=False, cancel_futures=True)
+            _tally_pool = None
+        if _tally_pool is None:
+            _tally_pool = spawn_pool(workers)
+            _tally_pool_workers = workers
+        return _tally_pool
+
+
+def shutdown_tally_pool():
+    global _tally_pool
+    with _tally_pool_lock:
+        pool, _tally_pool = _tally_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_tally_pool)
+
+
+def aggregate_votes_parallel(votes, public_key, workers=None, chunk_size=None):
+    """
+    Same result as aggregate_votes(), with exponent-0 ciphertexts multiplied
+    in chunks on the tally pool; other exponents fall back to phe.
+    Returns: dict[candidate_id] -> EncryptedNumber
+    """
+    nsquare = public_key.nsquare
+    chunk_size = chunk_size or TALLY_CHUNK_SIZE
+    pool = _pool(workers)
+
+    products: dict[str, int] = {}
+    leftovers = []
+    futures = []
+    chunk = []
+
+    try:
+        for v in votes:
+            if int(v.vote_exponent) != 0:
+                leftovers.append(v)
+                continue
+            chunk.append((v.candidate_id, v.vote_ciphertext))
+            if len(chunk) >= chunk_size:
+                futures.append(pool.submit(multiply_chunk, nsquare, chunk))
+                chunk = []
+        if chunk:
+            futures.append(pool.submit(multiply_chunk, nsquare, chunk))
+
+        for fut in futures:
+            for cid, partial in fut.result().items():
+                products[cid] = products.get(cid, 1) * partial % nsquare
+    except BrokenProcessPool:
+        shutdown_tally_pool()
+        raise
+
+    return _finish_raw_tally(products, leftovers, public_key)
+
+
+TALLY_ENGINES = {
+    "serial": aggregate_votes,
+    "raw": aggregate_votes_raw,
+    "parallel": aggregate_votes_parallel,
+}
+
+
+def load_public_key():
+    """Tally public key, served from utilities/key_registry (parsed once, reloaded on change)."""
+    return paillier_public_material().key
+
+
+def load_private_key():
+    """Tally private key with its CRT values, served from utilities/key_registry."""
+    return paillier_private_material().key
+
+
+def _decode_count(public_key, mantissa: int) -> int:
+    """EncodedNumber.decode() for exponent 0, without building the wrapper objects."""
+    if mantissa >= public_key.n:
+        raise ValueError("Attempted to decode corrupted number")
+    if mantissa <= public_key.max_int:
+        return mantissa
+    if mantissa >= public_key.n - public_key.max_int:
+        return mantissa - public_key.n
+    raise OverflowError("Overflow detected in decrypted number")
+
+
+def _signed(public_key, m: int) -> int:
+    return m - public_key.n if m > public_key.n // 2 else m
+
+
+def _packed_decrypt(private_key, ciphertexts: list, base: int):
+    """
+    Decrypt several exponent-0 sums with ONE raw_decrypt: fold them by Horner's
+    rule into the ciphertext of sum(m_i * base**i), then split that plaintext
+    into balanced base-`base` digits. Returns the digits, or None if the
+    plaintext does not split into exactly len(ciphertexts) of them.
+    """
+    public_key = private_key.public_key
+    nsquare = public_key.nsquare
+    packed = 1
+    for c in reversed(ciphertexts):
+        packed = pow(packed, base, nsquare) * c % nsquare
+    m = _signed(public_key, private_key.raw_decrypt(packed))
+    digits = []
+    for _ in ciphertexts:
+        d = m % base
+        if d > base // 2:
+            d -= base
+        digits.append(d)
+        m = (m - d) // base
+    return digits if m == 0 else None
+
+
+def _decrypt_batch(private_key, ciphertexts: list):
+    """
+    Counts for a group of exponent-0 sums, or None when they cannot be trusted
+    packed. Two packings with independent random bases must agree: a sum too
+    large for its digit (e.g. a stuffed ballot) would otherwise spill into its
+    neighbour, and no such spill decodes the same way under both bases.
+    """
+    bases = [secrets.randbits(TALLY_PACK_DIGIT_BITS) | 1 << TALLY_PACK_DIGIT_BITS for _ in range(2)]
+    try:
+        first = _packed_decrypt(private_key, ciphertexts, bases[0])
+        if first is None:
+            return None
+        return first if _packed_decrypt(private_key, ciphertexts, bases[1]) == first else None
+    except Exception as e:
+        logging.error(f"❌ Packed decryption failed, decrypting one by one: {e}")
+        return None
+
+
 def decrypt_tally(tally_map, private_key):
     """
-    Decrypt the per-candidate encrypted sums.
+    Decrypt the per-candidate encrypted sums as a batch. Exponent-0 sums are
+    packed into as few plaintexts as the key allows (TALLY_PACK_DIGIT_BITS + 1
+    bits per candidate) and decrypted with two raw_decrypt calls per pack
+    instead of one per candidate; a pack that fails its check, or of fewer than
+    three sums, is decrypted one sum at a time. Other exponents (or a key
+    without raw_decrypt) use private_key.decrypt.
     Returns: dict[candidate_id] -> int (or -1 on failure)
     """
+    raw_decrypt = getattr(private_key, "raw_decrypt", None)
     out = {}
+    if raw_decrypt is not None:
+        raw = [(cid, e.ciphertext(be_secure=False)) for cid, e in tally_map.items() if e.exponent == 0]
+        per_pack = max(1, (private_key.public_key.n.bit_length() - 2) // (TALLY_PACK_DIGIT_BITS + 1))
+        for i in range(0, len(raw), per_pack):
+            group = raw[i:i + per_pack]
+            counts = _decrypt_batch(private_key, [c for _, c in group]) if len(group) > 2 else None
+            if counts is not None:
+                out.update((cid, n) for (cid, _), n in zip(group, counts))
     for cid, enc_sum in tally_map.items():
+        if cid in out:
+            continue
         try:
-            out[cid] = private_key.decrypt(enc_sum)
+            if raw_decrypt is not None and enc_sum.exponent == 0:
+                mantissa = raw_decrypt(enc_sum.ciphertext(be_secure=False))
+                out[cid] = _decode_count(private_key.public_key, mantissa)
+            else:
+                out[cid] = private_key.decrypt(enc_sum)
         except Exception as e:
             logging.error(f"❌ Decryption failed for candidate '{cid}': {e}")
             out[cid] = -1
@@ -77,12 +339,7 @@ def format_tally_result(session: Session, election_id: str, dec_counts: dict, ma
     Produce a list including zero-vote candidates:
     [{candidate_id, candidate_name, vote_count}, ...]
     """
-    candidates = (
-        session.query(Candidate.id, Candidate.name)
-        .filter(Candidate.election_id == election_id)
-        .order_by(Candidate.name.asc())
-        .all()
-    )
+    candidates = candidates_for(session, election_id).ordered
 
     rows = []
     for cid, cname in candidates:
@@ -101,20 +358,40 @@ def format_tally_result(session: Session, election_id: str, dec_counts: dict, ma
     return rows
 
 
-def tally_votes(session: Session, election_id: str):
+def tally_votes(session: Session, election_id: str, engine: str | None = None,
+                stream: bool | None = None):
     """
     Main entry: tally one election’s votes using Paillier homomorphic addition.
+    `engine` picks the aggregation strategy (see TALLY_ENGINES, or "incremental");
+    defaults to TALLY_ENGINE.
+    `stream` feeds the engine from a server-side cursor instead of a fully
+    materialised list of ORM rows; defaults to TALLY_STREAM.
     """
-    logging.info(f"🔐 Starting tally for election '{election_id}'")
+    engine = engine or TALLY_ENGINE
+    if engine != INCREMENTAL_ENGINE and engine not in TALLY_ENGINES:
+        raise ValueError(f"Unknown tally engine '{engine}'")
+
+    logging.info(f"🔐 Starting tally for election '{election_id}' (engine={engine})")
 
-    public_key = load_public_key()
-    private_key = load_private_key()
+    public_key, private_key = load_public_key(), load_private_key()
 
     if public_key.n.bit_length() < 2048:
         logging.warning("⚠️ Paillier key < 2048 bits; consider rotating to a stronger key.")
 
-    votes = fetch_encrypted_votes(session, election_id)
-    enc_sums = aggregate_votes(votes, public_key)
+    enc_sums = None
+    if engine == INCREMENTAL_ENGINE:
+        enc_sums = accumulated_sums(session, election_id, public_key)
+        if enc_sums is None:
+            logging.info("ℹ️ No usable accumulators; recomputing from stored ballots.")
+
+    if enc_sums is None:
+        aggregate = TALLY_ENGINES.get(engine, aggregate_votes_raw)
+        stream = TALLY_STREAM if stream is None else stream
+        if stream:
+            votes = stream_encrypted_votes(session, election_id)
+        else:
+            votes = fetch_encrypted_votes(session, election_id)
+        enc_sums = aggregate(votes, public_key)
     dec_counts = decrypt_tally(enc_sums, private_key)
     result = format_tally_result(session, election_id, dec_counts)
 
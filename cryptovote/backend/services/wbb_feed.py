@@ -0,0 +1,175 @@
+# services/wbb_feed.py
+"""
+Live feed of new bulletin-board entries, shared by every watcher in the process.
+
+One poller thread per election (started by the first subscriber, stopped after
+the last one leaves) reads entries past the last position it has seen and fans
+them out to per-subscriber queues. /cast-vote calls notify_board() after commit,
+so local ballots are pushed immediately; ballots committed by other workers are
+picked up within WBB_FEED_POLL seconds. However many watchers there are, each
+process runs one small indexed query per election per tick.
+
+Each watcher, though, keeps its /events response open, and that holds one
+request worker for the life of the stream. Serve the app with an async worker
+class (gunicorn -k gevent / eventlet), or give each process more worker
+threads than the watchers it may hold (WBB_SSE_MAX_SUBSCRIBERS per election),
+otherwise watchers starve /cast-vote. subscribe() refuses (FeedFull) once an
+election has that many watchers in this process.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+
+from sqlalchemy import func
+
+from models.db import db
+from models.wbb_entry import WbbEntry
+from services.wbb_service import board_root
+
+FEED_POLL_SECONDS = float(os.getenv("WBB_FEED_POLL", "1.0"))
+FEED_BATCH = int(os.getenv("WBB_FEED_BATCH", "500"))
+SUBSCRIBER_QUEUE = int(os.getenv("WBB_FEED_QUEUE", "1000"))
+MAX_SUBSCRIBERS = int(os.getenv("WBB_SSE_MAX_SUBSCRIBERS", "100"))
+
+_feeds: dict[str, "_BoardFeed"] = {}
+_feeds_lock = threading.Lock()
+
+
+def entry_event(e) -> dict:
+    return {
+        "index": e.position,
+        "tracker": e.tracker,
+        "commitment_hash": getattr(e, "commitment_hash", None),
+        "leaf_hash": e.leaf_hash,
+        "published_at": int(e.created_at.timestamp()),
+    }
+
+
+def format_sse(data: dict, event: str, event_id=None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def last_position(session, election_id: str) -> int:
+    last = session.query(func.max(WbbEntry.position))\
+        .filter(WbbEntry.election_id == election_id).scalar()
+    return last if last is not None else -1
+
+
+def read_entries(session, election_id: str, after: int, limit: int = None):
+    """Entries with position > after, oldest first."""
+    return (
+        session.query(WbbEntry)
+        .filter(WbbEntry.election_id == election_id, WbbEntry.position > after)
+        .order_by(WbbEntry.position.asc())
+        .limit(limit or FEED_BATCH)
+        .all()
+    )
+
+
+class FeedFull(RuntimeError):
+    """The election already has MAX_SUBSCRIBERS watchers in this process."""
+
+
+class Subscription:
+    """Queue of (position, sse_chunk) items; position is None for root events."""
+
+    def __init__(self, feed: "_BoardFeed"):
+        self.feed = feed
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.dropped = False
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+
+class _BoardFeed:
+    def __init__(self, app, election_id: str):
+        self.app = app
+        self.election_id = election_id
+        self.subscribers: set[Subscription] = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.last_position = -1
+        self.thread = threading.Thread(target=self._run, name=f"wbb-feed-{election_id}", daemon=True)
+
+    def unsubscribe(self, sub: Subscription):
+        with _feeds_lock, self.lock:
+            self.subscribers.discard(sub)
+            if not self.subscribers and _feeds.get(self.election_id) is self:
+                del _feeds[self.election_id]
+                self.wake.set()          # let the poller notice and exit
+
+    def _publish(self, position, chunk: str):
+        with self.lock:
+            subs = list(self.subscribers)
+        for sub in subs:
+            try:
+                sub.queue.put_nowait((position, chunk))
+            except queue.Full:
+                # too slow: drop it; the client reconnects with Last-Event-ID
+                sub.dropped = True
+                self.unsubscribe(sub)
+
+    def _poll_once(self):
+        rows = read_entries(db.session, self.election_id, self.last_position)
+        if not rows:
+            return False
+        for e in rows:
+            self._publish(e.position, format_sse(entry_event(e), "entry", e.position))
+            self.last_position = e.position
+        count, root = board_root(db.session, self.election_id)
+        self._publish(None, format_sse({"count": count, "root": root}, "root"))
+        return len(rows) == FEED_BATCH
+
+    def _run(self):
+        while True:
+            # last_position is already current when the feed starts: wait first
+            self.wake.wait(FEED_POLL_SECONDS)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    return
+            try:
+                with self.app.app_context():
+                    try:
+                        while self._poll_once():
+                            pass
+                    finally:
+                        db.session.remove()
+            except Exception as exc:
+                logging.error(f"WBB feed poll failed for {self.election_id}: {exc}")
+
+
+def subscribe(app, election_id: str) -> Subscription:
+    """
+    Join (or start) this process's feed for the election. A new feed starts
+    from the board's current end, read here before returning, so anything
+    committed after subscribe() is published; the caller replays the rest.
+    Raises FeedFull when the election already has MAX_SUBSCRIBERS watchers.
+    """
+    start_after = last_position(db.session, election_id) if election_id not in _feeds else None
+    with _feeds_lock:
+        feed = _feeds.get(election_id)
+        start = feed is None
+        if start:
+            feed = _feeds[election_id] = _BoardFeed(app, election_id)
+            feed.last_position = start_after if start_after is not None \
+                else last_position(db.session, election_id)
+        sub = Subscription(feed)
+        with feed.lock:
+            if len(feed.subscribers) >= MAX_SUBSCRIBERS:
+                raise FeedFull(election_id)
+            feed.subscribers.add(sub)
+    if start:
+        feed.thread.start()
+    return sub
+
+
+def notify_board(election_id: str):
+    """Wake the election's feed (if this process has one) right after a commit."""
+    feed = _feeds.get(election_id)
+    if feed is not None:
+        feed.wake.set()
@@ -0,0 +1,562 @@
+# services/wbb_service.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import create_engine, func, update, insert, tuple_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.wbb_entry import WbbEntry
+from models.wbb_sequence import WbbSequence
+from models.wbb_merkle_node import WbbMerkleNode
+from models.wbb_tree_head import WbbTreeHead
+from models.wbb_tree_state import WbbTreeState
+from utilities.merkle import (
+    merkle_root, MissingNode, GAP_LEAF, GAP_LEAF_HEX,
+    merkle_root_and_proof, complete_nodes,
+    root_keys, root_from_nodes, proof_keys, proof_from_nodes, append_keys, append_leaf,
+    consistency_keys, multiproof_stored_keys, multiproof_from_nodes,
+    hex_to_bytes, bytes_to_hex,
+    pack_snapshot_header, pack_snapshot_record, SNAPSHOT_HEADER_SIZE, SNAPSHOT_RECORD_SIZE,
+)
+from utilities.key_registry import sth_signing_material
+from utilities.tree_head_utils import sign_tree_head
+
+# a new signed tree head is issued at most this often (and only if the board grew)
+STH_INTERVAL_SECONDS = float(os.getenv("WBB_STH_INTERVAL", "60"))
+# roots never change for a given (election, size): keep the most recent ones per process
+ROOT_CACHE_SIZE = int(os.getenv("WBB_ROOT_CACHE_SIZE", "1024"))
+# (level, idx) pairs per node query; keeps big multiproofs under bind-parameter limits
+NODE_FETCH_CHUNK = 2000
+# connections of the dedicated pool that position bumps run on (see allocate_positions)
+SEQUENCE_POOL_SIZE = int(os.getenv("WBB_SEQUENCE_POOL", "4"))
+# a board position still without a leaf after this long is sealed as a gap
+GAP_GRACE_SECONDS = float(os.getenv("WBB_GAP_GRACE", "30"))
+# entries read per query (and records per yielded chunk) when exporting a snapshot
+SNAPSHOT_BATCH = int(os.getenv("WBB_SNAPSHOT_BATCH", "5000"))
+
+_roots: "OrderedDict[tuple[str, int], str]" = OrderedDict()
+_roots_lock = threading.Lock()
+
+_sequence_engines: dict = {}
+_sequence_engines_lock = threading.Lock()
+
+
+def _init_sequence(session: Session, election_id: str):
+    """
+    Create the election's counter and tree-state rows, starting after any
+    entries already on the board (one-time MAX scan for boards that predate the
+    counter). A concurrent creator winning the race is fine: its rows are used
+    instead.
+    """
+    last = (
+        session.query(func.max(WbbEntry.position))
+        .filter(WbbEntry.election_id == election_id)
+        .scalar()
+    )
+    try:
+        with session.begin_nested():
+            session.add(WbbSequence(
+                election_id=election_id,
+                next_position=(last + 1) if last is not None else 0,
+            ))
+            session.flush()
+            size = _backfill_tree(session, election_id) if last is not None else 0
+            session.add(WbbTreeState(election_id=election_id, tree_size=size))
+    except IntegrityError:
+        pass
+
+
+def _bump_sequence(conn, election_id: str, count: int):
+    stmt = (
+        update(WbbSequence)
+        .where(WbbSequence.election_id == election_id)
+        .values(next_position=WbbSequence.next_position + count)
+        .returning(WbbSequence.next_position)
+        .execution_options(synchronize_session=False)
+    )
+    return conn.execute(stmt).scalar_one_or_none()
+
+
+def _sequence_engine(engine):
+    """
+    Engine for position bumps, one per database URL: a pool of
+    SEQUENCE_POOL_SIZE connections with no overflow, separate from the app's
+    pool. A request bumping its counter already holds an app connection, so
+    taking the second one from the same pool could wait on requests that are
+    waiting for it in turn.
+    """
+    seq = _sequence_engines.get(engine.url)
+    if seq is None:
+        with _sequence_engines_lock:
+            seq = _sequence_engines.get(engine.url)
+            if seq is None:
+                seq = _sequence_engines[engine.url] = create_engine(
+                    engine.url, pool_size=SEQUENCE_POOL_SIZE, max_overflow=0, pool_pre_ping=True,
+                )
+    return seq
+
+
+def _bump_autocommit(engine, election_id: str, count: int):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        return _bump_sequence(conn, election_id, count)
+
+
+def allocate_positions(session: Session, election_id: str, count: int = 1) -> int:
+    """
+    Reserve `count` consecutive board positions and return the first one.
+
+    One UPDATE ... RETURNING on the election's counter row: no MAX(position)
+    scan, and no unique-violation retries on uq_wbb_eid_pos. On PostgreSQL the
+    bump runs autocommitted on a connection of _sequence_engine(), so the row
+    lock lasts for that one statement and ballots of the same election never
+    wait on each other's transactions. The price is gaps: positions of a ballot
+    that rolls back stay unused until integrate_board() seals them. SQLite
+    serialises writers anyway, so there the bump stays in the caller's
+    transaction and a rollback releases it.
+    """
+    engine = session.get_bind()
+    if engine.dialect.name == "sqlite":
+        new_next = _bump_sequence(session, election_id, count)
+        if new_next is None:
+            _init_sequence(session, election_id)
+            new_next = _bump_sequence(session, election_id, count)
+        return new_next - count
+
+    seq = _sequence_engine(engine)
+    new_next = _bump_autocommit(seq, election_id, count)
+    if new_next is None:
+        with Session(seq) as init:
+            _init_sequence(init, election_id)
+            init.commit()
+        new_next = _bump_autocommit(seq, election_id, count)
+    return new_next - count
+
+
+# --- Stored Merkle tree ------------------------------------------------------
+
+def _load_nodes(session: Session, election_id: str, keys) -> dict:
+    """Fetch the given (level, idx) nodes, as {(level, idx): bytes} (one query per NODE_FETCH_CHUNK)."""
+    keys = list(keys)
+    out = {}
+    for i in range(0, len(keys), NODE_FETCH_CHUNK):
+        rows = (
+            session.query(WbbMerkleNode.level, WbbMerkleNode.idx, WbbMerkleNode.hash)
+            .filter(WbbMerkleNode.election_id == election_id)
+            .filter(tuple_(WbbMerkleNode.level, WbbMerkleNode.idx).in_(keys[i:i + NODE_FETCH_CHUNK]))
+            .all()
+        )
+        out.update(((lvl, idx), hex_to_bytes(hx)) for lvl, idx, hx in rows)
+    return out
+
+
+def _insert_nodes(session: Session, election_id: str, created):
+    if not created:
+        return
+    session.execute(insert(WbbMerkleNode), [
+        {"election_id": election_id, "level": lvl, "idx": idx, "hash": bytes_to_hex(hb)}
+        for lvl, idx, hb in created
+    ])
+
+
+def append_leaves(session: Session, election_id: str, first_position: int, leaves_hex: list[str]):
+    """
+    Store leaves at first_position, first_position+1, ... as level-0 nodes, in
+    the ballot's own transaction. Parents are built after commit by
+    integrate_board(). The leaf's primary key is also what fences a ballot out
+    once its position has been sealed as a gap: the commit then fails with an
+    IntegrityError.
+    """
+    _insert_nodes(session, election_id, [
+        (0, first_position + offset, hex_to_bytes(leaf))
+        for offset, leaf in enumerate(leaves_hex)
+    ])
+
+
+def _seal_gap(session: Session, election_id: str, position: int):
+    """
+    Store GAP_LEAF at `position`, or return the leaf that committed there in
+    the meantime (the insert then loses on the primary key).
+    """
+    try:
+        with session.begin_nested():
+            _insert_nodes(session, election_id, [(0, position, GAP_LEAF)])
+        return GAP_LEAF
+    except IntegrityError:
+        return _load_nodes(session, election_id, [(0, position)]).get((0, position))
+
+
+def integrate_board(session: Session, election_id: str, until: int = None, seal_gaps: bool = False):
+    """
+    Extend the stored tree over the leaves committed since the last call and
+    return the new tree size (None for boards without a tree-state row).
+    Call it after the ballot has committed, in a transaction of its own;
+    `until` is the caller's last position: if the tree already covers it,
+    nothing is locked. Does not commit.
+
+    Parents are built strictly in position order under the election's
+    WbbTreeState row lock (allocation never touches that row), so the tree
+    stops at the first position without a leaf. The first call to find one
+    records when; a call GAP_GRACE_SECONDS later seals it with GAP_LEAF
+    (utilities/merkle) and carries on. A ballot still holding that position
+    then fails on the leaf's primary key instead of changing a published root.
+    `seal_gaps` seals every missing position at once (the election has ended).
+    """
+    state_q = session.query(WbbTreeState).filter(WbbTreeState.election_id == election_id)
+    if until is not None:
+        size = session.query(WbbTreeState.tree_size)\
+            .filter(WbbTreeState.election_id == election_id).scalar()
+        if size is not None and size > until:
+            return size
+    state = state_q.with_for_update().populate_existing().one_or_none()
+    if state is None:
+        return None
+    if until is not None and state.tree_size > until:
+        return state.tree_size          # built by whoever held the lock before us
+
+    upto = board_positions(session, election_id)
+    start = state.tree_size
+    stored = dict(
+        session.query(WbbMerkleNode.idx, WbbMerkleNode.hash)
+        .filter(WbbMerkleNode.election_id == election_id, WbbMerkleNode.level == 0,
+                WbbMerkleNode.idx >= start, WbbMerkleNode.idx < upto)
+        .all()
+    )
+    now_ms = int(time.time() * 1000)
+    pos, leaves = start, []
+    while pos < upto:
+        leaf = stored.get(pos)
+        if leaf is not None:
+            leaf = hex_to_bytes(leaf)
+        elif seal_gaps:
+            leaf = _seal_gap(session, election_id, pos)
+        elif state.stalled_position != pos:
+            state.stalled_position, state.stalled_since = pos, now_ms
+            break
+        elif now_ms - state.stalled_since < GAP_GRACE_SECONDS * 1000:
+            break
+        else:
+            leaf = _seal_gap(session, election_id, pos)
+        leaves.append(leaf)
+        pos += 1
+    if not leaves:
+        return start
+
+    keys = set()
+    for offset in range(len(leaves)):
+        keys |= append_keys(start + offset)
+    nodes = _load_nodes(session, election_id, keys)
+    created = []
+    for offset, leaf in enumerate(leaves):
+        created.extend(n for n in append_leaf(start + offset, leaf, nodes) if n[0])
+    _insert_nodes(session, election_id, created)
+    state.tree_size = pos
+    if state.stalled_position is not None and state.stalled_position < pos:
+        state.stalled_position = state.stalled_since = None
+    return pos
+
+
+def _backfill_tree(session: Session, election_id: str) -> int:
+    """
+    Store the complete nodes of a board that predates the node table (one O(n)
+    pass), missing positions as GAP_LEAF. Returns the tree size.
+    """
+    leaves = _all_leaves(session, election_id)
+    _insert_nodes(session, election_id, list(complete_nodes(leaves)))
+    return len(leaves)
+
+
+def board_positions(session: Session, election_id: str) -> int:
+    """Positions handed out so far (the tree may still be catching up with them)."""
+    return (
+        session.query(WbbSequence.next_position)
+        .filter(WbbSequence.election_id == election_id)
+        .scalar()
+    ) or 0
+
+
+def lagging_boards(session: Session) -> list[str]:
+    """
+    Elections whose stored tree is behind the positions handed out (ballots
+    to integrate, gaps to seal) or whose latest tree head is behind the tree.
+    """
+    signed = (
+        session.query(WbbTreeHead.election_id, func.max(WbbTreeHead.tree_size).label("size"))
+        .group_by(WbbTreeHead.election_id)
+        .subquery()
+    )
+    return [eid for (eid,) in (
+        session.query(WbbTreeState.election_id)
+        .join(WbbSequence, WbbSequence.election_id == WbbTreeState.election_id)
+        .outerjoin(signed, signed.c.election_id == WbbTreeState.election_id)
+        .filter(or_(WbbTreeState.tree_size < WbbSequence.next_position,
+                    func.coalesce(signed.c.size, 0) < WbbTreeState.tree_size))
+    )]
+
+
+def board_size(session: Session, election_id: str):
+    """
+    Number of positions covered by the stored tree (ballots and sealed gaps),
+    or None for boards without one.
+    """
+    return (
+        session.query(WbbTreeState.tree_size)
+        .filter(WbbTreeState.election_id == election_id)
+        .scalar()
+    )
+
+
+def _all_leaves(session: Session, election_id: str) -> list[str]:
+    """Every leaf by position, GAP_LEAF_HEX where no entry exists (in-memory fallback)."""
+    leaves = []
+    for pos, leaf in (
+        session.query(WbbEntry.position, WbbEntry.leaf_hash)
+        .filter(WbbEntry.election_id == election_id)
+        .order_by(WbbEntry.position.asc())
+    ):
+        leaves.extend([GAP_LEAF_HEX] * (pos - len(leaves)))
+        leaves.append(leaf)
+    return leaves
+
+
+def _cached_root(election_id: str, size: int):
+    with _roots_lock:
+        root = _roots.get((election_id, size))
+        if root is not None:
+            _roots.move_to_end((election_id, size))
+        return root
+
+
+def _remember_root(election_id: str, size: int, root: str):
+    with _roots_lock:
+        _roots[(election_id, size)] = root
+        _roots.move_to_end((election_id, size))
+        while len(_roots) > ROOT_CACHE_SIZE:
+            _roots.popitem(last=False)
+
+
+def clear_root_cache():
+    with _roots_lock:
+        _roots.clear()
+
+
+def _stored_root(session: Session, election_id: str, size: int) -> str:
+    """Root of the first `size` positions from stored nodes (process-cached); MissingNode if absent."""
+    root = _cached_root(election_id, size)
+    if root is None:
+        root = root_from_nodes(size, _load_nodes(session, election_id, root_keys(size)))
+        _remember_root(election_id, size, root)
+    return root
+
+
+def board_root(session: Session, election_id: str) -> tuple[int, str]:
+    """
+    (size, root) of the election's board. The root is computed once per size
+    from O(log n) stored nodes and then served from a process cache, so a
+    repeat read costs only the counter lookup. Boards without a counter row or
+    with missing nodes are rebuilt in memory.
+    """
+    size = board_size(session, election_id)
+    if size is not None:
+        try:
+            return size, _stored_root(session, election_id, size)
+        except MissingNode:
+            pass
+    leaves = _all_leaves(session, election_id)
+    return len(leaves), merkle_root(leaves)
+
+
+def inclusion_proof(session: Session, election_id: str, position: int,
+                    size: int = None) -> tuple[int, str, list[str]]:
+    """
+    (size, root, merkle_path) for the leaf at `position`, with the same
+    fallback as board_root(). A position the tree has not reached yet
+    (position >= size) gets an empty path: the entry is pending. `size`
+    proves against the first `size` positions (e.g. a signed head's
+    tree_size) instead of the current tree.
+    """
+    at = board_size(session, election_id) if size is None else size
+    if at is not None:
+        try:
+            if position >= at:
+                return at, _stored_root(session, election_id, at), []
+            root = _cached_root(election_id, at)
+            keys = proof_keys(at, position) if root else root_keys(at) | proof_keys(at, position)
+            nodes = _load_nodes(session, election_id, keys)
+            if root is None:
+                root = root_from_nodes(at, nodes)
+                _remember_root(election_id, at, root)
+            return at, root, proof_from_nodes(at, position, nodes)
+        except MissingNode:
+            pass
+    leaves = _all_leaves(session, election_id)
+    if size is not None:
+        leaves = leaves[:size]
+    root, path = merkle_root_and_proof(leaves, position)
+    return len(leaves), root, path
+
+
+def multiproof(session: Session, election_id: str, positions) -> tuple[int, str, list[dict]]:
+    """
+    (size, root, nodes) proving all `positions` at once; shared internal nodes
+    appear once (see utilities/merkle.verify_multiproof). Same fallback as
+    board_root() for boards without stored nodes.
+    """
+    size = board_size(session, election_id)
+    if size is not None:
+        root = _cached_root(election_id, size)
+        keys = multiproof_stored_keys(size, positions)
+        if root is None:
+            keys |= root_keys(size)
+        try:
+            nodes = _load_nodes(session, election_id, keys)
+            if root is None:
+                root = root_from_nodes(size, nodes)
+                _remember_root(election_id, size, root)
+            return size, root, multiproof_from_nodes(size, positions, nodes)
+        except MissingNode:
+            pass
+    leaves = _all_leaves(session, election_id)
+    nodes = {(lvl, idx): hb for lvl, idx, hb in complete_nodes(leaves)}
+    wanted = [p for p in positions if p < len(leaves)]
+    return len(leaves), merkle_root(leaves), multiproof_from_nodes(len(leaves), wanted, nodes)
+
+
+# --- Signed tree heads & consistency ----------------------------------------
+
+def tree_head_dict(sth: WbbTreeHead) -> dict:
+    return {
+        "election_id": sth.election_id,
+        "tree_size": sth.tree_size,
+        "root": sth.root,
+        "timestamp": sth.timestamp,
+        "signature": sth.signature,
+        "key_id": sth.key_id,
+    }
+
+
+def get_tree_head(session: Session, election_id: str, tree_size: int = None):
+    """The STH for `tree_size`, or the latest one; None if there is none."""
+    q = session.query(WbbTreeHead).filter(WbbTreeHead.election_id == election_id)
+    if tree_size is not None:
+        return q.filter(WbbTreeHead.tree_size == tree_size).first()
+    return q.order_by(WbbTreeHead.tree_size.desc()).first()
+
+
+def publish_tree_head(session: Session, election_id: str, force: bool = False, current=None):
+    """
+    Latest STH, signing a new one first if the board has grown and the last
+    head is older than STH_INTERVAL_SECONDS (or `force`). Only the write path
+    calls this (update_board() from the upkeep thread, and when an
+    election ends); readers use get_tree_head(). `current` is an already computed
+    (size, root) for the board. Does not commit.
+    """
+    latest = get_tree_head(session, election_id)
+    now_ms = int(time.time() * 1000)
+    if latest is not None and not force and \
+            now_ms - latest.timestamp < STH_INTERVAL_SECONDS * 1000:
+        return latest
+
+    size, root = current or board_root(session, election_id)
+    if size == 0 or (latest is not None and latest.tree_size >= size):
+        return latest
+
+    key = sth_signing_material()
+    sth = WbbTreeHead(
+        election_id=election_id,
+        tree_size=size,
+        root=root,
+        timestamp=now_ms,
+        signature=sign_tree_head(key.key, election_id, size, root, now_ms),
+        key_id=key.key_id,
+    )
+    try:
+        with session.begin_nested():
+            session.add(sth)
+    except IntegrityError:
+        # another worker signed this size first; serve theirs
+        return get_tree_head(session, election_id, size)
+    return sth
+
+
+def signed_head_for(session: Session, election_id: str, size: int, root: str):
+    """STH dict for exactly (size, root) if one has been issued; None otherwise. Read-only."""
+    sth = get_tree_head(session, election_id, size) if size else None
+    if sth is not None and sth.root == root:
+        return tree_head_dict(sth)
+    return None
+
+
+def update_board(session: Session, election_id: str, until: int = None,
+                 force_head: bool = False, seal_gaps: bool = False):
+    """
+    Write-path upkeep once ballots have committed: extend the stored tree over
+    them (integrate_board) and sign a new tree head if one is due, or always
+    with `force_head` (e.g. when the election ends). Returns the tree size.
+    Does not commit.
+    """
+    size = integrate_board(session, election_id, until, seal_gaps)
+    if size:
+        publish_tree_head(session, election_id, force=force_head)
+    return size
+
+
+def consistency_proof(session: Session, election_id: str, first: int, second: int):
+    """
+    Nodes proving the size-`second` tree extends the size-`first` one, as
+    [{level, index, hash}] (see utilities/merkle.verify_consistency). Returns
+    None when the board has no stored tree to prove from.
+    """
+    keys = consistency_keys(first, second)
+    nodes = _load_nodes(session, election_id, keys)
+    if len(nodes) != len(keys):
+        return None
+    return [
+        {"level": lvl, "index": idx, "hash": bytes_to_hex(nodes[(lvl, idx)])}
+        for lvl, idx in sorted(keys)
+    ]
+
+
+def snapshot_length(size: int) -> int:
+    return SNAPSHOT_HEADER_SIZE + size * SNAPSHOT_RECORD_SIZE
+
+
+def _gap_records(first: int, end: int) -> bytes:
+    return b"".join(pack_snapshot_record(p, "", GAP_LEAF_HEX, GAP_LEAF_HEX) for p in range(first, end))
+
+
+def snapshot_chunks(session: Session, election_id: str, sth: dict):
+    """
+    Binary snapshot of the board as of the signed tree head `sth` (see
+    tree_head_dict()): its first tree_size positions, with its root and
+    signature in the header (layout in utilities/merkle), as an iterator of
+    byte chunks; sealed gaps get gap records. Entries are read in keyset
+    pages of SNAPSHOT_BATCH, so later entries are not included and memory
+    stays flat.
+    """
+    size = sth["tree_size"]
+    yield pack_snapshot_header(
+        election_id, size, sth["root"], sth["timestamp"], sth["key_id"] or "", sth["signature"],
+    )
+    after = -1
+    while after < size - 1:
+        rows = (
+            session.query(WbbEntry.position, WbbEntry.tracker, WbbEntry.token_hash,
+                          WbbEntry.leaf_hash, WbbEntry.commitment_hash)
+            .filter(WbbEntry.election_id == election_id,
+                    WbbEntry.position > after, WbbEntry.position < size)
+            .order_by(WbbEntry.position.asc())
+            .limit(SNAPSHOT_BATCH)
+            .all()
+        )
+        if not rows:
+            break
+        out = []
+        for r in rows:
+            out.append(_gap_records(after + 1, r[0]))
+            out.append(pack_snapshot_record(*r))
+            after = r[0]
+        yield b"".join(out)
+    if after < size - 1:
+        yield _gap_records(after + 1, size)
@@ -0,0 +1,112 @@
+# services/wbb_upkeep.py
+"""
+Bulletin-board and tally upkeep, kept off the /cast-vote request path.
+
+One daemon thread per process (started by init_app(), on the first request)
+runs update_board() for every election in wbb_service.lagging_boards(): trees
+behind the positions handed out get extended, gaps past GAP_GRACE_SECONDS get
+sealed, and a tree head is signed once one is due. It wakes every
+WBB_UPKEEP_INTERVAL seconds, and at once when /cast-vote calls
+request_upkeep() after a commit; that pass also folds the election's queued
+tally partials into its accumulators. Ballots committed while a pass runs are
+picked up together by the next one, so under load one pass serves many votes.
+
+Each election is settled in short transactions of its own; failures are
+logged and retried on the next pass. With WBB_UPKEEP=inline (app config or
+environment) request_upkeep() runs the pass in the request instead, for
+single-threaded setups such as tests on an in-memory database.
+"""
+import logging
+import os
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.db import db
+from services.tally_accumulator_service import fold_partials
+from services.wbb_service import lagging_boards, update_board
+
+UPKEEP_INTERVAL_SECONDS = float(os.getenv("WBB_UPKEEP_INTERVAL", "5"))
+UPKEEP_MODE = os.getenv("WBB_UPKEEP", "thread")
+
+_keeper = None
+_keeper_lock = threading.Lock()
+
+
+def run_upkeep(session, election_ids=(), fold=None) -> int:
+    """
+    One pass over `election_ids` plus every lagging board. `fold` maps
+    election ids to their Paillier n^2; those elections also get their tally
+    partials folded (skipped while another process is folding). Returns the
+    number of elections settled.
+    """
+    fold = fold or {}
+    done = 0
+    for election_id in sorted(set(election_ids) | set(fold) | set(lagging_boards(session))):
+        try:
+            update_board(session, election_id)
+            session.commit()
+            if election_id in fold:
+                fold_partials(session, election_id, fold[election_id], skip_locked=True)
+                session.commit()
+            done += 1
+        except SQLAlchemyError as exc:
+            session.rollback()
+            logging.warning(f"Board upkeep failed for '{election_id}': {exc}")
+    return done
+
+
+class _Keeper:
+    def __init__(self, app):
+        self.app = app
+        self.wake = threading.Event()
+        self.pending = {}                 # election_id -> nsquare, drained by each pass
+        self.pending_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="wbb-upkeep", daemon=True)
+
+    def request(self, election_id, nsquare):
+        with self.pending_lock:
+            self.pending[election_id] = nsquare
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(UPKEEP_INTERVAL_SECONDS)
+            self.wake.clear()
+            with self.pending_lock:
+                pending, self.pending = self.pending, {}
+            try:
+                with self.app.app_context():
+                    try:
+                        run_upkeep(db.session, fold=pending)
+                    finally:
+                        db.session.remove()
+            except Exception as exc:
+                logging.error(f"Board upkeep pass failed: {exc}")
+
+
+def ensure_upkeep(app):
+    """Start this process's upkeep thread if it is not running (after a fork, for instance)."""
+    global _keeper
+    keeper = _keeper
+    if keeper is not None and keeper.thread.is_alive():
+        return keeper
+    with _keeper_lock:
+        if _keeper is None or not _keeper.thread.is_alive():
+            _keeper = _Keeper(app)
+            _keeper.thread.start()
+        return _keeper
+
+
+def request_upkeep(app, election_id: str, nsquare: int):
+    """Ask for a pass over `election_id` (board and tally) after ballots commit. Does not block."""
+    if app.config.get("WBB_UPKEEP", UPKEEP_MODE) == "inline":
+        run_upkeep(db.session, fold={election_id: nsquare})
+        return
+    ensure_upkeep(app).request(election_id, nsquare)
+
+
+def init_app(app):
+    @app.before_request
+    def _start_board_upkeep():
+        ensure_upkeep(app)
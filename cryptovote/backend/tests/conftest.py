@@ -48,11 +48,10 @@ def app(monkeypatch):
         query = _VESQ()
     monkeypatch.setattr(cv, "VES", _VES)
 
-    # Minimal candidates / election models the route touches
+    # Minimal candidates / election models the route touches (candidates only via the guard stub)
     class _Candidate:
         id = object()
         election_id = object()
-    monkeypatch.setattr(cv, "Candidate", _Candidate)
 
     class _Election: ...
     monkeypatch.setattr(cv, "Election", _Election)
@@ -88,7 +87,7 @@ def app(monkeypatch):
 
         def query(self, *entities):
             what = entities[0] if entities else None
-            cand_id_attr      = getattr(cv.Candidate, "id", None)
+            cand_id_attr      = _Candidate.id
             from models.encrypted_candidate_vote import EncryptedCandidateVote as ECV
             encvote_id_attr   = getattr(ECV, "id", None)
             wbb_position_attr = getattr(cv.WbbEntry, "position", None)
@@ -123,11 +122,27 @@ def app(monkeypatch):
     sess = _Sess()
     monkeypatch.setattr(cv.db, "session", sess)
 
+    # Guard query built from the stubs above (tests may swap cv.Voter): no VES row, token unused
+    def _guards(session, email_hash, election_id, token_election_hash):
+        v = cv.Voter.query.filter_by(email_hash=email_hash).first()
+        return cv.CastGuards(
+            voter=(v.id, v.is_verified, v.logged_in) if v else None,
+            election=session.get(cv.Election, election_id),
+            ves=None,
+            candidate_ids={r.id for r in session.query(_Candidate.id).all()},
+            token_used=False,
+        )
+    monkeypatch.setattr(cv, "load_cast_guards", _guards, raising=True)
+
     # ----------------------- Crypto stubs & helpers ------------------------
     monkeypatch.setattr(cv, "parse_and_verify_signature", lambda *a, **k: (True, None, None), raising=True)
     monkeypatch.setattr(cv, "load_rsa_pubkey", lambda *a, **k: object(), raising=True)
     monkeypatch.setattr(cv, "load_paillier_public_key", lambda: pub, raising=True)
     monkeypatch.setattr(cv, "mark_voted", lambda *a, **k: None, raising=True)
+    monkeypatch.setattr(cv, "apply_ballot_to_accumulators", lambda *a, **k: None, raising=True)
+    monkeypatch.setattr(cv, "allocate_positions", lambda *a, **k: 0, raising=True)
+    monkeypatch.setattr(cv, "append_leaves", lambda *a, **k: None, raising=True)
+    monkeypatch.setattr(cv, "request_upkeep", lambda *a, **k: None, raising=True)
 
     # Register the blueprint and expose captured inserts for assertions
     app.register_blueprint(cv.cast_vote_bp)
@@ -185,3 +185,18 @@ def test_mismatched_rsa_key_id_returns_400(client, app):
                        data=json.dumps(payload),
                        content_type="application/json")
     assert resp.status_code == 400, resp.data
+
+def test_busy_signer_returns_503_with_retry_after(client, app, monkeypatch):
+    import routes.blind_sign as bs
+    _login(client)
+
+    def _busy(*a, **k):
+        raise bs.SignerBusy("signing queue full")
+    monkeypatch.setattr(bs, "sign_blinded_token", _busy)
+
+    payload = {"blinded_token_hex": "abcdef", "rsa_key_id": "rsa-demo"}
+    resp = client.post("/elections/E/blind-sign",
+                       data=json.dumps(payload),
+                       content_type="application/json")
+    assert resp.status_code == 503, resp.data
+    assert resp.headers["Retry-After"] == str(bs.SIGN_RETRY_AFTER_SECONDS)
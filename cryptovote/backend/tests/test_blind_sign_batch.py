@@ -0,0 +1,134 @@
+# backend/tests/test_blind_sign_batch.py
+import hashlib
+import json
+import random
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from Crypto.PublicKey import RSA
+
+from models.db import db
+from models.election import Election
+from models.encrypted_candidate_vote import EncryptedCandidateVote  # noqa: F401 (mapper for Candidate)
+from models.voter import Voter
+from models.issued_token import IssuedToken
+from models.voter_election_status import VoterElectionStatus as VES
+import routes.blind_sign as bs
+import utilities.blind_signature_utils as rsa_utils
+import utilities.key_registry as kr
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return RSA.generate(1024)
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path, rsa_key):
+    key_file = tmp_path / "rsa_private.pem"
+    key_file.write_bytes(rsa_key.export_key("PEM"))
+    monkeypatch.setattr(rsa_utils, "PRIVATE_KEY_PATH", str(key_file))
+    kr.invalidate_keys()
+
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            Voter.__table__, Election.__table__, IssuedToken.__table__, VES.__table__,
+        ])
+        db.session.add(Election(id="EL-C", name="Cohort", rsa_key_id=kr.DEFAULT_RSA_KEY_ID,
+                                is_active=True, has_started=False, has_ended=False))
+        for vid in range(1, 6):
+            db.session.add(Voter(id=vid, email_hash=hashlib.sha256(f"s{vid}@uni.edu".encode()).hexdigest(),
+                                 is_verified=vid != 4))
+        db.session.add(VES(voter_id=2, election_id="EL-C", token_issued_at=datetime(2026, 1, 1)))
+        db.session.add(VES(voter_id=3, election_id="EL-C"))
+        db.session.commit()
+
+    app.register_blueprint(bs.blind_sign_bp)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    kr.invalidate_keys()
+
+
+@pytest.fixture
+def client(app):
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s["role"] = "admin"
+        s["twofa"] = True
+    return c
+
+
+def test_batch_issues_cohort_in_one_transaction(app, client, rsa_key):
+    n, e = int(rsa_key.n), int(rsa_key.e)
+    blinded = {vid: random.randrange(2, n) for vid in range(1, 6)}
+    tokens = [
+        {"voter_id": 1, "blinded_token_hex": f"{blinded[1]:x}"},
+        {"email": "s3@uni.edu", "blinded_token_hex": f"{blinded[3]:x}"},   # VES row without a token yet
+        {"voter_id": 2, "blinded_token_hex": f"{blinded[2]:x}"},           # already issued
+        {"voter_id": 4, "blinded_token_hex": f"{blinded[4]:x}"},           # not verified
+        {"voter_id": 1, "blinded_token_hex": f"{blinded[1]:x}"},           # twice in the batch
+        {"voter_id": 99, "blinded_token_hex": "ab"},
+        {"voter_id": 5, "blinded_token_hex": "zz"},
+        {"voter_id": 5, "blinded_token_hex": f"{n + 1:x}"},                 # out of range for the key
+    ]
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda conn, cur, stmt, *a: statements.append(stmt))
+    r = client.post("/elections/EL-C/blind-sign/batch",
+                    data=json.dumps({"rsa_key_id": kr.DEFAULT_RSA_KEY_ID, "tokens": tokens}),
+                    content_type="application/json")
+    assert r.status_code == 200, r.data
+    body = r.get_json()
+    assert (body["issued"], body["rejected"]) == (2, 6)
+    res = body["results"]
+    assert [x["status"] for x in res[:2]] == ["issued", "issued"]
+    assert [x.get("error") for x in res[2:]] == [
+        "token_already_issued_for_this_election", "voter_not_verified", "duplicate_voter_in_batch",
+        "unknown_voter", "invalid_blinded_token_hex", "invalid_blinded_token_hex",
+    ]
+    for x, vid in zip(res[:2], (1, 3)):
+        assert x["voter_id"] == vid
+        assert pow(int(x["signed_blinded_token_hex"], 16), e, n) == blinded[vid]
+
+    # voters, VES, then the writes: no per-token round trips
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 3            # election, voters, VES
+
+    with app.app_context():
+        assert db.session.query(IssuedToken).count() == 2
+        issued = {v.voter_id for v in db.session.query(VES).filter(VES.token_issued_at.isnot(None))}
+        assert issued == {1, 2, 3}
+
+    again = client.post("/elections/EL-C/blind-sign/batch",
+                        data=json.dumps({"rsa_key_id": kr.DEFAULT_RSA_KEY_ID,
+                                         "tokens": [{"voter_id": 1, "blinded_token_hex": "ab"}]}),
+                        content_type="application/json")
+    assert again.get_json()["results"][0]["error"] == "token_already_issued_for_this_election"
+
+
+def test_batch_rejects_wrong_key_and_oversized_batches(client, monkeypatch):
+    r = client.post("/elections/EL-C/blind-sign/batch",
+                    data=json.dumps({"rsa_key_id": "other", "tokens": [{"voter_id": 1, "blinded_token_hex": "ab"}]}),
+                    content_type="application/json")
+    assert r.status_code == 400 and r.get_json()["error"] == "key_mismatch_for_election"
+
+    monkeypatch.setattr(bs, "BATCH_MAX_TOKENS", 1)
+    r = client.post("/elections/EL-C/blind-sign/batch",
+                    data=json.dumps({"rsa_key_id": kr.DEFAULT_RSA_KEY_ID,
+                                     "tokens": [{"voter_id": 1, "blinded_token_hex": "ab"}] * 2}),
+                    content_type="application/json")
+    assert r.status_code == 413
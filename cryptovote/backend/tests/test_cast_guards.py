@@ -0,0 +1,88 @@
+# backend/tests/test_cast_guards.py
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from models.db import db
+from models.voter import Voter
+from models.election import Election, Candidate
+from models.voter_election_status import VoterElectionStatus as VES
+from models.encrypted_candidate_vote import EncryptedCandidateVote
+import routes.cast_vote as cv
+from services.candidate_cache import candidates_for, invalidate_candidates
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            Voter.__table__, Election.__table__, Candidate.__table__,
+            VES.__table__, EncryptedCandidateVote.__table__,
+        ])
+        db.session.add(Voter(id=1, email_hash="v1", is_verified=True, logged_in=True))
+        db.session.add(Election(id="E1", name="E1", is_active=True, has_started=True))
+        db.session.add_all([Candidate(id="A", name="A", election_id="E1"),
+                            Candidate(id="B", name="B", election_id="E1")])
+        db.session.add(VES(voter_id=1, election_id="E1"))
+        db.session.commit()
+        invalidate_candidates()
+        yield app
+        db.session.remove()
+
+
+def _count_statements():
+    seen = []
+    event.listen(db.engine, "before_cursor_execute", lambda *a, **k: seen.append(1))
+    return seen
+
+
+def test_guards_answer_everything_in_one_statement(app):
+    teh = cv._token_election_hash("E1", "tkn")
+    cv.load_cast_guards(db.session, "v1", "E1", teh)   # warms the candidate cache
+    db.session.expire_all()
+    seen = _count_statements()
+
+    g = cv.load_cast_guards(db.session, "v1", "E1", teh)
+    assert len(seen) == 1
+    assert g.voter_ok and g.voter[0] == 1
+    assert g.election.id == "E1"
+    assert g.candidate_ids == {"A", "B"}
+    assert not g.token_used and not g.already_voted and g.ves is not None
+
+    db.session.add(EncryptedCandidateVote(candidate_id="A", vote_ciphertext="1",
+                                          token_hash=teh, election_id="E1"))
+    cv.mark_voted(1, "E1", ves=g.ves)
+    db.session.commit()
+
+    g = cv.load_cast_guards(db.session, "v1", "E1", teh)
+    assert g.token_used and g.already_voted
+
+
+def test_guards_for_unknown_voter_or_election(app):
+    assert not cv.load_cast_guards(db.session, "nobody", "E1", None).voter_ok
+
+    g = cv.load_cast_guards(db.session, "v1", "missing", None)
+    assert g.voter_ok and g.election is None and g.candidate_ids == set()
+    assert g.ves is None and not g.token_used
+
+
+def test_candidate_cache_reloads_on_version_change_or_invalidation(app):
+    e = db.session.get(Election, "E1")
+    first = candidates_for(db.session, "E1", e.updated_at)
+    assert first.ordered == (("A", "A"), ("B", "B"))
+
+    db.session.add(Candidate(id="C", name="C", election_id="E1"))
+    db.session.commit()
+    assert candidates_for(db.session, "E1", e.updated_at) is first    # same version: cached
+    assert candidates_for(db.session, "E1").ids == {"A", "B"}         # no version: cached
+
+    assert candidates_for(db.session, "E1", "another-version").ids == {"A", "B", "C"}
+    invalidate_candidates("E1")
+    assert candidates_for(db.session, "E1").names == {"A": "A", "B": "B", "C": "C"}
@@ -0,0 +1,152 @@
+# backend/tests/test_cast_vote_batch.py
+import hashlib
+import json
+import secrets
+
+import pytest
+from flask import Flask
+from phe import paillier
+from Crypto.PublicKey import RSA
+
+from models.db import db
+from models.election import Election, Candidate
+from models.encrypted_candidate_vote import EncryptedCandidateVote
+from models.encrypted_tally_accumulator import EncryptedTallyAccumulator
+from models.encrypted_tally_partial import EncryptedTallyPartial
+from models.wbb_entry import WbbEntry
+from models.wbb_sequence import WbbSequence
+from models.wbb_merkle_node import WbbMerkleNode
+from models.wbb_tree_state import WbbTreeState
+from models.wbb_tree_head import WbbTreeHead
+import routes.cast_vote as cv
+import services.wbb_upkeep as upkeep
+import utilities.key_registry as kr
+import utilities.tree_head_utils as thu
+from utilities.key_fingerprint import fingerprint_paillier_n
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    key_path = str(tmp_path / "wbb_sth_private.pem")
+    thu.ensure_sth_keypair(key_path)
+    monkeypatch.setattr(thu, "STH_PRIVATE_KEY_PATH", key_path)
+    kr.invalidate_keys()
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        WBB_UPKEEP="inline",
+    )
+    db.init_app(app)
+
+    pub, _ = paillier.generate_paillier_keypair(n_length=256)
+    rsa = RSA.generate(1024)
+    monkeypatch.setattr(cv, "load_paillier_public_key", lambda: pub, raising=True)
+    monkeypatch.setattr(cv, "load_rsa_pubkey", lambda *a: rsa.publickey(), raising=True)
+
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            Election.__table__, Candidate.__table__, EncryptedCandidateVote.__table__,
+            EncryptedTallyAccumulator.__table__, EncryptedTallyPartial.__table__, WbbEntry.__table__, WbbSequence.__table__,
+            WbbMerkleNode.__table__, WbbTreeState.__table__, WbbTreeHead.__table__,
+        ])
+        db.session.add(Election(id="EL-B", name="Batch", rsa_key_id="rsa-demo",
+                                is_active=True, has_started=True, has_ended=False))
+        db.session.add(Candidate(id="YES", name="Yes", election_id="EL-B"))
+        db.session.commit()
+
+    app.register_blueprint(cv.cast_vote_bp)
+    app._pub, app._rsa = pub, rsa
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s["role"] = "admin"
+        s["twofa"] = True
+    return c
+
+
+def _signed_ballot(app, token):
+    m = int.from_bytes(hashlib.sha256(token.encode()).digest(), "big")
+    sig = pow(m, app._rsa.d, app._rsa.n)
+    return {
+        "token": token,
+        "signature": f"{sig:x}",
+        "tracker": secrets.token_hex(8),
+        "ballot": {
+            "scheme": "paillier-1hot",
+            "key_id": fingerprint_paillier_n(app._pub.n),
+            "entries": [{"candidate_id": "YES", "c": str(app._pub.encrypt(1).ciphertext())}],
+        },
+    }
+
+
+def _post(client, ballots):
+    return client.post("/cast-vote/batch", data=json.dumps({"election_id": "EL-B", "ballots": ballots}),
+                       content_type="application/json")
+
+
+def test_batch_accepts_valid_and_reports_rejects_per_ballot(app, client):
+    b0 = _signed_ballot(app, "tok-0")
+    b1 = _signed_ballot(app, "tok-1")
+    dup = _signed_ballot(app, "tok-0")
+    forged = _signed_ballot(app, "tok-2")
+    forged["signature"] = b1["signature"]
+
+    r = _post(client, [b0, b1, dup, forged])
+    assert r.status_code == 200, r.data
+    j = r.get_json()
+    assert (j["accepted"], j["rejected"]) == (2, 2)
+    assert [x["status"] for x in j["results"]] == ["accepted", "accepted", "rejected", "rejected"]
+    assert j["results"][2]["error"] == "duplicate_token_in_batch"
+    assert j["results"][3]["error"] == "invalid_signature"
+    assert [j["results"][0]["position"], j["results"][1]["position"]] == [0, 1]
+
+    with app.app_context():
+        assert EncryptedCandidateVote.query.count() == 2
+        assert [e.tracker for e in WbbEntry.query.order_by(WbbEntry.position)] == [b0["tracker"], b1["tracker"]]
+        acc = EncryptedTallyAccumulator.query.filter_by(election_id="EL-B", candidate_id="YES").one()
+        assert acc.ballot_count == 2
+
+    # replaying an already-spent token is rejected by the single IN probe
+    r2 = _post(client, [_signed_ballot(app, "tok-1"), _signed_ballot(app, "tok-3")])
+    j2 = r2.get_json()
+    assert j2["results"][0]["error"] == "token_already_used"
+    assert j2["results"][1]["position"] == 2
+
+
+def test_batch_leaves_board_and_tally_upkeep_to_the_keeper(app, client, monkeypatch):
+    requested = []
+
+    class _Keeper:
+        def request(self, election_id, nsquare):
+            requested.append((election_id, nsquare))
+
+    app.config["WBB_UPKEEP"] = "thread"
+    monkeypatch.setattr(upkeep, "ensure_upkeep", lambda a: _Keeper())
+
+    r = _post(client, [_signed_ballot(app, "tok-k0"), _signed_ballot(app, "tok-k1")])
+    assert r.get_json()["accepted"] == 2
+    assert requested == [("EL-B", app._pub.nsquare)]
+
+    with app.app_context():
+        # the request stored leaves and partials only; tree, head and fold wait for the pass
+        assert db.session.get(WbbTreeState, "EL-B").tree_size == 0
+        assert EncryptedTallyAccumulator.query.count() == 0
+        assert upkeep.run_upkeep(db.session, fold=dict(requested)) == 1
+        assert db.session.get(WbbTreeState, "EL-B").tree_size == 2
+        assert EncryptedTallyPartial.query.count() == 0
+        assert EncryptedTallyAccumulator.query.one().ballot_count == 2
+
+
+def test_batch_requires_admin_session(app):
+    r = app.test_client().post("/cast-vote/batch", json={"election_id": "EL-B", "ballots": []})
+    assert r.status_code == 403
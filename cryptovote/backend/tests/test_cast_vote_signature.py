@@ -5,7 +5,9 @@ import hashlib
 import pytest
 from flask import Flask
 
-from utilities.verification.vote_verification_utils import parse_and_verify_signature
+from utilities.verification.vote_verification_utils import (
+    parse_and_verify_signature, clear_signature_cache,
+)
 
 
 # --- Flask app context so jsonify() works inside the util ---
@@ -93,3 +95,36 @@ def test_malformed_signature_hex_is_rejected(patch_verify_signed_token):
     bad_hex = "zz11"  # invalid hex
     ok, _, code = parse_and_verify_signature(token, bad_hex, pub)
     assert not ok and code == 400, "Non-hex signature input should be rejected with 400"
+
+
+def test_repeated_signature_is_answered_from_cache(monkeypatch):
+    import types
+    import utilities.blind_signature_utils as bs
+
+    calls = []
+
+    def counting_verify(pubkey, token_bytes, signature_int) -> bool:
+        calls.append(token_bytes)
+        return signature_int == _fake_sign(token_bytes.decode("utf-8"))
+
+    monkeypatch.setattr(bs, "verify_signed_token", counting_verify, raising=True)
+    clear_signature_cache()
+    pub = types.SimpleNamespace(n=0xC0FFEE, e=65537)      # keyed on (n, e)
+    token = "retry-" + os.urandom(8).hex()
+    sig_hex = f"{_fake_sign(token):x}"
+
+    for _ in range(3):
+        ok, _, err = parse_and_verify_signature(token, sig_hex, pub)
+        assert ok and err is None
+    for _ in range(2):
+        ok, _, code = parse_and_verify_signature(token + "x", sig_hex, pub)
+        assert not ok and code == 403
+    assert len(calls) == 2, "each (token, signature) should be verified once"
+
+    # another key must not reuse the first key's verdict
+    ok, _, _ = parse_and_verify_signature(token, sig_hex, types.SimpleNamespace(n=0xBEEF, e=3))
+    assert ok and len(calls) == 3
+
+    clear_signature_cache()
+    parse_and_verify_signature(token, sig_hex, pub)
+    assert len(calls) == 4
@@ -0,0 +1,120 @@
+# backend/tests/test_election_service.py
+import importlib
+import sys
+from types import SimpleNamespace as NS
+
+import pytest
+from flask import Flask
+
+from models.db import db
+from models.election import Election, Candidate
+from models.encrypted_candidate_vote import EncryptedCandidateVote  # noqa: F401  (Candidate relationship)
+from models.wbb_entry import WbbEntry
+from models.wbb_sequence import WbbSequence
+from models.wbb_merkle_node import WbbMerkleNode
+from models.wbb_tree_head import WbbTreeHead
+from models.wbb_tree_state import WbbTreeState
+import services.wbb_service as wbb_svc
+from routes.wbb import wbb_bp
+import utilities.key_registry as kr
+import utilities.tree_head_utils as thu
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    key_path = str(tmp_path / "wbb_sth_private.pem")
+    thu.ensure_sth_keypair(key_path)
+    monkeypatch.setattr(thu, "STH_PRIVATE_KEY_PATH", key_path)
+    kr.invalidate_keys()
+    wbb_svc.clear_root_cache()
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    app.register_blueprint(wbb_bp)
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            Election.__table__, Candidate.__table__, WbbEntry.__table__, WbbSequence.__table__,
+            WbbMerkleNode.__table__, WbbTreeHead.__table__, WbbTreeState.__table__,
+        ])
+        db.session.add(Election(id="EN1", name="end", rsa_key_id="default_rsa_key",
+                                is_active=True, has_started=True, has_ended=False))
+        db.session.commit()
+        yield app
+        db.session.remove()
+    kr.invalidate_keys()
+
+
+@pytest.fixture
+def admin_log():
+    return []
+
+
+@pytest.fixture
+def election_svc(monkeypatch, admin_log):
+    """
+    services.election_service with log_admin_action recorded. Its real logger
+    module maps models.admin_log, whose PostgreSQL-only CHECK constraints clash
+    with test_audit_chain's SQLite table, so a stand-in is imported instead.
+    """
+    monkeypatch.setitem(sys.modules, "utilities.logger_utils",
+                        NS(log_admin_action=lambda *a: admin_log.append(a)))
+    monkeypatch.delitem(sys.modules, "services.election_service", raising=False)
+    svc = importlib.import_module("services.election_service")
+    monkeypatch.setitem(sys.modules, "services.election_service", svc)
+    return svc
+
+
+def _cast(eid, pos):
+    leaf = f"{pos + 500:064x}"
+    wbb_svc.append_leaves(db.session, eid, pos, [leaf])
+    db.session.add(WbbEntry(election_id=eid, tracker=f"{pos:08x}", token_hash=leaf,
+                            position=pos, leaf_hash=leaf))
+    db.session.commit()
+
+
+def test_end_election_signs_the_final_head(app, election_svc, admin_log):
+    for _ in range(3):
+        _cast("EN1", wbb_svc.allocate_positions(db.session, "EN1"))
+
+    body, status = election_svc.end_election_by_id("EN1", "admin@x", "127.0.0.1")
+    assert status == 200
+    assert wbb_svc.get_tree_head(db.session, "EN1").tree_size == 3
+    assert admin_log == [("end_election", "admin@x", "admin", "127.0.0.1")]
+
+
+def test_end_election_survives_a_tree_head_failure(app, election_svc, admin_log, monkeypatch, caplog):
+    _cast("EN1", wbb_svc.allocate_positions(db.session, "EN1"))
+
+    def no_key():
+        raise FileNotFoundError("wbb_sth_private.pem")
+    monkeypatch.setattr(wbb_svc, "sth_signing_material", no_key)
+
+    with caplog.at_level("WARNING"):
+        body, status = election_svc.end_election_by_id("EN1", "admin@x", "127.0.0.1")
+    assert status == 200
+    assert db.session.get(Election, "EN1").has_ended
+    assert wbb_svc.get_tree_head(db.session, "EN1") is None
+    assert admin_log == [("end_election", "admin@x", "admin", "127.0.0.1")]      # no hole in the audit log
+    assert any("Final tree head for 'EN1' failed" in r.getMessage() for r in caplog.records)
+
+
+def test_end_election_seals_every_gap_so_the_final_head_covers_all_ballots(app, election_svc, admin_log):
+    for _ in range(2):
+        _cast("EN1", wbb_svc.allocate_positions(db.session, "EN1"))
+    assert wbb_svc.allocate_positions(db.session, "EN1") == 2       # its ballot rolls back
+    db.session.commit()                                            # (PostgreSQL keeps the bump)
+    for _ in range(2):
+        _cast("EN1", wbb_svc.allocate_positions(db.session, "EN1"))
+    wbb_svc.update_board(db.session, "EN1")
+    db.session.commit()
+    assert wbb_svc.board_size(db.session, "EN1") == 2                # waiting on the gap, still in grace
+
+    body, status = election_svc.end_election_by_id("EN1", "admin@x", "127.0.0.1")
+    assert status == 200
+    assert wbb_svc.get_tree_head(db.session, "EN1").tree_size == 5
+    listing = app.test_client().get("/wbb/EN1").get_json()
+    assert listing["count"] == 5 and [i["index"] for i in listing["items"]] == [0, 1, 3, 4]
@@ -0,0 +1,136 @@
+# backend/tests/test_key_registry.py
+import json
+import os
+import threading
+
+import pytest
+from phe import paillier
+
+import utilities.key_registry as kr
+import utilities.paillier_utils as pau
+import utilities.tree_head_utils as thu
+from utilities.key_fingerprint import fingerprint_paillier_n
+
+
+def _write_pub(path, pub):
+    path.write_text(json.dumps({"n": pub.n}))
+
+
+def test_paillier_material_is_cached_and_hot_reloads(tmp_path, monkeypatch):
+    pub1, _ = paillier.generate_paillier_keypair(n_length=256)
+    pub2, _ = paillier.generate_paillier_keypair(n_length=256)
+    key_file = tmp_path / "paillier_public_key.json"
+    _write_pub(key_file, pub1)
+
+    monkeypatch.setattr(pau, "KEYS_DIR", str(tmp_path))
+    monkeypatch.setattr(kr, "KEY_RECHECK_SECONDS", 0.0)
+    kr.invalidate_keys()
+
+    m1 = kr.paillier_public_material()
+    assert m1.n == pub1.n and m1.nsquare == pub1.n ** 2
+    assert m1.key_id == fingerprint_paillier_n(pub1.n)
+    assert kr.paillier_public_material() is m1          # no re-parse while the file is unchanged
+
+    _write_pub(key_file, pub2)
+    st = key_file.stat()
+    os.utime(key_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    m2 = kr.paillier_public_material()
+    assert m2 is not m1 and m2.n == pub2.n
+    assert kr.load_paillier_public_key().n == pub2.n
+    kr.invalidate_keys()
+
+
+def test_describe_matches_public_keys_contract():
+    pub, _ = paillier.generate_paillier_keypair(n_length=256)
+    d = kr.describe_paillier(pub.n)
+    assert int(d["nHex"], 16) == pub.n
+    assert d["bits"] == pub.n.bit_length()
+    assert d["key_id"] == fingerprint_paillier_n(pub.n)
+
+
+def test_rsa_keyring_loads_per_election_keys_lazily_with_lru(tmp_path, monkeypatch):
+    from Crypto.PublicKey import RSA
+    import utilities.blind_signature_utils as rsa_utils
+
+    k_a, k_b, k_default = (RSA.generate(1024) for _ in range(3))
+    (tmp_path / "EL-A.pem").write_bytes(k_a.export_key("PEM"))
+    (tmp_path / "EL-B.pem").write_bytes(k_b.publickey().export_key("PEM"))     # verify-only node
+    (tmp_path / "default_private.pem").write_bytes(k_default.export_key("PEM"))
+    monkeypatch.setattr(kr, "RSA_KEYRING_DIR", str(tmp_path))
+    monkeypatch.setattr(rsa_utils, "PRIVATE_KEY_PATH", str(tmp_path / "default_private.pem"))
+    monkeypatch.setattr(kr, "_keyring", kr._Keyring(size=1))
+    monkeypatch.setattr(kr, "RSA_LEGACY_KEY_FALLBACK", False)
+    kr.invalidate_keys()
+
+    a = kr.rsa_signing_material("EL-A")
+    assert a.n == k_a.n and kr.rsa_signing_material("EL-A") is a        # parsed once
+    assert kr.load_rsa_public_key("EL-A").n == k_a.n
+    assert kr.rsa_signing_material(kr.DEFAULT_RSA_KEY_ID).n == k_default.n
+    assert kr.rsa_signing_material(None).n == k_default.n
+
+    assert kr.rsa_public_material("EL-B").n == k_b.n                    # evicts EL-A (size 1)
+    assert list(kr._keyring._keys) == ["EL-B"]
+    with pytest.raises(kr.UnknownRsaKey):
+        kr.rsa_signing_material("EL-B")                                 # no private half here
+
+    for bad in ("EL-MISSING", "../default_private", ""):
+        with pytest.raises(kr.UnknownRsaKey):
+            kr.rsa_public_material(bad or "x/y")
+    assert not kr.has_rsa_key("EL-MISSING") and not kr.has_rsa_key("../default_private")
+    assert kr.has_rsa_key("EL-A") and kr.has_rsa_key(kr.DEFAULT_RSA_KEY_ID)
+    assert list(kr._keyring._keys) == ["EL-B"]                          # misses are not kept
+    kr.invalidate_keys()
+
+
+def test_legacy_election_without_keyring_file_uses_the_deployment_key(tmp_path, monkeypatch, caplog):
+    from Crypto.PublicKey import RSA
+    import utilities.blind_signature_utils as rsa_utils
+
+    k_default = RSA.generate(1024)
+    (tmp_path / "default_private.pem").write_bytes(k_default.export_key("PEM"))
+    (tmp_path / "default_public.pem").write_bytes(k_default.publickey().export_key("PEM"))
+    monkeypatch.setattr(kr, "RSA_KEYRING_DIR", str(tmp_path / "rsa"))
+    monkeypatch.setattr(rsa_utils, "PRIVATE_KEY_PATH", str(tmp_path / "default_private.pem"))
+    monkeypatch.setattr(rsa_utils, "PUBLIC_KEY_PATH", str(tmp_path / "default_public.pem"))
+    monkeypatch.setattr(kr, "_fallback_warned", set())
+    kr.invalidate_keys()
+
+    with caplog.at_level("WARNING"):
+        assert kr.rsa_signing_material("election-2023-key").n == k_default.n
+        assert kr.rsa_public_material("election-2023-key").n == k_default.n
+    assert [r.getMessage() for r in caplog.records if "election-2023-key" in r.getMessage()] == [
+        "No keyring file for rsa_key_id 'election-2023-key'; using the deployment RSA key (legacy election)"
+    ]                                                                   # warned once per id
+    assert not kr.has_rsa_key("election-2023-key")                      # new elections still need a file
+    with pytest.raises(kr.UnknownRsaKey):
+        kr.rsa_public_material("../default_private")                    # malformed ids never fall back
+
+    monkeypatch.setattr(kr, "RSA_LEGACY_KEY_FALLBACK", False)
+    with pytest.raises(kr.UnknownRsaKey):
+        kr.rsa_signing_material("election-2023-key")
+    kr.invalidate_keys()
+
+
+def test_sth_key_is_published_whole_by_exactly_one_worker(tmp_path, monkeypatch):
+    path = str(tmp_path / "wbb_sth_private.pem")
+    seen, start = [], threading.Barrier(4)
+    real_generate = thu.RSA.generate
+
+    def generate(bits):
+        key = real_generate(1024)
+        start.wait()                 # all four workers race past the exists() check
+        return key
+    monkeypatch.setattr(thu.RSA, "generate", generate)
+
+    def worker():
+        seen.append(thu.load_sth_private_key(thu.ensure_sth_keypair(path)).n)
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(seen) == 4 and len(set(seen)) == 1
+    assert os.listdir(tmp_path) == ["wbb_sth_private.pem"]      # no temp files left behind
+    assert oct(os.stat(path).st_mode & 0o777) == "0o600"
@@ -104,3 +104,66 @@ def test_receipt_pdf_includes_tracker_line_without_leaking_choices(client):
     assert b"Inclusion" in data or b"Not found" in data
 
     _assert_no_choice_leak(data)
+
+def test_receipt_proves_against_the_latest_signed_head_or_says_pending(app, client, monkeypatch, tmp_path):
+    """
+    A posted tracker gets its Merkle path, root and signature for the latest
+    tree head; entries past that head are marked pending (default STH interval).
+    """
+    import utilities.key_registry as kr
+    import utilities.tree_head_utils as thu
+    import services.wbb_service as wbb_svc
+    from models.wbb_entry import WbbEntry
+    from utilities.merkle import merkle_root, merkle_proof
+
+    key_path = str(tmp_path / "wbb_sth_private.pem")
+    thu.ensure_sth_keypair(key_path)
+    monkeypatch.setattr(thu, "STH_PRIVATE_KEY_PATH", key_path)
+    kr.invalidate_keys()
+    wbb_svc.clear_root_cache()
+
+    leaves = []
+    with app.app_context():
+        for _ in range(5):
+            pos = wbb_svc.allocate_positions(db.session, "EL-R")
+            leaf = f"{pos + 77:064x}"
+            wbb_svc.append_leaves(db.session, "EL-R", pos, [leaf])
+            db.session.add(WbbEntry(election_id="EL-R", tracker=f"{pos:08x}", token_hash=leaf,
+                                    position=pos, leaf_hash=leaf))
+            db.session.commit()
+            wbb_svc.update_board(db.session, "EL-R", until=pos)
+            db.session.commit()
+            leaves.append(leaf)
+            if pos == 2:
+                # the first ballot signed a head at size 1; sign one at 3, as the interval would later
+                wbb_svc.publish_tree_head(db.session, "EL-R", force=True)
+                db.session.commit()
+
+    r = client.get("/voter/receipt", query_string={"election_id": "EL-R", "tracker": f"{1:08x}"})
+    assert r.status_code == 200
+    data = r.data
+    assert b"index 1" in data
+    assert b"Board size: 3" in data
+    assert f"Merkle root: {merkle_root(leaves[:3])}".encode() in data
+    for node in merkle_proof(leaves[:3], 1):
+        assert node.encode() in data
+    assert b"Root signed:" in data and b"not issued" not in data
+    _assert_no_choice_leak(data)
+
+    r = client.get("/voter/receipt", query_string={"election_id": "EL-R", "tracker": f"{3:08x}"})
+    assert r.status_code == 200
+    assert b"index 3" in r.data and b"Inclusion pending" in r.data
+    assert b"Merkle root:" not in r.data
+    kr.invalidate_keys()
+
+def test_receipt_logos_are_decoded_once_per_process(client, monkeypatch):
+    opened = []
+    original_open = receipt_routes.Image.open
+    monkeypatch.setattr(receipt_routes.Image, "open", lambda p: opened.append(p) or original_open(p))
+    receipt_routes._logos.cache_clear()
+
+    for _ in range(3):
+        r = client.get("/voter/receipt", query_string={"election_id": "EL-LOGO"})
+        assert r.status_code == 200 and b"/Subtype /Image" in r.data
+    assert len(opened) == len(receipt_routes._logos()) == 2
+    receipt_routes._logos.cache_clear()
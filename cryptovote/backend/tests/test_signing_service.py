@@ -0,0 +1,93 @@
+# backend/tests/test_signing_service.py
+import random
+
+import pytest
+from Crypto.PublicKey import RSA
+
+import utilities.blind_signature_utils as rsa_utils
+import utilities.key_registry as kr
+import services.signing_service as signer
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return RSA.generate(1024)
+
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch, rsa_key):
+    path = tmp_path / "rsa_private.pem"
+    path.write_bytes(rsa_key.export_key("PEM"))
+    monkeypatch.setattr(rsa_utils, "PRIVATE_KEY_PATH", str(path))
+    kr.invalidate_keys()
+    signer.reset_signing_metrics()
+    yield path
+    kr.invalidate_keys()
+    signer.reset_signing_metrics()
+
+
+def test_crt_signature_matches_plain_rsa_and_key_is_parsed_once(key_file, rsa_key):
+    n, d = int(rsa_key.n), int(rsa_key.d)
+    for _ in range(5):
+        c = random.randrange(2, n)
+        assert signer.sign_blinded_token(c, kr.DEFAULT_RSA_KEY_ID) == pow(c, d, n)
+    assert signer.signing_key(kr.DEFAULT_RSA_KEY_ID) is signer.signing_key(kr.DEFAULT_RSA_KEY_ID)
+
+    with pytest.raises(ValueError):
+        signer.sign_blinded_token(n + 1, kr.DEFAULT_RSA_KEY_ID)
+
+    m = signer.signing_metrics()["keys"][kr.DEFAULT_RSA_KEY_ID]
+    assert m["count"] == 5 and m["faults"] == 0
+    assert sum(m["histogram"].values()) == 5
+
+
+def test_faulty_crt_result_is_withheld(key_file, monkeypatch):
+    good = kr.rsa_signing_material()
+    monkeypatch.setattr(signer, "signing_key", lambda _id=None: good._replace(dP=good.dP ^ 1))
+
+    with pytest.raises(signer.SigningFault):
+        signer.sign_blinded_token(random.randrange(2, good.n), kr.DEFAULT_RSA_KEY_ID)
+    m = signer.signing_metrics()["keys"][kr.DEFAULT_RSA_KEY_ID]
+    assert m["faults"] == 1 and m["count"] == 0
+
+
+def test_process_backend_signs_off_thread_and_sheds_load(key_file, rsa_key, monkeypatch):
+    monkeypatch.setattr(signer, "SIGN_BACKEND", "process")
+    monkeypatch.setattr(signer, "SIGN_WORKERS", 1)
+    signer.shutdown_signing_pool()
+    try:
+        n, d = int(rsa_key.n), int(rsa_key.d)
+        values = [random.randrange(2, n) for _ in range(3)]
+        assert [signer.sign_blinded_token(c, kr.DEFAULT_RSA_KEY_ID) for c in values] == \
+            [pow(c, d, n) for c in values]
+        with pytest.raises(ValueError):                     # worker errors come back as-is
+            signer.sign_blinded_token(n, kr.DEFAULT_RSA_KEY_ID)
+        assert signer.signing_metrics()["backend"] == "process"
+    finally:
+        signer.shutdown_signing_pool()
+
+    # every slot taken -> rejected at once, before anything is queued
+    full = signer._PoolSigner(workers=1, max_inflight=1)
+    assert full._slots.acquire(blocking=False)
+    with pytest.raises(signer.SignerBusy):
+        full.sign(kr.rsa_signing_material(), 2, timeout=1)
+    assert full._pool is None
+
+
+def test_sign_many_keeps_order_and_isolates_bad_values(key_file, rsa_key, monkeypatch):
+    n, d = int(rsa_key.n), int(rsa_key.d)
+    values = [random.randrange(2, n) for _ in range(7)] + [n + 5]
+    expected = [pow(c, d, n) for c in values[:-1]]
+
+    inline = signer.sign_many(values, kr.DEFAULT_RSA_KEY_ID)
+    assert inline[:-1] == expected and isinstance(inline[-1], ValueError)
+
+    monkeypatch.setattr(signer, "SIGN_BACKEND", "process")
+    monkeypatch.setattr(signer, "SIGN_WORKERS", 2)
+    signer.shutdown_signing_pool()
+    try:
+        pooled = signer.sign_many(values, kr.DEFAULT_RSA_KEY_ID)
+        assert pooled[:-1] == expected and isinstance(pooled[-1], ValueError)
+    finally:
+        signer.shutdown_signing_pool()
+    assert signer.signing_metrics()["keys"][kr.DEFAULT_RSA_KEY_ID]["count"] == 14
@@ -5,9 +5,15 @@ from phe import paillier
 
 from models.db import db
 from models.election import Election, Candidate
+from models.encrypted_tally_accumulator import EncryptedTallyAccumulator
+from models.encrypted_tally_partial import EncryptedTallyPartial
 import models.encrypted_candidate_vote as ecv_mod
 import services.tallying_service as tally_svc
-import os, hashlib
+import services.tally_accumulator_service as acc_svc
+from services.candidate_cache import invalidate_candidates
+import os, hashlib, json, threading
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 
 
 def _ensure_mapped_ecv():
@@ -76,7 +82,8 @@ def app():
         # Create only the tables we actually need
         db.Model.metadata.create_all(
             bind=db.engine,
-            tables=[Election.__table__, Candidate.__table__, ECV_tbl],
+            tables=[Election.__table__, Candidate.__table__, ECV_tbl,
+                    EncryptedTallyAccumulator.__table__, EncryptedTallyPartial.__table__],
         )
     yield app
 
@@ -88,9 +95,12 @@ def session(app):
         db.session.rollback()
         # Truncate touched tables between tests
         for tbl in reversed(db.Model.metadata.sorted_tables):
-            if tbl.name in {"encrypted_candidate_votes", "candidates", "elections"}:
+            if tbl.name in {"encrypted_tally_accumulators", "encrypted_tally_partials",
+                            "encrypted_candidate_votes",
+                            "candidates", "elections"}:
                 db.session.execute(tbl.delete())
         db.session.commit()
+        invalidate_candidates()
 
 
 @pytest.fixture
@@ -175,3 +185,253 @@ def test_tally_homomorphic_sum_and_decrypts_only_aggregates(session, paillier_pa
 
     assert got[c1] == 2 and got[c2] == 1, f"Unexpected tallies: {got}"
     assert calls["n"] == 2, f"decrypt called {calls['n']} times; expected 2 (aggregate only)"
+
+
+def test_parallel_engine_matches_serial(session, paillier_pair, monkeypatch):
+    """
+    The process-pool engine must return exactly what the serial engine returns,
+    even when the ballots are spread over several chunks, and reuse its pool.
+    """
+    pub, priv = paillier_pair
+    ECV, _ = _ensure_mapped_ecv()
+    monkeypatch.setattr(tally_svc, "EncryptedCandidateVote", ECV, raising=False)
+
+    election_id, c1, c2 = _seed_election(session)
+    for choice in (c1, c2, c1, c1, c2):
+        _put_enc_vote(session, ECV, c1, election_id, pub, int(choice == c1))
+        _put_enc_vote(session, ECV, c2, election_id, pub, int(choice == c2))
+    session.commit()
+
+    monkeypatch.setattr(tally_svc, "TALLY_CHUNK_SIZE", 3, raising=True)
+    serial = tally_svc.tally_votes(session, election_id, engine="serial")
+    parallel = tally_svc.tally_votes(session, election_id, engine="parallel")
+
+    assert parallel == serial
+    assert {r["candidate_id"]: r["vote_count"] for r in parallel} == {c1: 3, c2: 2}
+
+    # the pool is spawn-based and outlives the tally
+    pool = tally_svc._pool()
+    assert pool._mp_context.get_start_method() == "spawn"
+    assert tally_svc.tally_votes(session, election_id, engine="parallel") == serial
+    assert tally_svc._pool() is pool
+
+
+def test_unknown_engine_is_rejected(session, paillier_pair):
+    with pytest.raises(ValueError):
+        tally_svc.tally_votes(session, "EL-NONE", engine="gpu")
+
+
+def test_raw_engine_matches_serial_and_falls_back_for_exponents(session, paillier_pair, monkeypatch):
+    """
+    The raw-integer engine keeps one running product per candidate; a row with a
+    non-zero exponent must still be added through the phe path.
+    """
+    pub, priv = paillier_pair
+    ECV, _ = _ensure_mapped_ecv()
+    monkeypatch.setattr(tally_svc, "EncryptedCandidateVote", ECV, raising=False)
+
+    election_id, c1, c2 = _seed_election(session)
+    for choice in (c2, c1, c2):
+        _put_enc_vote(session, ECV, c1, election_id, pub, int(choice == c1))
+        _put_enc_vote(session, ECV, c2, election_id, pub, int(choice == c2))
+
+    # One legacy row encoded as a float, i.e. with a non-zero exponent
+    legacy = pub.encrypt(1.0)
+    assert legacy.exponent != 0
+    session.add(ECV(
+        candidate_id=c1, election_id=election_id,
+        vote_ciphertext=str(legacy.ciphertext()), vote_exponent=legacy.exponent,
+        token_hash=hashlib.sha256(os.urandom(8)).hexdigest(),
+    ))
+    session.commit()
+
+    serial = tally_svc.tally_votes(session, election_id, engine="serial")
+    raw = tally_svc.tally_votes(session, election_id, engine="raw")
+
+    assert raw == serial
+    assert {r["candidate_id"]: r["vote_count"] for r in raw} == {c1: 2, c2: 2}
+
+
+def test_streaming_fetch_yields_tuples_and_matches_full_fetch(session, paillier_pair, monkeypatch):
+    pub, priv = paillier_pair
+    ECV, _ = _ensure_mapped_ecv()
+    monkeypatch.setattr(tally_svc, "EncryptedCandidateVote", ECV, raising=False)
+
+    election_id, c1, c2 = _seed_election(session)
+    for choice in (c1, c2, c2):
+        _put_enc_vote(session, ECV, c1, election_id, pub, int(choice == c1))
+        _put_enc_vote(session, ECV, c2, election_id, pub, int(choice == c2))
+    session.commit()
+
+    rows = list(tally_svc.stream_encrypted_votes(session, election_id, batch_size=2))
+    assert len(rows) == 6
+    assert all(len(r) == 3 and r.vote_exponent == 0 for r in rows)
+
+    streamed = tally_svc.tally_votes(session, election_id, stream=True)
+    loaded = tally_svc.tally_votes(session, election_id, stream=False)
+    assert streamed == loaded
+    assert {r["candidate_id"]: r["vote_count"] for r in streamed} == {c1: 1, c2: 2}
+
+
+def test_incremental_accumulators_match_full_tally_and_reconcile(session, paillier_pair, monkeypatch):
+    """
+    Ballots folded in at cast time must decrypt to the same tally as a full
+    recount; a tampered accumulator is reported and repaired by reconciliation.
+    """
+    pub, priv = paillier_pair
+    ECV, _ = _ensure_mapped_ecv()
+    monkeypatch.setattr(tally_svc, "EncryptedCandidateVote", ECV, raising=False)
+
+    election_id, c1, c2 = _seed_election(session)
+    acc_svc.seed_accumulators(session, election_id)
+    session.commit()
+
+    for choice in (c1, c2, c1):
+        cts = {
+            c1: pub.encrypt(int(choice == c1)).ciphertext(),
+            c2: pub.encrypt(int(choice == c2)).ciphertext(),
+        }
+        acc_svc.apply_ballot_to_accumulators(session, election_id, cts, pub.nsquare)
+        for cid, c in cts.items():
+            session.add(ECV(candidate_id=cid, election_id=election_id, vote_ciphertext=str(c),
+                            vote_exponent=0, token_hash=os.urandom(32).hex()))
+        session.commit()
+
+    incremental = tally_svc.tally_votes(session, election_id, engine="incremental")
+    recount = tally_svc.tally_votes(session, election_id, engine="raw")
+    assert incremental == recount
+    assert {r["candidate_id"]: r["vote_count"] for r in incremental} == {c1: 2, c2: 1}
+
+    # partials are read as they are; folding them in changes nothing
+    assert acc_svc.fold_partials(session, election_id, pub.nsquare) == 6
+    session.commit()
+    assert EncryptedTallyPartial.query.count() == 0
+    assert tally_svc.tally_votes(session, election_id, engine="incremental") == recount
+
+    clean = acc_svc.reconcile_accumulators(session, election_id, pub.nsquare, repair=False)
+    assert clean["diverged"] == []
+
+    acc = EncryptedTallyAccumulator.query.filter_by(election_id=election_id, candidate_id=c2).one()
+    acc.ciphertext = str(pub.encrypt(5).ciphertext())
+    session.commit()
+
+    report = acc_svc.reconcile_accumulators(session, election_id, pub.nsquare, repair=True)
+    session.commit()
+    assert [d["candidate_id"] for d in report["diverged"]] == [c2]
+    assert report["repaired"] is True
+    assert tally_svc.tally_votes(session, election_id, engine="incremental") == recount
+
+
+def test_tally_keys_come_from_the_key_registry(tmp_path, monkeypatch):
+    """The tally key is parsed once per process and reloaded when its file changes."""
+    import utilities.key_registry as kr
+    import utilities.paillier_utils as pau
+
+    monkeypatch.setattr(pau, "KEYS_DIR", str(tmp_path))
+    monkeypatch.setattr(kr, "KEY_RECHECK_SECONDS", 0.0)
+
+    def _write(pub, priv):
+        (tmp_path / "paillier_public_key.json").write_text(json.dumps({"n": pub.n}))
+        (tmp_path / "paillier_private_key.json").write_text(
+            json.dumps({"p": priv.p, "q": priv.q, "public_key_n": pub.n}))
+    pub1, priv1 = paillier.generate_paillier_keypair(n_length=256)
+    _write(pub1, priv1)
+    kr.invalidate_keys()
+
+    first = tally_svc.load_private_key()
+    assert first.p == priv1.p and tally_svc.load_private_key() is first
+
+    pub2, priv2 = paillier.generate_paillier_keypair(n_length=256)
+    _write(pub2, priv2)
+    key_file = tmp_path / "paillier_private_key.json"
+    st = key_file.stat()
+    os.utime(key_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert tally_svc.load_private_key().p == priv2.p
+    kr.invalidate_keys()
+
+
+def test_batch_decrypt_matches_phe_decrypt(paillier_pair, monkeypatch):
+    pub, priv = paillier_pair
+    sums = {"A": pub.encrypt(7) + pub.encrypt(3), "B": pub.encrypt(0), "C": pub.encrypt(-2),
+            "D": pub.encrypt(41)}
+    expected = {cid: priv.decrypt(e) for cid, e in sums.items()}
+    calls = {"n": 0}
+    real = priv.raw_decrypt
+    def _counting(c):
+        calls["n"] += 1
+        return real(c)
+    monkeypatch.setattr(priv, "raw_decrypt", _counting)
+
+    assert tally_svc.decrypt_tally(sums, priv) == expected
+    assert calls["n"] == 2                     # one packed decryption plus its check, not one per sum
+
+
+def test_batch_decrypt_never_lets_a_stuffed_sum_spill_into_a_neighbour(paillier_pair):
+    pub, priv = paillier_pair
+    digit = 1 << (tally_svc.TALLY_PACK_DIGIT_BITS + 1)
+    # A carries a multiple of a typical packing base: packed alone it would shift into B
+    sums = {"A": pub.encrypt(5 + 3 * digit), "B": pub.encrypt(2), "C": pub.encrypt(1)}
+    assert tally_svc.decrypt_tally(sums, priv) == {
+        "A": tally_svc._decode_count(pub, 5 + 3 * digit), "B": 2, "C": 1,
+    }
+
+
+def test_first_ballots_racing_to_seed_accumulators(tmp_path, paillier_pair, monkeypatch):
+    """
+    Two sessions fold the first ballots of an election that has no accumulator
+    rows yet, both having seen it unseeded: neither fails on uq_acc_per_candidate
+    and every ballot is counted once.
+    """
+    pub, _ = paillier_pair
+    _ensure_mapped_ecv()
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"timeout": 30})
+    db.Model.metadata.create_all(engine, tables=[
+        Election.__table__, Candidate.__table__,
+        EncryptedTallyAccumulator.__table__, EncryptedTallyPartial.__table__,
+    ])
+    with Session(engine) as s:
+        s.add(Election(id="EL-RACE", name="Race", is_active=True))
+        s.flush()
+        s.add_all([Candidate(id="R1", name="A", election_id="EL-RACE"),
+                   Candidate(id="R2", name="B", election_id="EL-RACE")])
+        s.commit()
+
+    both_saw_empty = threading.Barrier(2, timeout=10)
+    real_lock = acc_svc._lock_accumulators
+
+    def lock_after_both_looked(session, election_id, skip_locked=False):
+        accs = real_lock(session, election_id, skip_locked)
+        if not accs:
+            both_saw_empty.wait()
+        return accs
+    monkeypatch.setattr(acc_svc, "_lock_accumulators", lock_after_both_looked)
+
+    errors = []
+    def first_ballot(choice):
+        try:
+            with Session(engine) as s:
+                cts = {cid: pub.encrypt(int(cid == choice)).ciphertext() for cid in ("R1", "R2")}
+                acc_svc.apply_ballot_to_accumulators(s, "EL-RACE", cts, pub.nsquare)
+                s.commit()
+                acc_svc.fold_partials(s, "EL-RACE", pub.nsquare)
+                s.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=first_ballot, args=(c,)) for c in ("R1", "R2")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    with Session(engine) as s:
+        accs = {a.candidate_id: a for a in s.query(EncryptedTallyAccumulator)}
+        pending = s.query(EncryptedTallyPartial).count()
+        assert sorted(accs) == ["R1", "R2"]
+        assert {cid: a.ballot_count for cid, a in accs.items()} == {"R1": 2, "R2": 2}
+        assert pending == 0
+        _, priv = paillier_pair
+        assert {cid: priv.decrypt(paillier.EncryptedNumber(pub, int(a.ciphertext), 0))
+                for cid, a in accs.items()} == {"R1": 1, "R2": 1}
+    engine.dispose()
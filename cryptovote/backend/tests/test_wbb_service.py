@@ -0,0 +1,411 @@
+# backend/tests/test_wbb_service.py
+import hashlib
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+
+from models.db import db
+from models.wbb_entry import WbbEntry
+from models.wbb_sequence import WbbSequence
+from models.wbb_merkle_node import WbbMerkleNode
+from models.wbb_tree_head import WbbTreeHead
+from models.wbb_tree_state import WbbTreeState
+from utilities.merkle import (
+    merkle_root, merkle_proof, verify_consistency, verify_multiproof, verify_snapshot,
+    GAP_LEAF_HEX,
+)
+import utilities.key_registry as kr
+import utilities.tree_head_utils as thu
+import services.wbb_service as wbb_svc
+import routes.wbb as wbb_routes
+from routes.wbb import wbb_bp
+import services.wbb_feed as feed
+import services.wbb_upkeep as upkeep
+
+
+@pytest.fixture(scope="module")
+def sth_key_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("keys") / "wbb_sth_private.pem")
+    thu.ensure_sth_keypair(path)
+    return path
+
+
+@pytest.fixture
+def app(monkeypatch, sth_key_path):
+    monkeypatch.setattr(thu, "STH_PRIVATE_KEY_PATH", sth_key_path)
+    kr.invalidate_keys()
+    wbb_svc.clear_root_cache()
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    app.register_blueprint(wbb_bp)
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            WbbEntry.__table__, WbbSequence.__table__, WbbMerkleNode.__table__,
+            WbbTreeHead.__table__, WbbTreeState.__table__,
+        ])
+        yield app
+        db.session.remove()
+
+
+def _entry(eid, pos):
+    return WbbEntry(election_id=eid, tracker=f"{pos:08x}", token_hash=f"{pos:064x}",
+                    position=pos, leaf_hash=f"{pos:064x}")
+
+
+def test_allocator_continues_legacy_board_and_reserves_blocks(app):
+    db.session.add_all([_entry("E1", 0), _entry("E1", 1), _entry("E1", 2)])
+    db.session.commit()
+
+    assert wbb_svc.allocate_positions(db.session, "E1") == 3          # picks up after MAX once
+    assert wbb_svc.allocate_positions(db.session, "E1", count=5) == 4  # block 4..8
+    assert wbb_svc.allocate_positions(db.session, "E1") == 9
+    assert wbb_svc.allocate_positions(db.session, "E2") == 0          # elections are independent
+    db.session.commit()
+    assert db.session.get(WbbSequence, "E1").next_position == 10
+
+
+def test_position_bumps_use_one_small_pool_per_database(monkeypatch, tmp_path):
+    monkeypatch.setattr(wbb_svc, "_sequence_engines", {})
+    app_engine = create_engine(f"sqlite:///{tmp_path / 'board.db'}")
+    seq = wbb_svc._sequence_engine(app_engine)
+    try:
+        assert seq is not app_engine and seq.url == app_engine.url
+        assert wbb_svc._sequence_engine(create_engine(app_engine.url)) is seq
+        assert seq.pool.size() == wbb_svc.SEQUENCE_POOL_SIZE and seq.pool._max_overflow == 0
+    finally:
+        seq.dispose()
+        app_engine.dispose()
+
+
+def test_rolled_back_allocation_is_released(app):
+    assert wbb_svc.allocate_positions(db.session, "E3") == 0
+    db.session.commit()
+    assert wbb_svc.allocate_positions(db.session, "E3") == 1
+    db.session.rollback()
+    assert wbb_svc.allocate_positions(db.session, "E3") == 1
+
+
+def _cast(eid, leaves):
+    """What /cast-vote does per ballot: allocate, store the leaf and entry, commit, update the board."""
+    pos = wbb_svc.allocate_positions(db.session, eid)
+    leaf = f"{len(leaves) + 1000:064x}"
+    wbb_svc.append_leaves(db.session, eid, pos, [leaf])
+    db.session.add(WbbEntry(election_id=eid, tracker=f"{pos:08x}", token_hash=leaf,
+                            position=pos, leaf_hash=leaf))
+    db.session.commit()
+    wbb_svc.update_board(db.session, eid, until=pos)
+    db.session.commit()
+    leaves.append(leaf)
+
+
+def test_stored_tree_matches_full_rebuild(app):
+    leaves = []
+    for _ in range(13):
+        _cast("T1", leaves)
+        assert wbb_svc.board_root(db.session, "T1") == (len(leaves), merkle_root(leaves))
+
+    for i in (0, 5, 12):
+        size, root, path = wbb_svc.inclusion_proof(db.session, "T1", i)
+        assert (size, root, path) == (13, merkle_root(leaves), merkle_proof(leaves, i))
+
+    # only complete nodes are stored: 13 leaves + 6 + 3 + 1
+    assert db.session.query(WbbMerkleNode).filter_by(election_id="T1").count() == 23
+
+
+def test_legacy_board_is_backfilled_and_falls_back_until_then(app):
+    leaves = [f"{p:064x}" for p in range(5)]
+    db.session.add_all([_entry("L1", p) for p in range(5)])
+    db.session.commit()
+    assert wbb_svc.board_root(db.session, "L1") == (5, merkle_root(leaves))   # in-memory rebuild
+
+    _cast("L1", leaves)                                 # first new ballot backfills the nodes
+    assert db.session.query(WbbMerkleNode).filter_by(election_id="L1", level=0).count() == 6
+    assert wbb_svc.board_root(db.session, "L1") == (6, merkle_root(leaves))
+    assert wbb_svc.inclusion_proof(db.session, "L1", 4)[2] == merkle_proof(leaves, 4)
+
+
+def test_gap_is_sealed_after_grace_and_fences_the_late_ballot(app, monkeypatch, tmp_path):
+    leaves = []
+    for _ in range(3):
+        _cast("GP", leaves)
+    assert wbb_svc.allocate_positions(db.session, "GP") == 3     # this ballot never commits
+    db.session.commit()                                        # (PostgreSQL keeps the bump)
+    leaves.append(GAP_LEAF_HEX)
+    for _ in range(2):
+        _cast("GP", leaves)
+    assert wbb_svc.board_root(db.session, "GP") == (3, merkle_root(leaves[:3]))   # waits at the gap
+    assert [i["index"] for i in app.test_client().get("/wbb/GP").get_json()["items"]] == [0, 1, 2]
+
+    monkeypatch.setattr(wbb_svc, "GAP_GRACE_SECONDS", 0)
+    assert wbb_svc.integrate_board(db.session, "GP") == 6
+    db.session.commit()
+    assert wbb_svc.board_root(db.session, "GP") == (6, merkle_root(leaves))
+    assert wbb_svc.inclusion_proof(db.session, "GP", 5)[2] == merkle_proof(leaves, 5)
+
+    # the ballot that held position 3 can no longer land there
+    with pytest.raises(IntegrityError):
+        wbb_svc.append_leaves(db.session, "GP", 3, ["ab" * 32])
+    db.session.rollback()
+
+    wbb_svc.publish_tree_head(db.session, "GP", force=True)
+    db.session.commit()
+    path = tmp_path / "gp.cvwbb"
+    path.write_bytes(app.test_client().get("/wbb/GP/snapshot").data)
+    out = verify_snapshot(str(path), check_leaves=False)
+    assert out["count"] == 6 and out["root_ok"] and out["gaps"] == 1
+
+
+def test_upkeep_pass_seals_a_gap_without_waiting_for_another_ballot(app, monkeypatch):
+    leaves = []
+    for _ in range(2):
+        _cast("UK", leaves)
+    assert wbb_svc.allocate_positions(db.session, "UK") == 2     # never commits
+    db.session.commit()
+    leaves.append(GAP_LEAF_HEX)
+    for _ in range(2):
+        _cast("UK", leaves)
+    assert wbb_svc.board_size(db.session, "UK") == 2 and wbb_svc.lagging_boards(db.session) == ["UK"]
+
+    monkeypatch.setattr(wbb_svc, "GAP_GRACE_SECONDS", 0)
+    assert upkeep.run_upkeep(db.session) == 1            # nothing cast since: the periodic pass seals it
+    assert wbb_svc.board_root(db.session, "UK") == (5, merkle_root(leaves))
+
+    monkeypatch.setattr(wbb_svc, "STH_INTERVAL_SECONDS", 0)
+    upkeep.run_upkeep(db.session)                        # and signs the head once it is due
+    assert wbb_svc.get_tree_head(db.session, "UK").tree_size == 5
+    assert wbb_svc.lagging_boards(db.session) == []
+
+
+def test_proof_endpoint_reads_only_the_path(app):
+    leaves = []
+    for _ in range(40):
+        _cast("P1", leaves)
+    client = app.test_client()
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: statements.append(stmt))
+    r = client.get("/wbb/P1/proof", query_string={"tracker": f"{21:08x}"})
+    e = r.get_json()["entry"]
+    assert e["index"] == 21
+    assert e["merkle_path"] == merkle_proof(leaves, 21)
+    assert e["root"] == merkle_root(leaves)
+    # entry lookup + tree size + one node fetch; no full-board scan (tree-head lookup aside)
+    path_statements = [s for s in statements if "wbb_tree_heads" not in s and "SAVEPOINT" not in s]
+    assert len(path_statements) == 3
+    assert not any("leaf_hash" in s and "wbb_merkle_nodes" not in s and "LIMIT" not in s
+                   for s in statements)
+
+    r = client.get("/wbb/P1/proof", query_string={"token_hash": "ff" * 32})
+    assert r.get_json() == {"found": False, "count": 40, "root": merkle_root(leaves)}
+    assert client.get("/wbb/EMPTY/proof?tracker=00").get_json() == {"found": False, "count": 0}
+
+
+def test_proof_of_an_entry_the_tree_has_not_reached_is_pending(app):
+    leaves = []
+    for _ in range(2):
+        _cast("PD", leaves)
+    assert wbb_svc.allocate_positions(db.session, "PD") == 2     # never commits: the tree waits here
+    db.session.commit()
+    _cast("PD", leaves)                                         # committed at position 3
+
+    r = app.test_client().get("/wbb/PD/proof", query_string={"tracker": f"{3:08x}"})
+    assert r.status_code == 200
+    e = r.get_json()["entry"]
+    assert e["index"] == 3 and e["pending"] is True
+    assert e["merkle_path"] == [] and e["root"] == merkle_root(leaves[:2])
+
+
+def test_signed_tree_heads_and_consistency(app, monkeypatch):
+    leaves = []
+    client = app.test_client()
+    assert client.get("/wbb/S1/sth").status_code == 404
+    monkeypatch.setattr(wbb_svc, "STH_INTERVAL_SECONDS", 0)     # a head per ballot
+    for _ in range(6):
+        _cast("S1", leaves)
+    pub = kr.sth_signing_material().public
+
+    old = client.get("/wbb/S1/sth").get_json()
+    assert (old["tree_size"], old["root"]) == (6, merkle_root(leaves))
+    assert thu.verify_tree_head(pub, old)
+    assert not thu.verify_tree_head(pub, dict(old, tree_size=7))
+    assert client.get("/wbb/sth-key").get_json()["key_id"] == old["key_id"]
+
+    proof = client.get("/wbb/S1/proof", query_string={"tracker": f"{2:08x}"}).get_json()["entry"]
+    assert proof["root_sig"] == old["signature"] and proof["sth"] == old
+
+    monkeypatch.setattr(wbb_svc, "STH_INTERVAL_SECONDS", 3600)
+    for _ in range(10):
+        _cast("S1", leaves)
+    assert client.get("/wbb/S1/sth").get_json() == old           # still inside the interval
+    assert db.session.query(WbbTreeHead).count() == 6            # reads never sign
+    monkeypatch.setattr(wbb_svc, "STH_INTERVAL_SECONDS", 0)
+    _cast("S1", leaves)                                          # the next write does
+    new = client.get("/wbb/S1/sth").get_json()
+    assert new["tree_size"] == 17 and thu.verify_tree_head(pub, new)
+    assert client.get("/wbb/S1/sth?tree_size=6").get_json() == old
+
+    r = client.get("/wbb/S1/consistency", query_string={"first": 6, "second": 17}).get_json()
+    assert verify_consistency(6, old["root"], 17, new["root"], r["proof"])
+    assert not verify_consistency(6, merkle_root(leaves[:5] + ["00" * 32]), 17, new["root"], r["proof"])
+    assert client.get("/wbb/S1/consistency?first=6&second=99").status_code == 404
+
+
+def test_list_pages_by_position_and_revalidates_with_etag(app):
+    leaves = []
+    for _ in range(7):
+        _cast("G1", leaves)
+    client = app.test_client()
+
+    r = client.get("/wbb/G1?limit=3")
+    body, etag = r.get_json(), r.headers["ETag"]
+    assert [i["index"] for i in body["items"]] == [0, 1, 2]
+    assert (body["count"], body["root"], body["next_after"]) == (7, merkle_root(leaves), 2)
+    pages = [body]
+    while pages[-1]["next_after"] is not None:
+        pages.append(client.get(f"/wbb/G1?limit=3&after={pages[-1]['next_after']}").get_json())
+    assert [i["index"] for p in pages for i in p["items"]] == list(range(7))
+
+    full = client.get("/wbb/G1").get_json()                       # unpaginated, as before
+    assert [i["index"] for i in full["items"]] == list(range(7)) and full["next_after"] is None
+
+    tracker = client.get("/wbb/G1", query_string={"tracker": f"{4:08x}"}).get_json()
+    assert [i["index"] for i in tracker["items"]] == [4] and tracker["root"] == body["root"]
+
+    assert client.get("/wbb/G1?limit=3", headers={"If-None-Match": etag}).status_code == 304
+    _cast("G1", leaves)
+    r = client.get("/wbb/G1?limit=3", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+
+
+def _next_event(stream):
+    for _ in range(200):          # heartbeats every 0.05s: give up after ~10s
+        chunk = next(stream)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("event:") or chunk.startswith("id:"):
+            return chunk
+    raise AssertionError("no event received")
+
+
+def test_event_stream_replays_then_pushes_live_entries(app, monkeypatch):
+    monkeypatch.setattr(wbb_routes, "SSE_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(feed, "FEED_POLL_SECONDS", 30)   # only notify_board() wakes the feed
+    leaves = []
+    for _ in range(3):
+        _cast("F1", leaves)
+
+    resp = app.test_client().get("/wbb/F1/events", headers={"Last-Event-ID": "0"}, buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    stream = iter(resp.response)
+    assert _next_event(stream).startswith("id: 1\nevent: entry\n")
+    assert _next_event(stream).startswith("id: 2\nevent: entry\n")
+
+    _cast("F1", leaves)
+    feed.notify_board("F1")
+    assert _next_event(stream).startswith("id: 3\nevent: entry\n")
+    root_event = _next_event(stream)
+    assert root_event.startswith("event: root\n") and merkle_root(leaves) in root_event
+
+    shared = feed._feeds["F1"]
+    resp.response.close()
+    shared.thread.join(timeout=2)
+    assert "F1" not in feed._feeds and not shared.thread.is_alive()
+
+
+def test_event_stream_turns_watchers_away_past_the_cap(app, monkeypatch):
+    monkeypatch.setattr(feed, "FEED_POLL_SECONDS", 30)
+    monkeypatch.setattr(feed, "MAX_SUBSCRIBERS", 2)
+    watchers = [feed.subscribe(app, "F2") for _ in range(2)]
+    other = feed.subscribe(app, "F3")                     # the cap is per election
+
+    full = app.test_client().get("/wbb/F2/events")
+    assert full.status_code == 503
+    assert full.get_json()["error"] == "too_many_watchers"
+    assert full.headers["Retry-After"] == str(wbb_routes.SSE_RETRY_AFTER_SECONDS)
+
+    watchers.pop().close()
+    resp = app.test_client().get("/wbb/F2/events", buffered=False)
+    assert resp.status_code == 200
+    assert next(iter(resp.response)).startswith(b"retry:")
+    resp.response.close()
+    assert len(feed._feeds["F2"].subscribers) == 1
+
+    for sub in watchers + [other]:
+        shared = sub.feed
+        sub.close()
+        shared.thread.join(timeout=2)
+    assert "F2" not in feed._feeds and "F3" not in feed._feeds
+
+
+def test_multiproof_covers_a_sample_with_shared_nodes(app, monkeypatch):
+    monkeypatch.setattr(wbb_svc, "STH_INTERVAL_SECONDS", 0)
+    leaves = []
+    for _ in range(50):
+        _cast("M1", leaves)
+    sample = [3, 4, 17, 30, 49]
+    r = app.test_client().post("/wbb/M1/multiproof", json={
+        "trackers": [f"{i:08x}" for i in sample] + ["deadbeef"],
+    }).get_json()
+
+    assert (r["count"], r["root"]) == (50, merkle_root(leaves))
+    assert [l["index"] for l in r["leaves"]] == sample and r["missing"] == ["deadbeef"]
+    assert r["root_sig"] == r["sth"]["signature"]
+    claimed = {l["index"]: l["leaf_hash"] for l in r["leaves"]}
+    assert verify_multiproof(50, r["root"], claimed, r["proof"])
+    assert len(r["proof"]) < sum(len(merkle_proof(leaves, i)) for i in sample)
+
+    claimed[17] = "00" * 32
+    assert not verify_multiproof(50, r["root"], claimed, r["proof"])
+
+
+def test_snapshot_export_streams_and_verifies_from_mmap(app, monkeypatch, tmp_path):
+    monkeypatch.setattr(wbb_svc, "SNAPSHOT_BATCH", 4)      # several keyset pages
+    assert app.test_client().get("/wbb/X1/snapshot").status_code == 404   # nothing signed yet
+    leaves = []
+    for pos in range(14):
+        token_hash = hashlib.sha256(f"tok{pos}".encode()).hexdigest()
+        tracker = f"{pos:016x}"
+        leaf = hashlib.sha256(f"X1|{token_hash}|{tracker}".encode()).hexdigest()
+        assert wbb_svc.allocate_positions(db.session, "X1") == pos
+        wbb_svc.append_leaves(db.session, "X1", pos, [leaf])
+        db.session.add(WbbEntry(election_id="X1", tracker=tracker, token_hash=token_hash,
+                                position=pos, leaf_hash=leaf,
+                                commitment_hash=None if pos % 2 else "ab" * 32))
+        db.session.commit()
+        wbb_svc.update_board(db.session, "X1")
+        db.session.commit()
+        leaves.append(leaf)
+        if pos == 10:
+            # the interval (default WBB_STH_INTERVAL) elapses here; the last 3 stay unsigned
+            wbb_svc.publish_tree_head(db.session, "X1", force=True)
+            db.session.commit()
+    leaves = leaves[:11]
+
+    r = app.test_client().get("/wbb/X1/snapshot")
+    assert r.status_code == 200 and r.mimetype == "application/octet-stream"
+    assert int(r.headers["Content-Length"]) == len(r.data) == 1024 + 11 * 168
+    path = tmp_path / "x1.cvwbb"
+    path.write_bytes(r.data)
+
+    out = verify_snapshot(str(path))
+    assert out["count"] == 11 and out["root"] == merkle_root(leaves)
+    assert out["root_ok"] and out["bad_leaves"] == 0
+    assert thu.verify_tree_head(kr.sth_signing_material().public, out["sth"])
+
+    # flip one byte of a tracker: the leaf no longer matches its fields
+    data = bytearray(r.data)
+    data[1024 + 5 * 168 + 8] ^= 0x01
+    path.write_bytes(bytes(data))
+    assert verify_snapshot(str(path))["bad_leaves"] == 1
+
+    # a stored leaf that was swapped breaks the root
+    data = bytearray(r.data)
+    data[1024 + 3 * 168 + 8 + 64 + 32] ^= 0x01
+    path.write_bytes(bytes(data))
+    assert not verify_snapshot(str(path), check_leaves=False)["root_ok"]
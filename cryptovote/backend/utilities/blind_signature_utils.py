@@ -28,6 +28,11 @@ def load_public_key():
     with open(PUBLIC_KEY_PATH, 'rb') as f:
         return RSA.import_key(f.read())
 
+def load_key(path):
+    """Any RSA PEM (private or public-only), e.g. a per-election keyring file."""
+    with open(path, 'rb') as f:
+        return RSA.import_key(f.read())
+
 # === 3. Blind the token ===
 def blind_token(pubkey, message: bytes):
     digest = SHA256.new(message).digest()
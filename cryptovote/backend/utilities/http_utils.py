@@ -5,3 +5,8 @@ def too_many(msg="Too many requests", retry_secs=10):
     resp = make_response(jsonify({"error": msg, "retry_after": retry_secs}), 429)
     resp.headers["Retry-After"] = str(retry_secs)
     return resp
+
+def unavailable(msg="Service busy", retry_secs=1):
+    resp = make_response(jsonify({"error": msg, "retry_after": retry_secs}), 503)
+    resp.headers["Retry-After"] = str(retry_secs)
+    return resp
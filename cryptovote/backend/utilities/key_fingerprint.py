@@ -1,6 +1,15 @@
 # utilities/key_fingerprint.py
 import hashlib
+from functools import lru_cache
 
+# Memoised: str(n) of a 2048-bit modulus is the expensive part, and the same
+# handful of keys is fingerprinted on every ballot / key request.
+@lru_cache(maxsize=16)
 def fingerprint_paillier_n(n: int) -> str:
     h = hashlib.sha256(("|".join(["paillier", str(n)])).encode("utf-8")).hexdigest()
     return f"paillier-{h[:12]}"
+
+@lru_cache(maxsize=16)
+def fingerprint_rsa(n: int, e: int) -> str:
+    h = hashlib.sha256(("|".join(["rsa", str(n), str(e)])).encode("utf-8")).hexdigest()
+    return f"rsa-{h[:12]}"
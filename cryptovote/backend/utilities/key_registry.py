@@ -0,0 +1,324 @@
+# utilities/key_registry.py
+"""
+Process-wide registry of the keys used on the request path.
+
+Each key file is parsed once; n, n², e, hex forms and key ids are derived once
+and kept alongside the key object. A key is re-read when its file's mtime
+changes (checked at most every KEY_RECHECK_SECONDS), so rotating a key on disk
+takes effect without a restart.
+
+RSA blind-signing keys are per election: Election.rsa_key_id names a PEM file
+in RSA_KEYRING_DIR, loaded on first use and kept in a bounded LRU. The
+placeholder DEFAULT_RSA_KEY_ID (and a missing id) means the deployment key,
+keys/rsa_private.pem + rsa_public.pem. Elections created before the keyring
+may name an id that has no file; those fall back to the deployment key with a
+logged warning unless RSA_LEGACY_KEY_FALLBACK=0 (new elections are only
+created with an id that has_rsa_key() accepts).
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from utilities import blind_signature_utils as rsa_utils
+from utilities import paillier_utils
+from utilities import tree_head_utils
+from utilities.key_fingerprint import fingerprint_paillier_n, fingerprint_rsa
+
+KEY_RECHECK_SECONDS = float(os.getenv("KEY_RECHECK_SECONDS", "1.0"))
+
+DEFAULT_RSA_KEY_ID = "default_rsa_key"
+RSA_KEYRING_DIR = os.getenv("RSA_KEYRING_DIR", os.path.join(rsa_utils.KEY_DIR, "rsa"))
+RSA_KEYRING_SIZE = int(os.getenv("RSA_KEYRING_SIZE", "64"))
+_RSA_KEY_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+RSA_LEGACY_KEY_FALLBACK = os.getenv("RSA_LEGACY_KEY_FALLBACK", "1") == "1"
+
+
+class UnknownRsaKey(KeyError):
+    """No usable keyring file for this rsa_key_id."""
+
+
+class RsaPublicMaterial(NamedTuple):
+    key: object
+    n: int
+    e: int
+    n_hex: str
+    bits: int
+    key_id: str
+
+
+class RsaSigningMaterial(NamedTuple):
+    """Blind-signing key with its CRT exponents precomputed."""
+    key: object                   # private RSA key (PyCryptodome)
+    n: int
+    e: int
+    p: int
+    q: int
+    dP: int                       # d mod (p-1)
+    dQ: int                       # d mod (q-1)
+    qInv: int                     # q^-1 mod p
+    key_id: str
+
+
+class SthSigningMaterial(NamedTuple):
+    key: object                   # private RSA key (PyCryptodome)
+    public: object
+    key_id: str
+
+
+class PaillierPublicMaterial(NamedTuple):
+    key: object
+    n: int
+    nsquare: int
+    n_hex: str
+    bits: int
+    key_id: str
+
+
+class PaillierPrivateMaterial(NamedTuple):
+    """Tally key; phe precomputes the CRT values (p², q², hp, hq, p⁻¹ mod q) when it is built."""
+    key: object                   # phe PaillierPrivateKey
+    public: object                # its PaillierPublicKey
+    key_id: str
+
+
+def rsa_material(key) -> RsaPublicMaterial:
+    n, e = int(key.n), int(key.e)
+    return RsaPublicMaterial(key, n, e, format(n, "x"), n.bit_length(), fingerprint_rsa(n, e))
+
+
+def paillier_material(key) -> PaillierPublicMaterial:
+    n = int(key.n)
+    nsquare = int(getattr(key, "nsquare", 0)) or n * n
+    return PaillierPublicMaterial(key, n, nsquare, format(n, "x"), n.bit_length(), fingerprint_paillier_n(n))
+
+
+def paillier_private_material_from(key) -> PaillierPrivateMaterial:
+    return PaillierPrivateMaterial(key, key.public_key, fingerprint_paillier_n(int(key.public_key.n)))
+
+
+def rsa_signing_material_from(key) -> RsaSigningMaterial:
+    n, e, d, p, q = (int(x) for x in (key.n, key.e, key.d, key.p, key.q))
+    return RsaSigningMaterial(
+        key, n, e, p, q, d % (p - 1), d % (q - 1), pow(q, -1, p), fingerprint_rsa(n, e),
+    )
+
+
+def sth_material(key) -> SthSigningMaterial:
+    public = key.publickey()
+    return SthSigningMaterial(key, public, fingerprint_rsa(int(public.n), int(public.e)))
+
+
+class _FileBackedKey:
+    """One key file -> cached material, reloaded when the file's mtime moves."""
+
+    def __init__(self, path_fn, loader, build):
+        self._path_fn = path_fn
+        self._loader = loader
+        self._build = build
+        self._lock = threading.Lock()
+        self._material = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        material = self._material
+        if material is not None and now - self._checked_at < KEY_RECHECK_SECONDS:
+            return material
+
+        with self._lock:
+            mtime = os.stat(self._path_fn()).st_mtime_ns
+            if self._material is None or mtime != self._mtime:
+                self._material = self._build(self._loader())
+                self._mtime = mtime
+            self._checked_at = now
+            return self._material
+
+    def invalidate(self):
+        with self._lock:
+            self._material = None
+            self._mtime = None
+
+
+_rsa_public = _FileBackedKey(
+    lambda: rsa_utils.PUBLIC_KEY_PATH,
+    lambda: rsa_utils.load_public_key(),
+    rsa_material,
+)
+_rsa_private = _FileBackedKey(
+    lambda: rsa_utils.PRIVATE_KEY_PATH,
+    lambda: rsa_utils.load_private_key(),
+    rsa_signing_material_from,
+)
+_paillier_public = _FileBackedKey(
+    lambda: os.path.join(paillier_utils.KEYS_DIR, "paillier_public_key.json"),
+    lambda: paillier_utils.load_public_key(),
+    paillier_material,
+)
+_paillier_private = _FileBackedKey(
+    lambda: os.path.join(paillier_utils.KEYS_DIR, "paillier_private_key.json"),
+    lambda: paillier_utils.load_private_key(),
+    paillier_private_material_from,
+)
+_sth_signing = _FileBackedKey(
+    lambda: tree_head_utils.ensure_sth_keypair(),
+    lambda: tree_head_utils.load_sth_private_key(),
+    sth_material,
+)
+
+
+class _RingKey(NamedTuple):
+    public: RsaPublicMaterial
+    signing: object               # RsaSigningMaterial, or None for a public-only file
+
+
+def _ring_key(key) -> _RingKey:
+    return _RingKey(
+        rsa_material(key.publickey()),
+        rsa_signing_material_from(key) if key.has_private() else None,
+    )
+
+
+def rsa_key_path(key_id: str) -> str:
+    if not _RSA_KEY_ID_RE.fullmatch(key_id or ""):
+        raise UnknownRsaKey(key_id)
+    return os.path.join(RSA_KEYRING_DIR, f"{key_id}.pem")
+
+
+class _Keyring:
+    """rsa_key_id -> _FileBackedKey, least recently used dropped past `size`."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, _FileBackedKey]" = OrderedDict()
+
+    def get(self, key_id: str) -> _RingKey:
+        with self._lock:
+            entry = self._keys.get(key_id)
+            if entry is not None:
+                self._keys.move_to_end(key_id)
+        if entry is None:
+            path = rsa_key_path(key_id)
+            entry = _FileBackedKey(lambda: path, lambda: rsa_utils.load_key(path), _ring_key)
+        try:
+            material = entry.get()          # parsing holds only this key's lock
+        except FileNotFoundError:
+            self.drop(key_id)
+            raise UnknownRsaKey(key_id) from None
+        with self._lock:
+            if key_id not in self._keys:    # only keys that loaded take an LRU slot
+                self._keys[key_id] = entry
+                while len(self._keys) > self.size:
+                    self._keys.popitem(last=False)
+        return material
+
+    def drop(self, key_id: str):
+        with self._lock:
+            self._keys.pop(key_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+_keyring = _Keyring(RSA_KEYRING_SIZE)
+
+
+def _is_default_rsa(key_id) -> bool:
+    return not key_id or key_id == DEFAULT_RSA_KEY_ID
+
+
+_fallback_warned: set[str] = set()
+
+
+def _ring_key_or_legacy(key_id: str):
+    """Keyring entry for `key_id`; None means a legacy id served by the deployment key."""
+    try:
+        return _keyring.get(key_id)
+    except UnknownRsaKey:
+        if not RSA_LEGACY_KEY_FALLBACK or not _RSA_KEY_ID_RE.fullmatch(key_id):
+            raise
+    if key_id not in _fallback_warned:
+        _fallback_warned.add(key_id)
+        logging.warning(f"No keyring file for rsa_key_id '{key_id}'; using the deployment RSA key (legacy election)")
+    return None
+
+
+def rsa_public_material(key_id: str = None) -> RsaPublicMaterial:
+    if _is_default_rsa(key_id):
+        return _rsa_public.get()
+    ring = _ring_key_or_legacy(key_id)
+    return _rsa_public.get() if ring is None else ring.public
+
+
+def rsa_signing_material(key_id: str = None) -> RsaSigningMaterial:
+    """The blind-signing private key for `key_id` (see services/signing_service)."""
+    if _is_default_rsa(key_id):
+        return _rsa_private.get()
+    ring = _ring_key_or_legacy(key_id)
+    if ring is None:
+        return _rsa_private.get()
+    signing = ring.signing
+    if signing is None:
+        raise UnknownRsaKey(f"{key_id}: public key only")
+    return signing
+
+
+def has_rsa_key(key_id: str) -> bool:
+    """Whether an election may be created with this rsa_key_id."""
+    if _is_default_rsa(key_id):
+        return True
+    try:
+        return os.path.exists(rsa_key_path(key_id))
+    except UnknownRsaKey:
+        return False
+
+
+def paillier_public_material() -> PaillierPublicMaterial:
+    return _paillier_public.get()
+
+
+def paillier_private_material() -> PaillierPrivateMaterial:
+    """The tally's Paillier private key (see services/tallying_service)."""
+    return _paillier_private.get()
+
+
+def sth_signing_material() -> SthSigningMaterial:
+    """Key that signs bulletin-board tree heads (created on first use)."""
+    return _sth_signing.get()
+
+
+def load_rsa_public_key(key_id: str = None):
+    """Drop-in for blind_signature_utils.load_public_key(), for an election's rsa_key_id."""
+    return rsa_public_material(key_id).key
+
+
+def load_paillier_public_key():
+    """Drop-in for paillier_utils.load_public_key(), served from the registry."""
+    return _paillier_public.get().key
+
+
+def invalidate_keys():
+    _rsa_public.invalidate()
+    _rsa_private.invalidate()
+    _paillier_public.invalidate()
+    _paillier_private.invalidate()
+    _sth_signing.invalidate()
+    _keyring.clear()
+
+
+def describe_rsa(n: int, e: int) -> dict:
+    """JSON shape served by /public-keys for an RSA key."""
+    n, e = int(n), int(e)
+    return {"key_id": fingerprint_rsa(n, e), "nHex": format(n, "x"), "eDec": str(e), "bits": n.bit_length()}
+
+
+def describe_paillier(n: int) -> dict:
+    """JSON shape served by /public-keys for a Paillier key."""
+    n = int(n)
+    return {"key_id": fingerprint_paillier_n(n), "nHex": format(n, "x"), "bits": n.bit_length()}
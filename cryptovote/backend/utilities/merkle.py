@@ -1,5 +1,7 @@
 # utilities/merkle.py
 import hashlib
+import mmap
+import struct
 
 def h(b: bytes) -> bytes:
     return hashlib.sha256(b).digest()
@@ -10,40 +12,441 @@ def hex_to_bytes(x: str) -> bytes:
 def bytes_to_hex(b: bytes) -> str:
     return b.hex()
 
-def merkle_root(leaves_hex: list[str]) -> str:
+# Each level is one contiguous buffer of 32-byte nodes; a pass hashes 64-byte
+# memoryview windows of it straight into the next level's preallocated
+# bytearray, so there is no per-node hex decoding, pair concatenation or list of
+# digests to join. An odd level hashes its last node with itself.
+
+def _leaf_buffer(leaves_hex: list[str]):
+    buf = bytes.fromhex("".join(leaves_hex))
+    return buf if len(buf) == 32 * len(leaves_hex) else None
+
+def _next_level(buf) -> bytearray:
+    n = len(buf) // 32
+    pairs = n >> 1
+    out = bytearray(32 * ((n + 1) // 2))
+    src, dst = memoryview(buf), memoryview(out)
+    sha = hashlib.sha256
+    for o, i in zip(range(0, pairs << 5, 32), range(0, pairs << 6, 64)):
+        dst[o:o + 32] = sha(src[i:i + 64]).digest()
+    if n & 1:
+        last = sha(src[-32:])
+        last.update(src[-32:])
+        dst[-32:] = last.digest()
+    return out
+
+def merkle_root_and_proof(leaves_hex: list[str], index: int = -1) -> tuple[str, list[str]]:
+    """
+    Root and (if 0 <= index < len) the inclusion path of `index`, in one pass
+    over the levels. Same results as merkle_root() / merkle_proof().
+    """
     if not leaves_hex:
-        return "0" * 64
-    level = [hex_to_bytes(x) for x in leaves_hex]
-    while len(level) > 1:
-        nxt = []
-        for i in range(0, len(level), 2):
-            a = level[i]
-            b = level[i+1] if i+1 < len(level) else level[i]
-            nxt.append(h(a + b))
-        level = nxt
-    return bytes_to_hex(level[0])
+        return "0" * 64, []
+    buf = _leaf_buffer(leaves_hex)
+    if buf is None:                      # not all 32-byte leaves: generic path
+        return _merkle_root_lists(leaves_hex), _merkle_proof_lists(leaves_hex, index)
+    want = 0 <= index < len(leaves_hex)
+    idx, proof = index, []
+    while len(buf) > 32:
+        if want:
+            sib = idx ^ 1
+            if sib * 32 >= len(buf):
+                sib = idx                # last duplicated
+            proof.append(buf[sib * 32:sib * 32 + 32].hex())
+            idx //= 2
+        buf = _next_level(buf)
+    return buf.hex(), proof
+
+def complete_nodes(leaves_hex: list[str]):
+    """Yield (level, index, bytes) for every complete node, level by level (bulk backfill)."""
+    size = len(leaves_hex)
+    buf = _leaf_buffer(leaves_hex) if leaves_hex else None
+    if buf is None:
+        nodes = {}
+        for pos, leaf in enumerate(leaves_hex):
+            yield from append_leaf(pos, hex_to_bytes(leaf), nodes)
+        return
+    level = 0
+    while True:
+        for j in range(size >> level):
+            yield level, j, bytes(buf[j * 32:j * 32 + 32])
+        if len(buf) <= 32:
+            return
+        buf = _next_level(buf)
+        level += 1
+
+def merkle_root(leaves_hex: list[str]) -> str:
+    return merkle_root_and_proof(leaves_hex)[0]
 
 def merkle_proof(leaves_hex: list[str], index: int) -> list[str]:
     """Return list of hex sibling hashes from bottom to top."""
     if not leaves_hex or index < 0 or index >= len(leaves_hex):
         return []
+    return merkle_root_and_proof(leaves_hex, index)[1]
+
+def _merkle_root_lists(leaves_hex: list[str]) -> str:
     level = [hex_to_bytes(x) for x in leaves_hex]
-    idx = index
-    proof = []
     while len(level) > 1:
-        nxt = []
-        for i in range(0, len(level), 2):
-            a = level[i]
-            b = level[i+1] if i+1 < len(level) else level[i]
-            if i == idx ^ 1 or (i+1 == idx and i == idx - 1):
-                # no-op; easier to compute sibling based on idx math below
-                pass
-            nxt.append(h(a + b))
-        # sibling:
+        level = [h(level[i] + (level[i+1] if i+1 < len(level) else level[i]))
+                 for i in range(0, len(level), 2)]
+    return bytes_to_hex(level[0])
+
+def _merkle_proof_lists(leaves_hex: list[str], index: int) -> list[str]:
+    if index < 0 or index >= len(leaves_hex):
+        return []
+    level = [hex_to_bytes(x) for x in leaves_hex]
+    idx, proof = index, []
+    while len(level) > 1:
         sibling_idx = idx ^ 1
         if sibling_idx >= len(level):
             sibling_idx = idx  # last duplicated
         proof.append(bytes_to_hex(level[sibling_idx]))
+        level = [h(level[i] + (level[i+1] if i+1 < len(level) else level[i]))
+                 for i in range(0, len(level), 2)]
         idx //= 2
-        level = nxt
     return proof
+
+
+# --- Stored (append-only) tree ---------------------------------------------
+# A board of `size` leaves is addressed by (level, index) nodes, level 0 being
+# the leaves. A node is "complete" once all 2**level leaves under it exist: its
+# hash can no longer change, so only complete nodes are persisted. Nodes on the
+# right edge are recomputed from complete ones, duplicating a missing right
+# child exactly like merkle_root() does.
+#
+# Gaps: a board position whose ballot never committed is a leaf like any other,
+# with the all-zero hash GAP_LEAF (no SHA-256 preimage is known for it). The
+# tree is only ever built over a prefix with no missing positions, so every
+# stored parent covers real leaves or sealed gaps.
+
+GAP_LEAF = bytes(32)
+GAP_LEAF_HEX = GAP_LEAF.hex()
+
+class MissingNode(KeyError):
+    """A complete node needed for the computation is not in `nodes`."""
+
+
+def level_width(size: int, level: int) -> int:
+    return (size + (1 << level) - 1) >> level
+
+def tree_height(size: int) -> int:
+    """Number of levels above the leaves (0 for a single leaf)."""
+    return (size - 1).bit_length() if size > 1 else 0
+
+def is_complete(level: int, index: int, size: int) -> bool:
+    return (index + 1) << level <= size
+
+def _collect(level: int, index: int, size: int, out: set):
+    if is_complete(level, index, size):
+        out.add((level, index))
+        return
+    _collect(level - 1, 2 * index, size, out)
+    if 2 * index + 1 < level_width(size, level - 1):
+        _collect(level - 1, 2 * index + 1, size, out)
+
+def node_hash(level: int, index: int, size: int, nodes: dict) -> bytes:
+    """Hash of node (level, index) in a tree of `size` leaves; `nodes` maps complete (level, index) -> bytes."""
+    if is_complete(level, index, size):
+        try:
+            return nodes[(level, index)]
+        except KeyError:
+            raise MissingNode((level, index)) from None
+    left = node_hash(level - 1, 2 * index, size, nodes)
+    if 2 * index + 1 < level_width(size, level - 1):
+        return h(left + node_hash(level - 1, 2 * index + 1, size, nodes))
+    return h(left + left)
+
+def _sibling(level: int, index: int, size: int) -> int:
+    j = index >> level
+    s = j ^ 1
+    return s if s < level_width(size, level) else j
+
+def root_keys(size: int) -> set:
+    """Complete nodes needed to compute the root of a `size`-leaf tree (O(log n))."""
+    out = set()
+    if size:
+        _collect(tree_height(size), 0, size, out)
+    return out
+
+def root_from_nodes(size: int, nodes: dict) -> str:
+    if not size:
+        return "0" * 64
+    return bytes_to_hex(node_hash(tree_height(size), 0, size, nodes))
+
+def proof_keys(size: int, index: int) -> set:
+    """Complete nodes needed for the inclusion path of leaf `index` (O(log n))."""
+    out = set()
+    for level in range(tree_height(size)):
+        _collect(level, _sibling(level, index, size), size, out)
+    return out
+
+def proof_from_nodes(size: int, index: int, nodes: dict) -> list[str]:
+    """Same output as merkle_proof(leaves, index), computed from stored nodes."""
+    if index < 0 or index >= size:
+        return []
+    return [
+        bytes_to_hex(node_hash(level, _sibling(level, index, size), size, nodes))
+        for level in range(tree_height(size))
+    ]
+
+def append_keys(position: int) -> set:
+    """Left siblings needed to complete the parents of a leaf appended at `position`."""
+    out, level, idx = set(), 0, position
+    while idx & 1:
+        out.add((level, idx - 1))
+        level, idx = level + 1, idx >> 1
+    return out
+
+def append_leaf(position: int, leaf: bytes, nodes: dict) -> list[tuple[int, int, bytes]]:
+    """
+    Complete nodes created by appending `leaf` at `position`: the leaf itself
+    plus each parent it completes. `nodes` must hold append_keys(position) and
+    is updated in place, so consecutive leaves can be appended in one pass.
+    Raises MissingNode when a left sibling is absent: leaves must be appended
+    in position order, gaps included (as GAP_LEAF).
+    """
+    created = [(0, position, leaf)]
+    nodes[(0, position)] = leaf
+    level, idx, cur = 0, position, leaf
+    while idx & 1:
+        left = nodes.get((level, idx - 1))
+        if left is None:
+            raise MissingNode((level, idx - 1))
+        cur = h(left + cur)
+        level, idx = level + 1, idx >> 1
+        nodes[(level, idx)] = cur
+        created.append((level, idx, cur))
+    return created
+
+
+# --- Consistency between two tree sizes -------------------------------------
+# Same idea as RFC 6962 §2.1.2, adapted to the duplicate-last-node tree above.
+# The proof for old size m -> new size n is the peaks of the m-leaf tree (the
+# complete nodes root(m) is computed from) plus the complete nodes lying wholly
+# in [m, n) needed for root(n). The verifier recomputes root(m) from the peaks
+# alone, then root(n) using those same peaks for everything before m, so the
+# new tree provably extends the old one.
+
+def _old(level: int, index: int, m: int) -> bool:
+    return (index + 1) << level <= m
+
+def _collect_extension(level: int, index: int, m: int, n: int, peaks: set, out: set):
+    if _old(level, index, m):
+        if (level, index) in peaks:
+            out.add((level, index))
+            return
+        if level == 0:
+            raise MissingNode((level, index))
+    elif (index << level) >= m and is_complete(level, index, n):
+        out.add((level, index))
+        return
+    _collect_extension(level - 1, 2 * index, m, n, peaks, out)
+    if 2 * index + 1 < level_width(n, level - 1):
+        _collect_extension(level - 1, 2 * index + 1, m, n, peaks, out)
+
+def _extension_hash(level: int, index: int, m: int, n: int, peaks: set, nodes: dict) -> bytes:
+    if _old(level, index, m):
+        if (level, index) in peaks:
+            return nodes[(level, index)]
+        if level == 0:
+            raise MissingNode((level, index))
+    elif (index << level) >= m and is_complete(level, index, n):
+        try:
+            return nodes[(level, index)]
+        except KeyError:
+            raise MissingNode((level, index)) from None
+    left = _extension_hash(level - 1, 2 * index, m, n, peaks, nodes)
+    if 2 * index + 1 < level_width(n, level - 1):
+        return h(left + _extension_hash(level - 1, 2 * index + 1, m, n, peaks, nodes))
+    return h(left + left)
+
+def consistency_keys(m: int, n: int) -> set:
+    """Stored nodes making up the consistency proof from size m to size n (1 <= m <= n)."""
+    if not 1 <= m <= n:
+        raise ValueError("need 1 <= first <= second")
+    peaks = root_keys(m)
+    out = set(peaks)
+    _collect_extension(tree_height(n), 0, m, n, peaks, out)
+    return out
+
+def verify_consistency(m: int, root_m: str, n: int, root_n: str, proof: list[dict]) -> bool:
+    """
+    Check a consistency proof ([{level, index, hash}, ...]) between two signed
+    tree heads: root_m must follow from the old peaks, and root_n from the same
+    peaks plus the new nodes.
+    """
+    if not 1 <= m <= n:
+        return False
+    try:
+        nodes = {(int(p["level"]), int(p["index"])): hex_to_bytes(p["hash"]) for p in proof}
+        peaks = root_keys(m)
+        if root_from_nodes(m, {k: nodes[k] for k in peaks}) != root_m:
+            return False
+        got = _extension_hash(tree_height(n), 0, m, n, peaks, nodes)
+    except (KeyError, ValueError, TypeError):
+        return False
+    return bytes_to_hex(got) == root_n
+
+
+# --- Multiproofs -------------------------------------------------------------
+# One proof for many leaves: walk the levels once, and only ship a sibling when
+# it can't be computed from the leaves (or from nodes computed below it).
+
+def multiproof_keys(size: int, indices) -> list[tuple[int, int]]:
+    """(level, index) of every node a multiproof for `indices` must carry, bottom-up."""
+    known = set(indices)
+    out = []
+    for level in range(tree_height(size)):
+        width = level_width(size, level)
+        for j in sorted(known):
+            s = j ^ 1
+            if s < width and s not in known:
+                out.append((level, s))
+        known = {j >> 1 for j in known}
+    return out
+
+def multiproof_stored_keys(size: int, indices) -> set:
+    """Complete (stored) nodes needed to produce multiproof_keys(size, indices)."""
+    out = set()
+    for level, idx in multiproof_keys(size, indices):
+        _collect(level, idx, size, out)
+    return out
+
+def multiproof_from_nodes(size: int, indices, nodes: dict) -> list[dict]:
+    return [
+        {"level": level, "index": idx, "hash": bytes_to_hex(node_hash(level, idx, size, nodes))}
+        for level, idx in multiproof_keys(size, indices)
+    ]
+
+def verify_multiproof(size: int, root: str, leaves: dict, proof: list[dict]) -> bool:
+    """
+    Check that every {index: leaf_hex} in `leaves` is in the `size`-leaf tree
+    with this root, using the nodes of a multiproof ([{level, index, hash}]).
+    """
+    if not leaves or size < 1:
+        return False
+    try:
+        known = {int(i): hex_to_bytes(x) for i, x in leaves.items()}
+        given = {(int(p["level"]), int(p["index"])): hex_to_bytes(p["hash"]) for p in proof}
+        if any(not 0 <= i < size for i in known):
+            return False
+        for level in range(tree_height(size)):
+            width = level_width(size, level)
+            parents = {}
+            for j in sorted(known):
+                if j & 1 and (j ^ 1) in known:
+                    continue                 # already combined with its left sibling
+                s = j ^ 1
+                if s >= width:
+                    left = right = known[j]
+                else:
+                    other = known[s] if s in known else given[(level, s)]
+                    left, right = (known[j], other) if j < s else (other, known[j])
+                parents[j >> 1] = h(left + right)
+            known = parents
+    except (KeyError, ValueError, TypeError):
+        return False
+    return len(known) == 1 and bytes_to_hex(known.get(0, b"")) == root
+
+
+# --- Binary board snapshots --------------------------------------------------
+# Layout (all integers big-endian):
+#   header, SNAPSHOT_HEADER_SIZE bytes:
+#     magic "CVWBBSN1" | header size u16 | record size u16 | count u64 | root 32B |
+#     election_id (u8 length + 128B) | STH timestamp ms u64 | key_id 64B ASCII |
+#     signature (u16 length + 512B) | zero padding
+#   then `count` fixed-width records, SNAPSHOT_RECORD_SIZE bytes each:
+#     position u64 | tracker 64B ASCII (NUL-padded) | token_hash 32B | leaf_hash 32B |
+#     commitment_hash 32B (zeros if none)
+#   a sealed gap (see GAP_LEAF) is a record with an empty tracker and all-zero hashes.
+# The STH fields are zero/empty when the export's root had no signed tree head.
+
+SNAPSHOT_MAGIC = b"CVWBBSN1"
+SNAPSHOT_HEADER_SIZE = 1024
+_SNAPSHOT_HEADER = struct.Struct(">8sHHQ32sB128sQ64sH512s")
+_SNAPSHOT_RECORD = struct.Struct(">Q64s32s32s32s")
+SNAPSHOT_RECORD_SIZE = _SNAPSHOT_RECORD.size          # 168
+
+
+def pack_snapshot_header(election_id: str, count: int, root: str,
+                         timestamp: int = 0, key_id: str = "", signature: str = "") -> bytes:
+    eid = election_id.encode("utf-8")
+    sig = bytes.fromhex(signature) if signature else b""
+    head = _SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_HEADER_SIZE, SNAPSHOT_RECORD_SIZE, count, hex_to_bytes(root),
+        len(eid), eid, timestamp or 0, key_id.encode("ascii"), len(sig), sig,
+    )
+    return head.ljust(SNAPSHOT_HEADER_SIZE, b"\0")
+
+def pack_snapshot_record(position: int, tracker: str, token_hash: str, leaf_hash: str,
+                         commitment_hash: str = None) -> bytes:
+    if len(tracker) > 64:
+        raise ValueError("tracker longer than 64 characters")
+    return _SNAPSHOT_RECORD.pack(
+        position, tracker.encode("ascii"), hex_to_bytes(token_hash), hex_to_bytes(leaf_hash),
+        hex_to_bytes(commitment_hash) if commitment_hash else b"",
+    )
+
+def read_snapshot_header(buf) -> dict:
+    (magic, header_size, record_size, count, root, eid_len, eid,
+     timestamp, key_id, sig_len, sig) = _SNAPSHOT_HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC or header_size != SNAPSHOT_HEADER_SIZE \
+            or record_size != SNAPSHOT_RECORD_SIZE:
+        raise ValueError("not a CryptoVote WBB snapshot")
+    return {
+        "election_id": eid[:eid_len].decode("utf-8"),
+        "count": count,
+        "root": bytes_to_hex(root),
+        # the signed tree head, in the shape tree_head_utils.verify_tree_head() takes
+        "sth": {
+            "election_id": eid[:eid_len].decode("utf-8"),
+            "tree_size": count,
+            "root": bytes_to_hex(root),
+            "timestamp": timestamp,
+            "key_id": key_id.rstrip(b"\0").decode("ascii"),
+            "signature": sig[:sig_len].hex(),
+        } if sig_len else None,
+    }
+
+def iter_snapshot_records(buf):
+    """Yield (position, tracker, token_hash_hex, leaf bytes, commitment bytes) without copying the file."""
+    header = read_snapshot_header(buf)
+    mv = memoryview(buf)
+    end = SNAPSHOT_HEADER_SIZE + header["count"] * SNAPSHOT_RECORD_SIZE
+    if len(mv) < end:
+        raise ValueError("truncated snapshot")
+    for pos, tracker, token_hash, leaf, commitment in _SNAPSHOT_RECORD.iter_unpack(mv[SNAPSHOT_HEADER_SIZE:end]):
+        yield pos, tracker.rstrip(b"\0").decode("ascii"), token_hash.hex(), leaf, commitment
+
+def verify_snapshot(path: str, check_leaves: bool = True) -> dict:
+    """
+    Recompute a snapshot's root by streaming its records through an mmap,
+    keeping only the O(log n) peaks of the tree in memory. With check_leaves,
+    each leaf is also re-derived from election_id|token_hash|tracker.
+    Gap records (empty tracker, GAP_LEAF) are hashed but not re-derived.
+    Returns the header plus {"computed_root", "root_ok", "bad_leaves", "gaps"}.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header = read_snapshot_header(mm)
+        eid = header["election_id"]
+        peaks = {}                      # (level, index) -> bytes; at most one per level
+        stack = []                      # levels of the current peaks, left to right
+        bad = gaps = 0
+        for expect, (pos, tracker, token_hash, leaf, _c) in enumerate(iter_snapshot_records(mm)):
+            if pos != expect:
+                raise ValueError(f"record {expect} has position {pos}")
+            if not tracker and leaf == GAP_LEAF:
+                gaps += 1               # sealed gap: no ballot fields to re-derive
+            elif check_leaves and h(f"{eid}|{token_hash}|{tracker}".encode("utf-8")) != leaf:
+                bad += 1
+            level, idx, cur = 0, pos, bytes(leaf)
+            while stack and stack[-1] == level:
+                left = peaks.pop((level, idx - 1))
+                stack.pop()
+                cur = h(left + cur)
+                level, idx = level + 1, idx >> 1
+            peaks[(level, idx)] = cur
+            stack.append(level)
+        computed = root_from_nodes(header["count"], peaks)
+    return dict(header, computed_root=computed, root_ok=computed == header["root"], bad_leaves=bad,
+                gaps=gaps)
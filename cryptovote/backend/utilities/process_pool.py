@@ -0,0 +1,14 @@
+# utilities/process_pool.py
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for CPU-bound work off the request threads. Workers are
+    spawned, never forked: forking a process with request and feed threads
+    running can copy their held locks into the child. Submit functions from a
+    small *_worker module (services/signing_worker, services/tally_worker)
+    that imports neither Flask nor SQLAlchemy, so workers start fast.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
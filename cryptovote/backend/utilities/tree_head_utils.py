@@ -0,0 +1,76 @@
+# utilities/tree_head_utils.py
+"""
+Signed tree heads (STH) for the bulletin board.
+
+An STH commits to (election_id, tree_size, root, timestamp). It is signed with
+a dedicated RSA key (RSASSA-PKCS1-v1_5 / SHA-256), never with the blind-signing
+key, so that key keeps signing only blinded ballot tokens.
+"""
+import logging
+import os
+import tempfile
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+
+from utilities.paillier_utils import KEYS_DIR
+
+STH_PRIVATE_KEY_PATH = os.getenv(
+    "WBB_STH_KEY_PATH", os.path.join(KEYS_DIR, "wbb_sth_private.pem")
+)
+STH_ALG = "RSASSA-PKCS1-v1_5-SHA256"
+
+
+def ensure_sth_keypair(path: str = None) -> str:
+    """
+    Return the STH key path, generating a 2048-bit key on first use. The PEM
+    is written to a temp file in the same directory and hard-linked into
+    place, so readers never see a partial key and concurrent workers agree on
+    one: the first link wins, the others drop their temp file and read it.
+    """
+    path = path or STH_PRIVATE_KEY_PATH
+    if os.path.exists(path):
+        return path
+    pem = RSA.generate(2048).export_key("PEM")
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".wbb_sth-")
+    try:
+        with os.fdopen(fd, "wb") as f:        # mkstemp creates it 0600
+            f.write(pem)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            return path
+    finally:
+        os.unlink(tmp)
+    logging.warning(f"Generated new WBB tree-head signing key at {path}")
+    return path
+
+
+def load_sth_private_key(path: str = None):
+    with open(path or STH_PRIVATE_KEY_PATH, "rb") as f:
+        return RSA.import_key(f.read())
+
+
+def tree_head_message(election_id: str, tree_size: int, root: str, timestamp: int) -> bytes:
+    """Canonical bytes that get signed; `timestamp` is milliseconds since the epoch."""
+    return f"cryptovote-sth|v1|{election_id}|{int(tree_size)}|{root}|{int(timestamp)}".encode("utf-8")
+
+
+def sign_tree_head(private_key, election_id: str, tree_size: int, root: str, timestamp: int) -> str:
+    digest = SHA256.new(tree_head_message(election_id, tree_size, root, timestamp))
+    return pkcs1_15.new(private_key).sign(digest).hex()
+
+
+def verify_tree_head(public_key, sth: dict) -> bool:
+    """Check an STH as served by /wbb/<election_id>/sth."""
+    digest = SHA256.new(tree_head_message(
+        sth["election_id"], sth["tree_size"], sth["root"], sth["timestamp"]
+    ))
+    try:
+        pkcs1_15.new(public_key).verify(digest, bytes.fromhex(sth["signature"]))
+        return True
+    except (ValueError, TypeError):
+        return False
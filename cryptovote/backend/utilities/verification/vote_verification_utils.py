@@ -1,13 +1,62 @@
 # utilities/verification/vote_verification_utils.py
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
 from flask import jsonify
 
 from models.issued_token import IssuedToken
 
-HEX_CHARS = set("0123456789abcdefABCDEF")
+_HEX_RE = re.compile(r"[0-9a-fA-F]+")
+
+# outcomes of recent RSA checks, keyed by a digest of (public key, token, signature);
+# retried and replayed ballots are answered from here instead of another pow()
+SIGNATURE_CACHE_SIZE = int(os.getenv("SIGNATURE_CACHE_SIZE", "4096"))
+_verified: "OrderedDict[bytes, bool]" = OrderedDict()
+_verified_lock = threading.Lock()
 
 
 def _is_hex(s: str) -> bool:
-    return isinstance(s, str) and len(s) > 0 and all(ch in HEX_CHARS for ch in s)
+    return isinstance(s, str) and _HEX_RE.fullmatch(s) is not None
+
+
+def _signature_cache_key(pubkey, token_bytes: bytes, signature_int: int):
+    n, e = getattr(pubkey, "n", None), getattr(pubkey, "e", None)
+    if n is None or e is None:
+        return None                     # opaque key object: nothing stable to key on
+    h = hashlib.sha256()
+    for part in (int(n), int(e), signature_int):
+        h.update(format(part, "x").encode())
+        h.update(b"|")
+    h.update(token_bytes)
+    return h.digest()
+
+
+def _cached_verification(key):
+    if key is None:
+        return None
+    with _verified_lock:
+        ok = _verified.get(key)
+        if ok is not None:
+            _verified.move_to_end(key)
+        return ok
+
+
+def _remember_verification(key, ok: bool):
+    if key is None:
+        return
+    with _verified_lock:
+        _verified[key] = ok
+        _verified.move_to_end(key)
+        while len(_verified) > SIGNATURE_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+def clear_signature_cache():
+    with _verified_lock:
+        _verified.clear()
 
 
 def validate_vote_request(data):
@@ -43,7 +92,9 @@ def validate_vote_request(data):
 def parse_and_verify_signature(token: str, signature_hex: str, pubkey):
     """
     Convert hex -> int and verify RSA blind signature against token digest.
-    `pubkey` is the RSA public key object returned by your loader.
+    `pubkey` is the RSA public key object returned by your loader. Outcomes
+    are remembered per (key, token, signature), so a retried or replayed
+    ballot does not pay for the RSA check twice.
     """
     signature_hex = signature_hex.strip()
     if not _is_hex(signature_hex):
@@ -54,9 +105,14 @@ def parse_and_verify_signature(token: str, signature_hex: str, pubkey):
     except ValueError:
         return False, (jsonify({"error": "signature_parse_failed"}), 400), 400
 
-    from utilities.blind_signature_utils import verify_signed_token
     token_bytes = token.encode("utf-8")
-    if not verify_signed_token(pubkey, token_bytes, signature_int):
+    cache_key = _signature_cache_key(pubkey, token_bytes, signature_int)
+    ok = _cached_verification(cache_key)
+    if ok is None:
+        from utilities import blind_signature_utils
+        ok = bool(blind_signature_utils.verify_signed_token(pubkey, token_bytes, signature_int))
+        _remember_verification(cache_key, ok)
+    if not ok:
         return False, (jsonify({"error": "invalid_signature"}), 403), 403
 
     return True, signature_int, None
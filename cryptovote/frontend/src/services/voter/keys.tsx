@@ -11,7 +11,7 @@ export function normalizeRsaKey(raw: any): RsaPub {
 }
 
 export async function getRsaPub(rsaKeyId: string): Promise<RsaPub> {
-  const body: any = await getJSON('/public-keys');
+  const body: any = await getJSON(`/public-keys?rsa_key_id=${encodeURIComponent(rsaKeyId)}`);
 
   let candidates: any[] = [];
   if (Array.isArray(body?.rsa)) candidates = body.rsa;
@@ -20,6 +20,6 @@ export async function getRsaPub(rsaKeyId: string): Promise<RsaPub> {
 
   if (!candidates.length) throw new Error('No RSA keys available');
 
-  const raw = candidates.find(k => (k?.key_id ?? k?.id) === rsaKeyId) ?? candidates[0];
+  const raw = candidates.find(k => k?.rsa_key_id === rsaKeyId || (k?.key_id ?? k?.id) === rsaKeyId) ?? candidates[0];
   return normalizeRsaKey(raw);
 }
@@ -0,0 +1,56 @@
+"""
+Blind signing: previous per-request key load + pow(c, d, n) vs the cached CRT
+signer in backend/services/signing_service.py.
+
+    python scripts/bench_blind_sign.py                 # 2048-bit throwaway key, 200 signatures
+    python scripts/bench_blind_sign.py --bits 3072 --n 100
+
+Uses a temporary key file, never the deployment key.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from Crypto.PublicKey import RSA
+
+from utilities import blind_signature_utils as rsa_utils
+from utilities import key_registry
+from services import signing_service
+
+
+def bench(label, fn, values):
+    t0 = time.perf_counter()
+    out = [fn(c) for c in values]
+    dt = time.perf_counter() - t0
+    print(f"  {label:<28} {len(values) / dt:8.1f} sig/s   {dt / len(values) * 1000:7.2f} ms/sig")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bits", type=int, default=2048)
+    ap.add_argument("--n", type=int, default=200)
+    args = ap.parse_args()
+
+    key = RSA.generate(args.bits)
+    path = os.path.join(tempfile.mkdtemp(), "rsa_private.pem")
+    with open(path, "wb") as f:
+        f.write(key.export_key("PEM"))
+    rsa_utils.PRIVATE_KEY_PATH = path
+    key_registry.invalidate_keys()
+
+    values = [random.randrange(2, int(key.n)) for _ in range(args.n)]
+    print(f"{args.bits}-bit key, {args.n} signatures")
+    old = bench("before: load + pow(c, d, n)", rsa_utils.sign_blinded_token, values)
+    new = bench("after: cached CRT + check", lambda c: signing_service.sign_blinded_token(c, key_registry.DEFAULT_RSA_KEY_ID), values)
+    assert old == new
+    print(signing_service.signing_metrics()["keys"][key_registry.DEFAULT_RSA_KEY_ID])
+
+
+if __name__ == "__main__":
+    main()
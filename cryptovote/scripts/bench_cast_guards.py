@@ -0,0 +1,107 @@
+"""
+Before/after latency of the /cast-vote guard phase.
+
+"before" replays the separate lookups the route used to make (voter, election,
+candidate ids, token-reuse probe, VES, MAX(position)); "after" runs
+routes.cast_vote.load_cast_guards. Prints round trips and p50/p95 per ballot.
+
+    DATABASE_URL=postgresql://localhost/cryptovote_bench \\
+        python scripts/bench_cast_guards.py --iterations 2000
+
+Without DATABASE_URL a throwaway SQLite file is used as a stand-in.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from flask import Flask
+from sqlalchemy import event
+
+from models.db import db
+from models.voter import Voter
+from models.election import Election, Candidate
+from models.voter_election_status import VoterElectionStatus as VES
+from models.encrypted_candidate_vote import EncryptedCandidateVote as ECV
+from models.wbb_entry import WbbEntry
+from routes.cast_vote import load_cast_guards, _token_election_hash
+
+
+def _before(session, email_hash, election_id, teh):
+    voter = session.query(Voter).filter_by(email_hash=email_hash).first()
+    session.get(Election, election_id)
+    {r.id for r in session.query(Candidate.id).filter(Candidate.election_id == election_id).all()}
+    session.query(ECV.id).filter(ECV.token_hash == teh).first()
+    session.query(VES).filter_by(voter_id=voter.id, election_id=election_id).first()
+    session.query(WbbEntry.position).filter_by(election_id=election_id)\
+        .order_by(WbbEntry.position.desc()).first()
+
+
+def _after(session, email_hash, election_id, teh):
+    load_cast_guards(session, email_hash, election_id, teh)
+
+
+def _measure(fn, iterations, args, round_trips):
+    timings = []
+    for _ in range(iterations):
+        round_trips.clear()
+        db.session.expire_all()          # no identity-map hits between ballots
+        t0 = time.perf_counter()
+        fn(db.session, *args)
+        timings.append((time.perf_counter() - t0) * 1000)
+        db.session.rollback()
+    timings.sort()
+    return len(round_trips), statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--iterations", type=int, default=2000)
+    ap.add_argument("--candidates", type=int, default=8)
+    args = ap.parse_args()
+
+    url = os.getenv("DATABASE_URL") or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'guard_bench.db')}"
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+
+    with app.app_context():
+        db.Model.metadata.create_all(bind=db.engine, tables=[
+            Voter.__table__, Election.__table__, Candidate.__table__,
+            VES.__table__, ECV.__table__, WbbEntry.__table__,
+        ])
+        tag = uuid.uuid4().hex[:10]
+        eid, email_hash = f"bench-{tag}", f"bench-{tag}"
+        voter = Voter(email_hash=email_hash, is_verified=True, logged_in=True)
+        db.session.add(voter)
+        db.session.add(Election(id=eid, name=eid, is_active=True, has_started=True))
+        db.session.add_all(Candidate(id=f"{eid}-{i}", name=str(i), election_id=eid)
+                           for i in range(args.candidates))
+        db.session.flush()
+        db.session.add(VES(voter_id=voter.id, election_id=eid))
+        db.session.commit()
+
+        round_trips = []
+        event.listen(db.engine, "before_cursor_execute", lambda *a, **k: round_trips.append(1))
+        call = (email_hash, eid, _token_election_hash(eid, "bench-token"))
+
+        print(f"guard phase, {args.iterations} ballots on {db.engine.url.get_backend_name()}")
+        for label, fn in (("before", _before), ("after ", _after)):
+            trips, p50, p95 = _measure(fn, args.iterations, call, round_trips)
+            print(f"  {label}: {trips} round trips  p50 {p50:.3f} ms  p95 {p95:.3f} ms")
+
+        db.session.query(VES).filter_by(election_id=eid).delete()
+        db.session.query(Candidate).filter_by(election_id=eid).delete()
+        db.session.query(Election).filter_by(id=eid).delete()
+        db.session.query(Voter).filter_by(email_hash=email_hash).delete()
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
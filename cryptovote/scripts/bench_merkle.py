@@ -0,0 +1,91 @@
+"""
+Merkle level construction: previous list-of-bytes implementation vs the
+contiguous-buffer one in backend/utilities/merkle.py.
+
+    python scripts/bench_merkle.py                 # 10^4, 10^5, 10^6 leaves
+    python scripts/bench_merkle.py --sizes 10000
+
+For each size it times root, proof, and root+proof (what /wbb/<id>/proof needs).
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from utilities import merkle
+
+
+# --- previous implementation, kept verbatim for comparison ---
+def _h(b): return hashlib.sha256(b).digest()
+
+def old_merkle_root(leaves_hex):
+    if not leaves_hex:
+        return "0" * 64
+    level = [bytes.fromhex(x) for x in leaves_hex]
+    while len(level) > 1:
+        nxt = []
+        for i in range(0, len(level), 2):
+            a = level[i]
+            b = level[i+1] if i+1 < len(level) else level[i]
+            nxt.append(_h(a + b))
+        level = nxt
+    return level[0].hex()
+
+def old_merkle_proof(leaves_hex, index):
+    if not leaves_hex or index < 0 or index >= len(leaves_hex):
+        return []
+    level = [bytes.fromhex(x) for x in leaves_hex]
+    idx = index
+    proof = []
+    while len(level) > 1:
+        nxt = []
+        for i in range(0, len(level), 2):
+            a = level[i]
+            b = level[i+1] if i+1 < len(level) else level[i]
+            nxt.append(_h(a + b))
+        sibling_idx = idx ^ 1
+        if sibling_idx >= len(level):
+            sibling_idx = idx
+        proof.append(level[sibling_idx].hex())
+        idx //= 2
+        level = nxt
+    return proof
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10**4, 10**5, 10**6])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'leaves':>9} {'op':<11} {'old ms':>10} {'new ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        leaves = [hashlib.sha256(i.to_bytes(8, "big")).hexdigest() for i in range(n)]
+        idx = n // 3 + 1
+        cases = [
+            ("root", lambda: old_merkle_root(leaves), lambda: merkle.merkle_root(leaves)),
+            ("proof", lambda: old_merkle_proof(leaves, idx), lambda: merkle.merkle_proof(leaves, idx)),
+            ("root+proof", lambda: (old_merkle_root(leaves), old_merkle_proof(leaves, idx)),
+                           lambda: merkle.merkle_root_and_proof(leaves, idx)),
+        ]
+        for name, old, new in cases:
+            t_old, r_old = _best(old, args.repeat)
+            t_new, r_new = _best(new, args.repeat)
+            assert r_old == r_new, f"mismatch for {name} at n={n}"
+            print(f"{n:>9} {name:<11} {t_old:>10.1f} {t_new:>10.1f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Receipt PDF rendering: previous per-request logo loading vs the per-process
+cached, print-sized logos in backend/routes/receipt.py.
+
+    python scripts/bench_receipt.py              # 20 receipts each
+    python scripts/bench_receipt.py --n 100
+
+Renders the same tracker receipt both ways and prints receipts/second and
+the PDF size. Needs ReportLab (and Pillow) installed.
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+
+from routes import receipt
+
+
+# --- previous implementation, kept verbatim for comparison ---
+def old_render(election_name, election_id, ts, tracker, tracker_ok, index):
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.setTitle(f"Vote receipt — {election_name}")
+
+    page_w, page_h = letter
+    margin = 56
+    y = page_h - margin
+
+    def draw_logo(path, x, y_top, target_h=36):
+        if os.path.exists(path):
+            try:
+                img = ImageReader(path)
+                iw, ih = img.getSize()
+                scale = target_h / ih
+                w = iw * scale
+                h = target_h
+                c.drawImage(img, x, y_top - h, width=w, height=h, mask="auto")
+            except Exception:
+                pass
+
+    draw_logo(receipt._asset_path("ntu_logo.png"), margin, y)
+    draw_logo(receipt._asset_path("cryptovote_logo.png"), page_w - margin - 80, y)
+    y -= 60
+
+    c.setFont("Helvetica-Bold", 16)
+    title = f"{election_name} — Vote received"
+    title_w = c.stringWidth(title, "Helvetica-Bold", 16)
+    c.drawString((page_w - title_w) / 2, y, title)
+    y -= 30
+
+    c.setFont("Helvetica", 12)
+    c.drawString(margin, y, f"Timestamp: {ts}"); y -= 18
+    c.drawString(margin, y, f"Election ID: {election_id}"); y -= 18
+    if tracker:
+        c.drawString(margin, y, f"Tracker: {tracker}"); y -= 18
+        if tracker_ok:
+            c.setFillColorRGB(0.1, 0.5, 0.1)
+            c.drawString(margin, y, f"Inclusion: Yes ✓  (index {index})")
+            c.setFillColorRGB(0, 0, 0)
+        y -= 24
+        c.setFont("Helvetica-Oblique", 11)
+        c.drawString(margin, y, "Use this tracker to verify your entry is posted on the bulletin board.")
+        y -= 18
+    c.setFont("Helvetica-Oblique", 11)
+    c.drawString(margin, y, "This receipt contains no voting choices and cannot be used to prove how you voted.")
+    y -= 16
+    c.drawString(margin, y, "Keep this reference if you need to contact support.")
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def bench(label, fn, n):
+    fn()                                    # warm-up (first call fills the new cache)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pdf = fn()
+    dt = time.perf_counter() - t0
+    print(f"  {label:<8} {n / dt:8.1f} receipts/s   {len(pdf) / 1024:7.1f} KiB")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20)
+    args = ap.parse_args()
+
+    common = ("Student Council 2025", "EL-BENCH", "17 Oct 2026, 10:00 SGT", "3fa9c2d1e07b", True, 1234)
+    bench("before", lambda: old_render(*common), args.n)
+    bench("after", lambda: receipt.render_receipt_pdf(*common, None), args.n)
+
+
+if __name__ == "__main__":
+    main()
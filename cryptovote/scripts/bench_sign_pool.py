@@ -0,0 +1,96 @@
+"""
+Latency of light requests during a blind-signing spike: inline signing vs the
+process-pool backend in backend/services/signing_service.py.
+
+    python scripts/bench_sign_pool.py                  # 8 signing threads, 3 s per backend
+    python scripts/bench_sign_pool.py --threads 16 --seconds 5
+
+While the signing threads run flat out, a probe thread repeatedly does a small
+piece of pure-Python work (standing in for /wbb, /results or /session/status)
+and records how long each one takes, including getting the GIL back. Throughput and probe p50/p99 are printed
+for each backend. Uses a throwaway 2048-bit key.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from Crypto.PublicKey import RSA
+
+from utilities import blind_signature_utils as rsa_utils
+from utilities import key_registry
+from services import signing_service
+
+
+def probe_work():
+    payload = {"entries": [{"index": i, "tracker": f"{i:016x}"} for i in range(50)]}
+    return len(json.dumps(payload))
+
+
+def run(backend, n, threads, seconds):
+    signing_service.SIGN_BACKEND = backend
+    signing_service.shutdown_signing_pool()
+    key_id = key_registry.DEFAULT_RSA_KEY_ID
+    signing_service.sign_blinded_token(2, key_id)      # warm key cache / start the pool
+
+    stop = threading.Event()
+    signed, busy = [0], [0]
+
+    def signer():
+        while not stop.is_set():
+            try:
+                signing_service.sign_blinded_token(random.randrange(2, n), key_id)
+                signed[0] += 1
+            except signing_service.SignerBusy:
+                busy[0] += 1
+                time.sleep(0.001)
+
+    workers = [threading.Thread(target=signer, daemon=True) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    probes = []
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        time.sleep(0.002)                   # wake-up counts: that is where the GIL wait shows
+        probe_work()
+        probes.append((time.perf_counter() - t0 - 0.002) * 1000)
+    stop.set()
+    for t in workers:
+        t.join()
+    signing_service.shutdown_signing_pool()
+
+    probes.sort()
+    p99 = probes[int(len(probes) * 0.99) - 1]
+    print(f"  {backend:<8} {signed[0] / seconds:7.1f} sig/s  busy={busy[0]:<5} "
+          f"probe p50={statistics.median(probes):6.2f} ms  p99={p99:6.2f} ms  (n={len(probes)})")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+
+    key = RSA.generate(2048)
+    path = os.path.join(tempfile.mkdtemp(), "rsa_private.pem")
+    with open(path, "wb") as f:
+        f.write(key.export_key("PEM"))
+    rsa_utils.PRIVATE_KEY_PATH = path
+    key_registry.invalidate_keys()
+
+    print(f"{args.threads} signing threads, {signing_service.SIGN_WORKERS} pool workers, "
+          f"max in flight {signing_service.SIGN_MAX_INFLIGHT}")
+    for backend in ("inline", "process"):
+        run(backend, int(key.n), args.threads, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
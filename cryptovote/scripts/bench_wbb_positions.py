@@ -0,0 +1,253 @@
+"""
+Contention benchmark for /cast-vote: many voters of ONE election casting at once.
+
+Every ballot goes through the real route (guard query, RSA check, ballot check,
+tally partials, bulletin-board position + leaf, commit) against PostgreSQL,
+and the board upkeep thread builds the tree and folds the tally behind it;
+only the client side is simulated. Prints ballots/sec, latency percentiles,
+status codes and SQL statements per ballot (request threads and upkeep thread
+apart), then checks that the board root and the accumulators cover exactly
+the accepted ballots.
+
+    DATABASE_URL=postgresql://localhost/cryptovote_bench \\
+        python scripts/bench_wbb_positions.py --voters 64 --ballots 10
+
+`--voters` concurrent clients each cast `--ballots` ballots (one per voter
+account, so voters x ballots accounts are created). Keys are throwaway ones in
+a temporary directory; the bench election and its rows are deleted at the end.
+
+A one-hot ballot stores one encrypted_candidate_votes row per candidate under
+the same token hash, which uq_encvote_eid_tokenhash rejects as soon as an
+election has two candidates; the bench drops that constraint in its database.
+"""
+import argparse
+import hashlib
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from Crypto.PublicKey import RSA
+from flask import Flask
+from phe import paillier
+from sqlalchemy import event, func, select, text
+from sqlalchemy.engine import Engine
+
+from extensions import limiter
+from models.db import db
+from models.election import Election, Candidate
+from models.voter import Voter
+from models.voter_election_status import VoterElectionStatus
+from models.encrypted_candidate_vote import EncryptedCandidateVote
+from models.encrypted_tally_accumulator import EncryptedTallyAccumulator
+from models.encrypted_tally_partial import EncryptedTallyPartial
+from models.wbb_entry import WbbEntry
+from models import wbb_sequence, wbb_merkle_node, wbb_tree_head, wbb_tree_state   # noqa: F401  (tables)
+from routes.cast_vote import cast_vote_bp
+from utilities import blind_signature_utils as rsa_utils
+from utilities import paillier_utils
+from utilities import key_registry
+from utilities import tree_head_utils
+from utilities.key_fingerprint import fingerprint_paillier_n
+from utilities.merkle import merkle_root
+import services.wbb_service as wbb_service
+
+CANDIDATES = ("A", "B", "C")
+
+
+def _keys(tmp, paillier_bits):
+    rsa = RSA.generate(2048)
+    rsa_utils.PRIVATE_KEY_PATH = os.path.join(tmp, "rsa_private.pem")
+    rsa_utils.PUBLIC_KEY_PATH = os.path.join(tmp, "rsa_public.pem")
+    with open(rsa_utils.PRIVATE_KEY_PATH, "wb") as f:
+        f.write(rsa.export_key("PEM"))
+    with open(rsa_utils.PUBLIC_KEY_PATH, "wb") as f:
+        f.write(rsa.publickey().export_key("PEM"))
+
+    pub, _priv = paillier.generate_paillier_keypair(n_length=paillier_bits)
+    paillier_utils.KEYS_DIR = tmp
+    with open(os.path.join(tmp, "paillier_public_key.json"), "w") as f:
+        f.write(f'{{"n": {pub.n}}}')
+    tree_head_utils.STH_PRIVATE_KEY_PATH = os.path.join(tmp, "wbb_sth_private.pem")
+    tree_head_utils.ensure_sth_keypair()
+    key_registry.invalidate_keys()
+    return rsa, pub
+
+
+def _ballots(rsa, pub, election_id, count):
+    """Signed token + one-hot ciphertexts per ballot (obfuscators reused: only the server cost matters)."""
+    obf = [pow(secrets.randbelow(pub.n - 2) + 2, pub.n, pub.nsquare) for _ in range(16)]
+    key_id = fingerprint_paillier_n(pub.n)
+    out = []
+    for i in range(count):
+        token = secrets.token_hex(16)
+        m = int.from_bytes(hashlib.sha256(token.encode()).digest(), "big")
+        choice = CANDIDATES[i % len(CANDIDATES)]
+        out.append({
+            "election_id": election_id,
+            "token": token,
+            "signature": f"{pow(m, rsa.d, rsa.n):x}",
+            "tracker": secrets.token_hex(8),
+            "ballot": {
+                "scheme": "paillier-1hot",
+                "key_id": key_id,
+                "entries": [
+                    {"candidate_id": f"{election_id}-{cid}",
+                     "c": str((1 + int(cid == choice) * pub.n) * obf[(i + j) % len(obf)] % pub.nsquare)}
+                    for j, cid in enumerate(CANDIDATES)
+                ],
+            },
+        })
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--voters", type=int, default=64, help="concurrent clients")
+    ap.add_argument("--ballots", type=int, default=10, help="ballots per client")
+    ap.add_argument("--paillier-bits", type=int, default=2048)
+    args = ap.parse_args()
+
+    url = os.getenv("DATABASE_URL", "")
+    if not url.startswith("postgresql"):
+        ap.error("set DATABASE_URL to a PostgreSQL database (SQLite serialises writers)")
+
+    rsa, pub = _keys(tempfile.mkdtemp(), args.paillier_bits)
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY="bench",
+        SQLALCHEMY_DATABASE_URI=url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        RATELIMIT_ENABLED=False,
+    )
+    limiter.init_app(app)
+    db.init_app(app)
+    app.register_blueprint(cast_vote_bp)
+
+    election_id = f"bench-{uuid.uuid4().hex[:10]}"
+    total = args.voters * args.ballots
+    with app.app_context():
+        db.create_all()
+        db.session.execute(text("ALTER TABLE encrypted_candidate_votes "
+                                "DROP CONSTRAINT IF EXISTS uq_encvote_eid_tokenhash"))
+        db.session.add(Election(id=election_id, name="bench", is_active=True,
+                                has_started=True, has_ended=False))
+        db.session.flush()
+        db.session.add_all([Candidate(id=f"{election_id}-{c}", name=c, election_id=election_id)
+                            for c in CANDIDATES])
+        db.session.add_all([Voter(email_hash=f"{election_id}-{i:06d}", is_verified=True, logged_in=True)
+                            for i in range(total)])
+        db.session.commit()
+    ballots = _ballots(rsa, pub, election_id, total)
+
+    statements, counted_lock = {"request": 0, "upkeep": 0}, threading.Lock()
+
+    @event.listens_for(Engine, "before_cursor_execute")      # app pool and position-bump pool alike
+    def _count(conn, cursor, statement, params, context, executemany):
+        side = "upkeep" if threading.current_thread().name == "wbb-upkeep" else "request"
+        with counted_lock:
+            statements[side] += 1
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    start = threading.Barrier(args.voters)
+
+    def client(worker):
+        c = app.test_client()
+        mine = []
+        start.wait()
+        for b in range(args.ballots):
+            i = worker * args.ballots + b
+            with c.session_transaction() as s:
+                s["email"] = f"{election_id}-{i:06d}"
+            t0 = time.perf_counter()
+            r = c.post("/cast-vote", json=ballots[i])
+            mine.append((time.perf_counter() - t0, r.status_code))
+        with lock:
+            for dt, code in mine:
+                latencies.append(dt)
+                statuses[code] = statuses.get(code, 0) + 1
+
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(args.voters)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    drained = _wait_for_upkeep(app, election_id, total)
+
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{args.voters} concurrent voters x {args.ballots} ballots, one election, "
+          f"{engine_name(app)}, Paillier {args.paillier_bits}-bit")
+    print(f"  {len(latencies) / elapsed:8.1f} ballots/s   wall {elapsed:.2f}s   statuses {statuses}")
+    print(f"  latency ms  p50 {q[49] * 1000:7.1f}   p95 {q[94] * 1000:7.1f}   "
+          f"p99 {q[98] * 1000:7.1f}   max {max(latencies) * 1000:7.1f}")
+    served = max(statuses.get(200, 0), 1)
+    print(f"  SQL statements per accepted ballot: {statements['request'] / served:.1f} in the request, "
+          f"{statements['upkeep'] / served:.1f} in the upkeep thread (caught up {drained:.1f}s after the last vote)")
+
+    with app.app_context():
+        rows = db.session.query(WbbEntry.position, WbbEntry.leaf_hash)\
+            .filter(WbbEntry.election_id == election_id).order_by(WbbEntry.position).all()
+        wbb_service.integrate_board(db.session, election_id)   # catch up the tail, if any
+        db.session.commit()
+        size, root = wbb_service.board_root(db.session, election_id)
+        leaves, by_pos = [], dict(rows)
+        for pos in range(size):
+            leaves.append(by_pos.get(pos, "0" * 64))
+        accepted = statuses.get(200, 0)
+        print(f"  board: {len(rows)} entries, tree size {size}, "
+              f"{size - len(rows)} gaps, root {'OK' if root == merkle_root(leaves) else 'MISMATCH'}")
+        counted, pending = _tally_counts(election_id)
+        print(f"  accumulators: {counted} ciphertexts folded + {pending} pending "
+              f"(expected {accepted * len(CANDIDATES)})")
+        _cleanup(election_id)
+
+
+def _wait_for_upkeep(app, election_id, total, timeout=60.0):
+    """Seconds until the upkeep thread has built the whole tree and folded every partial."""
+    t0 = time.perf_counter()
+    with app.app_context():
+        while time.perf_counter() - t0 < timeout:
+            state = db.session.get(wbb_tree_state.WbbTreeState, election_id)
+            if state is not None and state.tree_size >= total and _tally_counts(election_id)[1] == 0:
+                break
+            db.session.rollback()
+            time.sleep(0.1)
+        db.session.rollback()
+    return time.perf_counter() - t0
+
+
+def engine_name(app):
+    with app.app_context():
+        return f"{db.engine.dialect.name} {db.engine.dialect.server_version_info[0]}"
+
+
+def _tally_counts(election_id):
+    """(folded, pending) ciphertext counts, read in one statement so a concurrent fold cannot skew them."""
+    def total(model):
+        return db.session.query(func.coalesce(func.sum(model.ballot_count), 0))\
+            .filter(model.election_id == election_id).scalar_subquery()
+    return db.session.execute(select(total(EncryptedTallyAccumulator), total(EncryptedTallyPartial))).one()
+
+
+def _cleanup(election_id):
+    for model in db.Model.__subclasses__():
+        cols = model.__table__.c
+        if "election_id" in cols and model is not Candidate:
+            db.session.query(model).filter(cols.election_id == election_id).delete()
+    db.session.query(Voter).filter(Voter.email_hash.like(f"{election_id}-%")).delete(synchronize_session=False)
+    db.session.query(Candidate).filter(Candidate.election_id == election_id).delete()
+    db.session.query(Election).filter(Election.id == election_id).delete()
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
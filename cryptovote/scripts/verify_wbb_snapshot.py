@@ -0,0 +1,84 @@
+"""
+Verify a bulletin-board snapshot downloaded from GET /wbb/<election_id>/snapshot.
+
+    python scripts/verify_wbb_snapshot.py wbb-E1-120000.cvwbb
+    python scripts/verify_wbb_snapshot.py wbb-E1-120000.cvwbb --sth-key sth_key.json
+    python scripts/verify_wbb_snapshot.py --synthetic 1000000     # timing only
+
+Recomputes every leaf and the root by streaming over the mmap'd file, and
+checks the header's signed tree head against the key from GET /wbb/sth-key
+(saved as JSON: nHex, eDec) when one is given. Exits non-zero if anything fails.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
+
+from Crypto.PublicKey import RSA
+
+from utilities.merkle import (
+    merkle_root, pack_snapshot_header, pack_snapshot_record, verify_snapshot,
+)
+from utilities.tree_head_utils import verify_tree_head
+
+
+def write_synthetic(path, n, election_id="SYNTH"):
+    leaves = []
+    with open(path, "wb") as f:
+        records = []
+        for pos in range(n):
+            token_hash = hashlib.sha256(pos.to_bytes(8, "big")).hexdigest()
+            tracker = f"{pos:016x}"
+            leaf = hashlib.sha256(f"{election_id}|{token_hash}|{tracker}".encode()).hexdigest()
+            leaves.append(leaf)
+            records.append(pack_snapshot_record(pos, tracker, token_hash, leaf))
+        f.write(pack_snapshot_header(election_id, n, merkle_root(leaves)))
+        f.write(b"".join(records))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", nargs="?")
+    ap.add_argument("--sth-key", help="JSON saved from GET /wbb/sth-key")
+    ap.add_argument("--synthetic", type=int, help="write and verify an N-entry board")
+    args = ap.parse_args()
+
+    path = args.path
+    if args.synthetic:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.cvwbb")
+        t0 = time.perf_counter()
+        write_synthetic(path, args.synthetic)
+        print(f"wrote {args.synthetic} entries in {time.perf_counter() - t0:.2f}s "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)")
+    elif not path:
+        ap.error("a snapshot path or --synthetic N is required")
+
+    t0 = time.perf_counter()
+    out = verify_snapshot(path)
+    took = time.perf_counter() - t0
+    print(f"election {out['election_id']}: {out['count']} entries verified in {took:.2f}s")
+    print(f"  root     {out['root']}  {'OK' if out['root_ok'] else 'MISMATCH ' + out['computed_root']}")
+    print(f"  leaves   {out['bad_leaves']} not matching election|token_hash|tracker")
+
+    ok = out["root_ok"] and out["bad_leaves"] == 0
+    if args.sth_key:
+        with open(args.sth_key) as f:
+            k = json.load(f)
+        pub = RSA.construct((int(k["nHex"], 16), int(k["eDec"])))
+        if out["sth"] is None:
+            print("  sth      none in header (no signed head for this exact size)")
+            ok = False
+        else:
+            sig_ok = verify_tree_head(pub, out["sth"])
+            print(f"  sth      key {out['sth']['key_id']}  {'OK' if sig_ok else 'BAD SIGNATURE'}")
+            ok = ok and sig_ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()